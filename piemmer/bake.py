@@ -10,6 +10,7 @@ from .posthoc.visual.projection import ProjectionArgs, projectNew
 from .posthoc.visual.individual import plotIndividual
 
 from .toolbox.recorder import initNoteBook, UpdateNoteBook
+from .toolbox.executor import limitBlasThreads, blasLibraries
 
 from .troubleshoot.warn.warning import WarningCode9
 from .troubleshoot.inquire.input import InputCode3
@@ -255,6 +256,13 @@ if __name__ == '__main__':
     common_args = BakeCommonArgs(suppress = False, silence = False, neglect = False, test = False)
     common_args.getHomeKeepingArgs()
 
+    ## one BLAS thread per worker (RevisitThreshold); single large decompositions (for example:
+    ## Projection) get all -c CPUs, or every CPU of the computer without -c
+    num_cpu = common_args.args.c if common_args.args.c else os.cpu_count()
+    limitBlasThreads(num_cpu)
+    UpdateNoteBook(notebook_name = common_args.notebook_name, neglect = common_args.neglect).updateParallelLayout(
+        num_cpu = num_cpu, backend = 'processes', main_threads = num_cpu, libraries = blasLibraries())
+
 
 ##==2==## different bake modes
 ##--1--## model = 'Individual'
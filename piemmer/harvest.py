@@ -8,9 +8,15 @@ from .troubleshoot.warn.warning import *
 from .troubleshoot.err.error import *
 from .toolbox.recorder import initNoteBook, UpdateNoteBook
 from .toolbox.technical import emptyNumpyArray
+from .toolbox.executor import makeWorkerPool, limitBlasThreads, blasLibraries
+from .toolbox.planner import parseMemory
+from .toolbox.cache import ResultCache
 
 from scipy.spatial import procrustes
+from functools import partial
+import concurrent.futures
 import itertools
+import asyncio
 import argparse
 import pandas
 import numpy
@@ -167,6 +173,171 @@ def tutorial():
                        Usage:
                        python3 -m piemmer.harvest <other_arguments_and_inputs> -s
     -c C, -cpuNum      Support multiprocessing. This argument is used to set the number of CPU used in the analysis.
+    -e E, -engine      How to calculate the von Neumann entropy after removing each feature. Default: 'svd'.
+                       1. svd: decompose every remove-one-column matrix from scratch. piemmer chooses between
+                          SVD and the eigenvalues of the smaller one of the sample-by-sample and the
+                          feature-by-feature matrices based on the shape of the input matrix.
+                       2. downdate: eigendecompose the sample-by-sample Gram matrix once and get the entropy of
+                          every remove-one-column matrix from a rank-one downdate. Much faster when the input
+                          matrix has a lot more features than samples.
+                       3. batched: solve the remove-one-column matrices in blocks with one vectorized
+                          eigenvalue call per block instead of one task per feature. Useful when the input
+                          matrix only has a few samples.
+                       4. auto: the fastest of the three that fits the memory of this computer (or -maxMemory),
+                          chosen for each input file from its shape.
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -e downdate
+    -m M, -method      How to get the eigenvalues when -e is set at 'svd'. Default: 'auto'.
+                       1. auto: choose between svd, gram and cov from the shape of the input matrix.
+                       2. svd, gram or cov: SVD of the input matrix, or eigenvalues of the sample-by-sample
+                          or the feature-by-feature matrix.
+                       3. randomized: approximate. Only resolve the largest eigenvalues with a randomized
+                          SVD and bound the entropy of the rest. For very large input matrices. The error
+                          bound of each von Neumann entropy is reported in the 'vNE_error_bound' column.
+                       4. slq: approximate. Stochastic Lanczos quadrature. Only multiplies the input matrix
+                          with vectors, so it works even when the sample-by-sample matrix does not fit in
+                          memory. The half width of the 95% confidence interval of the probes plus an
+                          estimate of the quadrature error is reported in the 'vNE_error_bound' column.
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -m randomized
+    -a A, -approximationTolerance
+                       Largest acceptable error bound (in bits) of the von Neumann entropy when -m is set at
+                       'randomized'. piemmer resolves more eigenvalues until the error bound is below this
+                       value. Default: 0.01.
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -m randomized -a 0.05
+    -numProbe NUMPROBE Number of random probe vectors when -m is set at 'slq'. More probes give a narrower
+                       confidence interval. Default: 30.
+    -lanczosSteps LANCZOSSTEPS
+                       Number of Lanczos steps per probe vector when -m is set at 'slq'. More steps give a
+                       smaller quadrature error. Default: 30.
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -m slq -numProbe 50 -lanczosSteps 40
+    -screen SCREEN     Estimate the von Neumann entropy after removing each feature from one eigendecomposition
+                       (first-order perturbation) and only calculate the exact values for the features whose
+                       estimates fall within SCREEN standard deviations of the -u and -l thresholds (or within the
+                       error of the estimates, when the exact values show it is larger). The exact values correct
+                       the other estimates, which moves the thresholds, so this repeats until no further estimate
+                       is near them. Very large features are always calculated exactly. The 'screening' column in
+                       the detail_vNE files records which values are exact. Features that sit right on a threshold
+                       might be called differently than without screening (use -prune for the same calls).
+                       Default: no screening.
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -screen 0.5
+    -prune             Bound the von Neumann entropy after removing each feature from one eigendecomposition of the
+                       full data (removing a column can only shift each eigenvalue down to the next one, and by at
+                       most the squared norm of the column), and skip the exact calculation of every feature that
+                       the bounds show to be on one side of the -u and -l thresholds, whatever the values of the
+                       skipped features. Repeats as the exact values narrow down the thresholds. Calls the same
+                       features as without -prune; the 'pruning' column in the detail_vNE files records which
+                       values are exact, and the number of skipped calculations is printed and written to the
+                       notebook. Most effective without -n, when many features have small counts. Overrides -screen.
+                       Default: False.
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -prune
+    -precision PRECISION
+                       Floating point type of the eigenvalue calculations: 'float64' or 'float32'. 'float32'
+                       halves the memory use and is faster for large input matrices. piemmer reports the
+                       largest difference from float64 (on up to 10 features, or on the features refined
+                       by -refine) on screen and in the notebook. Default: 'float64'.
+    -refine REFINE     When -precision is set at 'float32', recalculate the features whose von Neumann
+                       entropies fall within REFINE standard deviations of the -u and -l thresholds in
+                       float64. The 'precision' column in the detail_vNE files records which. Default: no
+                       refinement.
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -precision float32 -refine 0.5
+    -jackknife JACKKNIFE
+                       How to calculate the von Neumann entropies of the leave-one-sample-out subsamples when
+                       evaluating reproducibility (without -q). Default: 'refit'.
+                       1. refit: recalculate every subsample from scratch (with the -e and -m settings).
+                       2. update: derive every subsample from the full data matrix with low-rank updates of
+                          its sample-by-sample (or feature-by-feature) matrix. Exact. Only the copying and
+                          recentering of the subsamples is saved: each subsample still costs as much as
+                          -jackknife refit with -e batched. Ignores -e, -m and -screen.
+                       3. subsample: delete-d jackknife. Recalculate (like refit) m random subsamples without d
+                          samples each instead of every leave-one-sample-out subsample, so the running time
+                          no longer grows with the number of samples. The *_reproducibility.csv files report
+                          the reproducibility out of the m subsamples with its Monte Carlo standard error
+                          ('standard_error (%)'), and -t counts out of the m subsamples.
+                       4. infinitesimal: predict every leave-one-sample-out subsample from the first-order influence
+                          of its sample on the eigendecomposition of the full data, at about the cost of one more
+                          -q run. Approximate: reliable when there are many more samples than features; the
+                          largest sample leverage, recorded in the notebook, approaches 1 as the predictions
+                          degrade (Warning code 14 above 0.5). Ignores -e, -m, -precision and -screen.
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -jackknife update
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -jackknife subsample -subsampleBudget 3600
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -jackknife infinitesimal
+    -subsampleBudget SUBSAMPLEBUDGET
+                       Time for the subsamples of -jackknife subsample: seconds of wall-clock time, or CPU seconds
+                       of the -c CPUs with a 'cpu' suffix (for example: 28800cpu). m is the number of subsamples
+                       that fit when each takes as long as the full data matrix (at least 2). Ignored with
+                       -subsampleNum. Default: None (m = the number of samples).
+    -subsampleNum SUBSAMPLENUM
+                       m of -jackknife subsample. The standard error shrinks with the square root of m.
+                       Default: None (see -subsampleBudget).
+    -deleteNum DELETENUM
+                       d of -jackknife subsample. Default: the square root of the number of samples.
+    -stopConfidence STOPCONFIDENCE
+                       Stop the jackknife (without -q) as soon as every feature is settled: nominated in at least -t
+                       subsamples, or unable to reach -t in the subsamples left, or predicted to be either at this
+                       confidence level (Wilson score interval of its nomination rate, after at least 10 subsamples).
+                       The leave-one-sample-out subsamples run in a random order. After an early stop, the
+                       reproducibility (%) and its standard error are out of the subsamples used, and -t is scaled to
+                       them. The notebook records the number of subsamples used. 1 stops only when every decision
+                       is certain (same features as without -stopConfidence). Default: None (all subsamples).
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -t 50 -stopConfidence 0.99
+    -backend BACKEND   Where the von Neumann entropy calculations of -e svd and -e downdate run in parallel.
+                       Default: 'processes'.
+                       1. processes: -c worker processes that attach to one shared copy of the data.
+                       2. threads: -c threads of the main process. No worker processes and no copies of
+                          the data; numpy releases the GIL while it decomposes a matrix, so the threads
+                          run in parallel when every decomposition takes a while (large input matrices).
+                       3. serial: one calculation after another in the main process. For debugging.
+                       4. auto: time one calculation and choose threads when it takes at least 2 ms,
+                          processes otherwise (always processes with -workers).
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -c 32 -backend threads
+    -workers WORKERS   Run the worker processes of -backend processes on worker daemons of other computers
+                       instead of this one: a comma separated list of 'host:port' (TCP) or Unix socket
+                       paths. Start a daemon on every compute node first (see python3 -m piemmer.worker -h).
+                       The data of each von Neumann entropy calculation is sent to every daemon once.
+                       Default: None.
+                       Usage:
+                       python3 -m piemmer.worker -a 0.0.0.0:6000 -c 32 -authkey <secret>   (on node1 and node2)
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -workers node1:6000,node2:6000 -authkey <secret>
+    -authkey AUTHKEY   Shared secret of the worker daemons. Default: the PIEMMER_AUTHKEY environment variable.
+    -maxMemory MAXMEMORY
+                       Memory budget of the von Neumann entropy calculation of each input file (shared between
+                       the files with -concurrentFiles), in bytes with an optional unit K, M, G or T. piemmer
+                       estimates the memory of every engine (with -e auto) and backend (with -backend auto) from
+                       the shape of the filtered data matrix, picks the fastest that fits and runs fewer of the
+                       -c tasks at a time when all of them would not fit. Default: None (no limit).
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -c 64 -e auto -maxMemory 400G
+    -cache CACHE       Directory of a result cache shared by piemmer.harvest runs (and by several runs at the same
+                       time). The von Neumann entropies of each filtered data matrix and of its jackknife
+                       subsamples are stored under a hash of the matrix values, -n, the filter settings and the
+                       -e, -m, -a, -precision (and -u and -l with -screen, -prune or -refine) settings, so a repeated
+                       run on the same inputs (for example: to change -t or the plots) skips those calculations.
+                       Default: None (no cache).
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -cache ~/.piemmer_cache
+    -cacheSize CACHESIZE
+                       Size cap of the -cache directory, with an optional unit K, M, G or T. The least recently
+                       used results are removed first. Default: 4G.
+    -sparse            Read the input csv files in chunks into sparse matrices and keep them sparse through
+                       filtering and the von Neumann entropy calculation. Saves a lot of memory when most of
+                       the counts are zero. Default: False.
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -sparse
+    -concurrentFiles   Process several input files at the same time (when -i is a directory), starting with the
+                       largest files (number of samples x number of features). The files share the -c CPUs
+                       with the von Neumann entropy calculation of each file, so one big file no longer keeps
+                       the other CPUs waiting. Default: False.
+                       Usage:
+                       python3 -m piemmer.harvest <other_arguments_and_inputs> -c 8 -concurrentFiles
     -w W, -writeDownDetails
                        Do you want to add additional notes as piemmer run? Default: False.
                        (Not available,. Will be included in future update)
@@ -230,6 +401,21 @@ class HarvestArgs:
         normalize -- Type: boolean
                      Scale each column in the mean centered data based on its standard deviation
                      before SVD
+        minus_one_options -- Type: dict
+                             Keyword arguments for MinusOneVNE. Corresponding to args.e, args.m,
+                             args.a, args.numProbe, args.lanczosSteps, args.screen, args.prune,
+                             args.precision, args.refine and args.backend
+        sparse -- Type: boolean
+                  Keep the input matrices sparse. Corresponding to args.sparse
+        reproducibility_options -- Type: dict
+                                   Keyword arguments for reproducibility(). Corresponding to args.jackknife,
+                                   args.subsampleBudget, args.subsampleNum, args.deleteNum and
+                                   args.stopConfidence
+        concurrent_files -- Type: boolean
+                            Process several input files at the same time. Corresponding to
+                            args.concurrentFiles
+        cache -- Type: toolbox.cache.ResultCache or None
+                 Corresponding to args.cache and args.cacheSize
     """
     def __init__(self, suppress, silence, neglect):
         parser = argparse.ArgumentParser(description = '#############################################################################\nPlease use -g when you need additional explanation on different modes their corresponding arguments. Try: python3 -m piemmer.harvest -g\n#############################################################################')
@@ -249,6 +435,28 @@ class HarvestArgs:
         parser.add_argument('-p', '-plot', action = 'store_true')
         parser.add_argument('-s', '-sanityCheck', action = 'store_true')
         parser.add_argument('-c', '-cpuNum', default = 1, type = int)
+        parser.add_argument('-e', '-engine', default = 'svd', type = str, choices = ['svd', 'downdate', 'batched', 'auto'])
+        parser.add_argument('-m', '-method', default = 'auto', type = str, choices = ['auto', 'svd', 'gram', 'cov', 'randomized', 'slq'])
+        parser.add_argument('-a', '-approximationTolerance', default = 0.01, type = float)
+        parser.add_argument('-numProbe', default = 30, type = int)
+        parser.add_argument('-lanczosSteps', default = 30, type = int)
+        parser.add_argument('-screen', default = None, type = float)
+        parser.add_argument('-prune', action = 'store_true')
+        parser.add_argument('-precision', default = 'float64', type = str, choices = ['float64', 'float32'])
+        parser.add_argument('-refine', default = None, type = float)
+        parser.add_argument('-jackknife', default = 'refit', type = str, choices = ['refit', 'update', 'subsample', 'infinitesimal'])
+        parser.add_argument('-subsampleBudget', default = None, type = str)
+        parser.add_argument('-subsampleNum', default = None, type = int)
+        parser.add_argument('-deleteNum', default = None, type = int)
+        parser.add_argument('-stopConfidence', default = None, type = float)
+        parser.add_argument('-backend', default = 'processes', type = str, choices = ['processes', 'threads', 'serial', 'auto'])
+        parser.add_argument('-workers', default = None, type = str)
+        parser.add_argument('-authkey', default = os.environ.get('PIEMMER_AUTHKEY'), type = str)
+        parser.add_argument('-maxMemory', default = None, type = str)
+        parser.add_argument('-cache', default = None, type = str)
+        parser.add_argument('-cacheSize', default = '4G', type = str)
+        parser.add_argument('-sparse', action = 'store_true')
+        parser.add_argument('-concurrentFiles', action = 'store_true')
         parser.add_argument('-w', '-writeDownDetails', action = 'store_true')
         self.args = parser.parse_args()
         self.suppress = suppress
@@ -424,6 +632,95 @@ class HarvestArgs:
             raise ErrorCode47(suppress = self.suppress) from e
 
 
+    def getArgsE(self):
+        self.minus_one_options = {'engine': self.args.e}
+
+
+    def getArgsMA(self):
+        try:
+            if self.args.a <= 0 or self.args.numProbe < 2 or self.args.lanczosSteps < 1:
+                raise Error(code = '50')
+            if (self.args.screen is not None and self.args.screen < 0) or (self.args.refine is not None and self.args.refine < 0):
+                raise Error(code = '50')
+        except Error as e:
+            raise ErrorCode50(suppress = self.suppress) from e
+
+        self.minus_one_options['method'] = self.args.m
+        self.minus_one_options['tolerance'] = self.args.a
+        self.minus_one_options['num_probe'] = self.args.numProbe
+        self.minus_one_options['lanczos_steps'] = self.args.lanczosSteps
+        self.minus_one_options['screen'] = self.args.screen
+        self.minus_one_options['prune'] = self.args.prune
+        self.minus_one_options['precision'] = self.args.precision
+        self.minus_one_options['refine'] = self.args.refine
+        self.minus_one_options['backend'] = self.args.backend
+
+
+    def getArgsMaxMemory(self):
+        if self.args.maxMemory is not None:
+            self.minus_one_options['max_memory'] = parseMemory(self.args.maxMemory, suppress = self.suppress)
+
+
+    def getArgsCache(self):
+        if self.args.cache is None:
+            self.cache = None
+        else:
+            self.cache = ResultCache(directory = self.args.cache, max_bytes = parseMemory(self.args.cacheSize, suppress = self.suppress))
+
+
+    def getArgsSparse(self):
+        self.sparse = self.args.sparse
+
+
+    def getArgsJackknife(self):
+        self.reproducibility_options = {'jackknife': self.args.jackknife}
+        if self.args.stopConfidence is not None:
+            try:
+                if not 0 < self.args.stopConfidence <= 1:
+                    raise Error(code = '54')
+            except Error as e:
+                raise ErrorCode54(suppress = self.suppress) from e
+            self.reproducibility_options['stop_confidence'] = self.args.stopConfidence
+        if self.args.jackknife != 'subsample':
+            return
+
+        budget = self.args.subsampleBudget
+        budget_clock = 'wall'
+        try:
+            if budget is not None:
+                if budget.lower().endswith('cpu'):
+                    budget_clock = 'cpu'
+                    budget = budget[:-3]
+                budget = float(budget)
+                if not budget > 0:
+                    raise Error(code = '53')
+            if self.args.subsampleNum is not None and self.args.subsampleNum < 2:
+                raise Error(code = '53')
+            if self.args.deleteNum is not None and self.args.deleteNum < 1:
+                raise Error(code = '53')
+        except (Error, ValueError) as e:
+            raise ErrorCode53(suppress = self.suppress) from e
+
+        self.reproducibility_options['budget'] = budget
+        self.reproducibility_options['budget_clock'] = budget_clock
+        self.reproducibility_options['subsample_num'] = self.args.subsampleNum
+        self.reproducibility_options['delete_num'] = self.args.deleteNum
+
+
+    def getArgsConcurrentFiles(self):
+        self.concurrent_files = self.args.concurrentFiles
+
+
+    def getArgsWorkers(self):
+        self.workers = None if self.args.workers is None else self.args.workers.split(',')
+        try:
+            if self.workers is not None and self.args.authkey is None:
+                raise Error(code = '51')
+        except Error as e:
+            raise ErrorCode51(suppress = self.suppress) from e
+        self.authkey = self.args.authkey
+
+
     def processArgs(self):
         self.getArgsO()
         self.getArgsW()
@@ -436,6 +733,14 @@ class HarvestArgs:
         self.getArgsUL()
         self.getArgsPS()
         self.getArgsC()
+        self.getArgsE()
+        self.getArgsMA()
+        self.getArgsMaxMemory()
+        self.getArgsCache()
+        self.getArgsSparse()
+        self.getArgsJackknife()
+        self.getArgsConcurrentFiles()
+        self.getArgsWorkers()
         UpdateNoteBook(notebook_name = self.notebook_name, neglect = self.neglect).updateArgs(args = self.args)
 
 
@@ -449,7 +754,8 @@ class EMMER:
     def __init__(self, input_dir, output_file_tag, detection_limit, tolerance,
                  filter, upper_threshold_factor, lower_threshold_factor, specific_csv,
                  infoRich_threshold, num_cpu, notebook_name, neglect, quick_look,
-                 use_fractional_abundance, normalize):
+                 use_fractional_abundance, normalize, minus_one_options = None, sparse = False,
+                 reproducibility_options = None, concurrent_files = False, workers = None, authkey = None, cache = None):
 
         self.output_file_tag = str(output_file_tag)
         self.detection_limit = detection_limit
@@ -464,6 +770,14 @@ class EMMER:
         self.quick_look = quick_look
         self.use_fractional_abundance = use_fractional_abundance
         self.normalize = normalize
+        # one set of worker processes (or worker daemons) for every file and jackknife subsample of this run
+        self.pool = makeWorkerPool(num_cpu = num_cpu, workers = workers, authkey = authkey)
+        self.minus_one_options = dict({} if minus_one_options is None else minus_one_options, pool = self.pool)
+        self.sparse = sparse
+        self.reproducibility_options = reproducibility_options
+        self.concurrent_files = concurrent_files
+        self.cache = cache
+        self.silence = False
         self.collections_of_info_rich_features = []
 
         ## import all csv file store under input_dir
@@ -499,95 +813,157 @@ class EMMER:
 
 
     def singleFile(self, current_file_no = 0, silence = False):
-        self.input_basename = os.path.basename(self.input_file_names[current_file_no])
         self.silence = silence
-        self.data = Kernal(file_name = self.input_file_names[current_file_no], detection_limit = self.detection_limit,
-                           tolerance = self.tolerance, filter = self.filter, upper_lim = self.upper_threshold_factor,
-                           lower_lim = self.lower_threshold_factor, infoRich_threshold = self.infoRich_threshold,
-                           quick_look = self.quick_look, use_fractional_abundance = self.use_fractional_abundance,
-                           vNE_output_folder =  self.detail_vNE, output_file_tag = self.output_file_tag, num_cpu = self.num_cpu,
-                           notebook_name = self.notebook_name, normalize = self.normalize, neglect = self.neglect,
-                           silence = self.silence)
-
-        self.data.importAndProcess()
+        self.storeFileResult(current_file_no, self.processFile(current_file_no, notebook_name = self.notebook_name))
+
+
+    def readFile(self, current_file_no, notebook_name, num_cpu = None):
+        """
+        Read and parse one input file into its Kernal
+
+        Arguments:
+            current_file_no -- Type: int
+            notebook_name -- Type: str
+                             Notebook the Kernal records its results in
+            num_cpu -- Type: int or None
+                       Share of the CPUs for this file. Default: <self.num_cpu>
+        """
+        minus_one_options = self.minus_one_options
+        if num_cpu is not None and minus_one_options.get('max_memory') is not None:
+            # files that run at the same time split the memory budget like the CPUs
+            minus_one_options = dict(minus_one_options, max_memory = minus_one_options['max_memory'] * num_cpu // self.num_cpu)
+        data = Kernal(file_name = self.input_file_names[current_file_no], detection_limit = self.detection_limit,
+                      tolerance = self.tolerance, filter = self.filter, upper_lim = self.upper_threshold_factor,
+                      lower_lim = self.lower_threshold_factor, infoRich_threshold = self.infoRich_threshold,
+                      quick_look = self.quick_look, use_fractional_abundance = self.use_fractional_abundance,
+                      vNE_output_folder =  self.detail_vNE, output_file_tag = self.output_file_tag,
+                      num_cpu = self.num_cpu if num_cpu is None else num_cpu,
+                      notebook_name = notebook_name, normalize = self.normalize, neglect = self.neglect,
+                      minus_one_options = minus_one_options, sparse = self.sparse,
+                      reproducibility_options = self.reproducibility_options, cache = self.cache, silence = self.silence)
+        return(data)
+
+
+    def processFile(self, current_file_no, notebook_name, num_cpu = None, data = None, outputs = None):
+        """
+        Filter one input file, identify its information-rich features and write its output
+        files. Only reads the attributes of EMMER, so several files can be processed at the same
+        time (see concurrentFiles()).
+
+        Arguments:
+            current_file_no -- Type: int
+            notebook_name -- Type: str
+                             Notebook the Kernal records its results in
+            num_cpu -- Type: int or None
+                       Share of the CPUs for this file. Default: <self.num_cpu>
+            data -- Type: Kernal or None
+                    Output of readFile(), when the file was read ahead (see filePipeline())
+            outputs -- Type: list or None
+                       When given, the output files are not written here; (pandas.DataFrame, file name)
+                       pairs are appended for writeOutputs() instead
+
+        Return:
+            Type: dict
+            The Kernal ('data') and the output file names of this file
+        """
+        input_basename = os.path.basename(self.input_file_names[current_file_no])
+        if data is None:
+            data = self.readFile(current_file_no, notebook_name = notebook_name, num_cpu = num_cpu)
+        write = writeOutputs if outputs is None else outputs.extend
+
+        data.importAndProcess()
 
         ## modify index value of filtered dataset
-        index_tag = self.input_basename.replace(".csv", "__")
-        clean_df = self.data.filtered_data.data
-        clean_df.index = [index_tag + element for element in self.data.filtered_data.sample_id]
+        index_tag = input_basename.replace(".csv", "__")
+        clean_df = data.filtered_data.data
+        clean_df.index = [index_tag + element for element in data.filtered_data.sample_id]
 
         ## prepare file names
-        pre_filter_data_file_name = os.path.join(self.ra_data_output_dir, self.input_basename.replace(".csv", "")) + self.output_file_tag + "__pre_filterd_data.csv"
-        filter_out_data_file_name = os.path.join(self.filter_out_data_output_dir, self.input_basename.replace(".csv", "")) + self.output_file_tag + "__filterd_out_data.csv"
-        clean_df_file_name = os.path.join(self.filter_data_output_dir, self.input_basename.replace(".csv", "")) + self.output_file_tag + "__filterd_data.csv"
-        raw_not_infoRich_data_name = os.path.join(self.raw_not_infoRich_data_output_dir, self.input_basename.replace(".csv", "")) + self.output_file_tag + "__raw_not_infoRich_data.csv"
-
-        if current_file_no == 0:
-            self.pre_filter_data_file_names = [pre_filter_data_file_name]
-            self.filter_out_data_file_names = [filter_out_data_file_name]
-            self.clean_df_file_names = [clean_df_file_name]
-            self.raw_not_infoRich_data_name = [raw_not_infoRich_data_name]
-
-        else:
-            self.pre_filter_data_file_names.append(pre_filter_data_file_name)
-            self.filter_out_data_file_names.append(filter_out_data_file_name)
-            self.clean_df_file_names.append(clean_df_file_name)
-            self.raw_not_infoRich_data_name.append(raw_not_infoRich_data_name)
+        file_result = {'input_basename': input_basename, 'data': data}
+        file_result['pre_filter_data_file_name'] = os.path.join(self.ra_data_output_dir, input_basename.replace(".csv", "")) + self.output_file_tag + "__pre_filterd_data.csv"
+        file_result['filter_out_data_file_name'] = os.path.join(self.filter_out_data_output_dir, input_basename.replace(".csv", "")) + self.output_file_tag + "__filterd_out_data.csv"
+        file_result['clean_df_file_name'] = os.path.join(self.filter_data_output_dir, input_basename.replace(".csv", "")) + self.output_file_tag + "__filterd_data.csv"
+        file_result['raw_not_infoRich_data_name'] = os.path.join(self.raw_not_infoRich_data_output_dir, input_basename.replace(".csv", "")) + self.output_file_tag + "__raw_not_infoRich_data.csv"
 
-        clean_df.to_csv(clean_df_file_name)
+        write([(clean_df, file_result['clean_df_file_name'])])
 
         ## get prefilter data
         #   raw_data -> relativeAbundance()
-        self.data.input_matrix.data.index = index_tag + self.data.input_matrix.data.index
-        self.data.input_matrix.raw_data_before_filter.index = [index_tag + element for element in self.data.input_matrix.sample_id]
-        self.data.input_matrix.raw_data_before_filter.to_csv(pre_filter_data_file_name)
+        data.input_matrix.data.index = index_tag + data.input_matrix.data.index
+        data.input_matrix.raw_data_before_filter.index = [index_tag + element for element in data.input_matrix.sample_id]
+        write([(data.input_matrix.raw_data_before_filter, file_result['pre_filter_data_file_name'])])
 
         ## get and export filtered out dataset
         #   raw_data -> relativeAbundance(); .raw_data_before_filter !-> pass filter
-        features_that_fail_at_filtering = [value for value in self.data.input_matrix.raw_data_before_filter.columns if value not in list(clean_df.columns)]
-        fail_filter = self.data.input_matrix.raw_data_before_filter[features_that_fail_at_filtering]
-        fail_filter.to_csv(filter_out_data_file_name)
+        features_that_fail_at_filtering = [value for value in data.input_matrix.raw_data_before_filter.columns if value not in list(clean_df.columns)]
+        fail_filter = data.input_matrix.raw_data_before_filter[features_that_fail_at_filtering]
+        write([(fail_filter, file_result['filter_out_data_file_name'])])
 
         ## Identify information-rich features
-        self.data.infoRichCallingAndReproducibility()
+        data.infoRichCallingAndReproducibility()
 
         if self.quick_look == False:
-            self.output_file_name = os.path.join(self.output_dir, self.input_basename.replace(".csv", "")) + self.output_file_tag + "_reproducibility.csv"
-            self.data.info_rich_features_w_reproducibility.to_csv(self.output_file_name)
+            file_result['output_file_name'] = os.path.join(self.output_dir, input_basename.replace(".csv", "")) + self.output_file_tag + "_reproducibility.csv"
+            write([(data.info_rich_features_w_reproducibility, file_result['output_file_name'])])
 
         ## get filter_out_and_no_information-rich
         #   raw_data -> remove infoRich features
-        not_infoRich_features_in_raw_data = [value for value in self.data.input_matrix.raw_data_before_filter.columns if value not in self.data.list_of_info_rich_features]
-        filter_out_and_not_infoRich_data_file_name = self.data.input_matrix.raw_data_before_filter[not_infoRich_features_in_raw_data]
-        filter_out_and_not_infoRich_data_file_name.to_csv(raw_not_infoRich_data_name)
+        not_infoRich_features_in_raw_data = [value for value in data.input_matrix.raw_data_before_filter.columns if value not in data.list_of_info_rich_features]
+        filter_out_and_not_infoRich_data_file_name = data.input_matrix.raw_data_before_filter[not_infoRich_features_in_raw_data]
+        write([(filter_out_and_not_infoRich_data_file_name, file_result['raw_not_infoRich_data_name'])])
+        return(file_result)
+
+
+    def storeFileResult(self, current_file_no, file_result):
+        """
+        Keep the output of processFile() in the EMMER attributes, in the order of the input files
+        """
+        self.input_basename = file_result['input_basename']
+        self.data = file_result['data']
+        if 'output_file_name' in file_result:
+            self.output_file_name = file_result['output_file_name']
+
+        if current_file_no == 0:
+            self.pre_filter_data_file_names = [file_result['pre_filter_data_file_name']]
+            self.filter_out_data_file_names = [file_result['filter_out_data_file_name']]
+            self.clean_df_file_names = [file_result['clean_df_file_name']]
+            self.raw_not_infoRich_data_name = [file_result['raw_not_infoRich_data_name']]
+
+        else:
+            self.pre_filter_data_file_names.append(file_result['pre_filter_data_file_name'])
+            self.filter_out_data_file_names.append(file_result['filter_out_data_file_name'])
+            self.clean_df_file_names.append(file_result['clean_df_file_name'])
+            self.raw_not_infoRich_data_name.append(file_result['raw_not_infoRich_data_name'])
 
         ## collect the names of information-rich features
         self.collections_of_info_rich_features.append(self.data.list_of_info_rich_features)
 
 
-    def multipleFiles(self):
-        ## identify information-rich feature for individaul file
-        for i in range(len(self.input_file_names)):
-            self.singleFile(i)
+    def fileSummary(self, data):
+        """
+        Reproducibility (%) of the information-rich features of one file, as a one-column
+        pandas.DataFrame for <self.summary_df>
+        """
+        file_name_sub = [os.path.basename(data.basename)]
+        if self.quick_look == True:
+            info_rich_feature_sub = data.list_of_info_rich_features
+            reproducibility_sub = [1] * len(info_rich_feature_sub)
 
-            file_name_sub = [str(self.input_basename)]
-            if self.quick_look == True:
-                info_rich_feature_sub = self.data.list_of_info_rich_features
-                reproducibility_sub = [1] * len(info_rich_feature_sub)
+        else:
+            info_rich_feature_sub = data.list_of_info_rich_features
+            reproducibility_sub = list(data.info_rich_features_w_reproducibility['repreducibility (%)'])
 
-            else:
-                info_rich_feature_sub = self.data.list_of_info_rich_features
-                reproducibility_sub = list(self.data.info_rich_features_w_reproducibility['repreducibility (%)'])
+        reproducibility_sub = numpy.round(numpy.array(reproducibility_sub), decimals = 2)
+        return(pandas.DataFrame(reproducibility_sub, columns = file_name_sub, index = info_rich_feature_sub))
 
-            reproducibility_sub = numpy.round(numpy.array(reproducibility_sub), decimals = 2)
-            summary_df_sub = pandas.DataFrame(reproducibility_sub, columns = file_name_sub, index = info_rich_feature_sub)
 
-            if i == 0:
-                self.summary_df = summary_df_sub
+    def multipleFiles(self):
+        ## identify information-rich feature for individaul file
+        if self.concurrent_files == True and len(self.input_file_names) > 1:
+            self.concurrentFiles()
 
-            else:
-                # similar to cbind() and keep all
-                self.summary_df = pandas.concat([self.summary_df, summary_df_sub], axis = 1, sort = True)
+        else:
+            asyncio.run(self.filePipeline())
 
         self.summary_df = self.summary_df.fillna(0)
         self.summary_df.to_csv(os.path.join(self.output_dir, "information_rich_features_summary.csv"))
@@ -597,6 +973,130 @@ class EMMER:
         self.collections_of_info_rich_features = list(set(list(itertools.chain(*self.collections_of_info_rich_features))))
 
 
+    async def filePipeline(self, files_waiting_for_disk = 2):
+        """
+        Process the input files one after another, but overlap their input and output with the
+        computation: while one file is filtered and its von Neumann entropies are calculated, the
+        next file is read and parsed, and the output files of the finished ones are written in
+        the background. Each stage runs in a thread of its own; the computation mostly waits for
+        the worker processes, so the wall time approaches the longest stage instead of the sum.
+
+        Arguments:
+            files_waiting_for_disk -- Type: int
+                                      Largest number of finished files whose output is not written yet,
+                                      so that DataFrames do not pile up when the disk is the bottleneck
+        """
+        loop = asyncio.get_running_loop()
+        file_num = len(self.input_file_names)
+        writes = []
+        # start the workers before there are several threads to fork from
+        self.pool.start()
+        with concurrent.futures.ThreadPoolExecutor(max_workers = 1) as reader, \
+             concurrent.futures.ThreadPoolExecutor(max_workers = 1) as computer, \
+             concurrent.futures.ThreadPoolExecutor(max_workers = 1) as writer:
+            next_file = loop.run_in_executor(reader, self.readFile, 0, self.notebook_name)
+            try:
+                for i in range(file_num):
+                    data = await next_file
+                    if i + 1 < file_num:
+                        next_file = loop.run_in_executor(reader, self.readFile, i + 1, self.notebook_name)
+
+                    outputs = []
+                    file_result = await loop.run_in_executor(computer, partial(self.processFile, i, self.notebook_name,
+                                                                               data = data, outputs = outputs))
+                    writes.append(loop.run_in_executor(writer, writeOutputs, outputs))
+                    if len(writes) > files_waiting_for_disk:
+                        await writes[-1 - files_waiting_for_disk]
+
+                    self.storeFileResult(i, file_result)
+                    summary_df_sub = self.fileSummary(self.data)
+                    if i == 0:
+                        self.summary_df = summary_df_sub
+
+                    else:
+                        # similar to cbind() and keep all
+                        self.summary_df = pandas.concat([self.summary_df, summary_df_sub], axis = 1, sort = True)
+            except BaseException:
+                # do not read ahead after an error (for example: ErrorCode4)
+                reader.shutdown(wait = False, cancel_futures = True)
+                raise
+            finally:
+                # the output files written so far are complete, even after an error
+                await asyncio.gather(*writes, return_exceptions = True)
+        for write in writes:
+            write.result()
+
+
+    def fileCost(self, current_file_no):
+        """
+        Estimated cost (number of samples x number of features) of one input file, from its
+        header and its size: the number of samples is the number of bytes after the header
+        divided by the length of the first sample. Only the first two lines are read.
+        """
+        file_name = self.input_file_names[current_file_no]
+        with open(file_name, 'rb') as csv_file:
+            header = csv_file.readline()
+            first_sample = csv_file.readline()
+        num_feature = len(header.split(b',')) - 1
+        num_sample = (os.path.getsize(file_name) - len(header)) / max(1, len(first_sample))
+        return(num_sample * num_feature)
+
+
+    def concurrentFiles(self):
+        """
+        Process several input files at the same time, largest (estimated) file first. Up to
+        <self.num_cpu> files run in threads of this process; their remove-one-feature tasks all go
+        to the one WorkerPool of the run, so the CPUs are shared between file-level and
+        feature-level parallelism as the files come and go. The summary columns are merged as the
+        files finish, and each file records its notebook entries in a notebook of its own, which
+        is appended to <self.notebook_name> in the order of the input files at the end.
+        """
+        file_num = len(self.input_file_names)
+        file_order = sorted(range(file_num), key = self.fileCost, reverse = True)
+        thread_num = max(1, min(file_num, self.num_cpu))
+        file_notebooks = [self.notebook_name + '.' + str(i) for i in range(file_num)]
+
+        # start the workers before there are several threads to fork from
+        self.pool.start()
+        file_results = {}
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers = thread_num) as executor:
+                futures = {executor.submit(self.processFile, i, file_notebooks[i], max(1, self.num_cpu // thread_num)): i
+                           for i in file_order}
+                try:
+                    for future in concurrent.futures.as_completed(futures):
+                        i = futures[future]
+                        file_results[i] = future.result()
+                        summary_df_sub = self.fileSummary(file_results[i]['data'])
+                        if len(file_results) == 1:
+                            self.summary_df = summary_df_sub
+
+                        else:
+                            self.summary_df = pandas.concat([self.summary_df, summary_df_sub], axis = 1, sort = True)
+                except BaseException:
+                    # do not start the remaining files after an error (for example: ErrorCode4)
+                    executor.shutdown(wait = False, cancel_futures = True)
+                    raise
+        finally:
+            if self.neglect == False:
+                with open(self.notebook_name, 'a') as notebook:
+                    for file_notebook in file_notebooks:
+                        if os.path.exists(file_notebook):
+                            with open(file_notebook) as records:
+                                notebook.write(records.read())
+                            os.remove(file_notebook)
+
+        ## same columns and attributes as processing the files one after another
+        self.summary_df = self.summary_df[[os.path.basename(file_name) for file_name in self.input_file_names]]
+        for i in range(file_num):
+            self.storeFileResult(i, file_results[i])
+
+
+    def close(self):
+        ## stop the worker processes once every file is processed
+        self.pool.close()
+
+
 def mergeDataFrame(EMMER_class, select, file_name_list, info_rich_list, notebook_name, normalize, neglect):
     """
     Allow user to merge different kinds of csv files:
@@ -765,11 +1265,25 @@ def sanityCheck(EMMER_class, input_file_names, current_filter, notebook_name, ne
         sanity_check_plots.viewSanityCheckPlots()
 
 
+def writeOutputs(outputs):
+    """
+    Write every (pandas.DataFrame, file name) pair of <outputs> as a csv file
+    """
+    for data_frame, file_name in outputs:
+        data_frame.to_csv(file_name)
+
+
 ##==2==## running emmer.harvest
 if __name__ == '__main__':
     processed_args = HarvestArgs(suppress = False, silence = False, neglect = False)
     processed_args.processArgs()
 
+    ## one BLAS thread per worker; the main process gets all -c CPUs for single large decompositions
+    limitBlasThreads(processed_args.num_cpu)
+    UpdateNoteBook(notebook_name = processed_args.notebook_name, neglect = processed_args.neglect).updateParallelLayout(
+        num_cpu = processed_args.num_cpu, backend = processed_args.minus_one_options['backend'],
+        main_threads = processed_args.num_cpu, libraries = blasLibraries(), workers = processed_args.workers)
+
     emmer_result = EMMER(input_dir = processed_args.input_dir, output_file_tag = processed_args.output_file_tag,
                          detection_limit = processed_args.detection_limit, tolerance = processed_args.tolerance,
                          filter = processed_args.filter, upper_threshold_factor = processed_args.upper_threshold_factor,
@@ -777,7 +1291,11 @@ if __name__ == '__main__':
                          specific_csv = processed_args.specific_csv, infoRich_threshold = processed_args.infoRich_threshold,
                          notebook_name = processed_args.notebook_name, neglect =  processed_args.neglect,
                          quick_look = processed_args.quick_look, normalize = processed_args.normalize,
-                         use_fractional_abundance = processed_args.use_fractional_abundance)
+                         use_fractional_abundance = processed_args.use_fractional_abundance,
+                         minus_one_options = processed_args.minus_one_options, sparse = processed_args.sparse,
+                         reproducibility_options = processed_args.reproducibility_options,
+                         concurrent_files = processed_args.concurrent_files, workers = processed_args.workers,
+                         authkey = processed_args.authkey, cache = processed_args.cache)
 
     if processed_args.specific_csv == True:
         emmer_result.singleFile()
@@ -792,6 +1310,8 @@ if __name__ == '__main__':
         else:
             emmer_result.singleFile()
 
+    emmer_result.close()
+
     print("computation time: %s seconds " % (time.time() - start_time))
     run_time = (time.time() - start_time)
 
@@ -1,17 +1,27 @@
 #!/usr/bin/env python3
 
-from ..basic.math import NonDesityMatrix
+from ..basic.math import NonDesityMatrix, default_epsilon, normalizeEigvals, entropyFromNormEigvals, downdatedEigvals, perturbationVNE, interlacingEntropyBounds
 from ..basic.read import RawDataImport
 from ...troubleshoot.warn.warning import *
 from ...troubleshoot.err.error import *
 from ...toolbox.recorder import UpdateNoteBook
+from ...toolbox.planner import MemoryPlan, physicalMemory
+from ...toolbox.cache import matrixDigest, execution_options
+from ...toolbox.technical import asMatrix, deleteIndex, shareMatrix, inlineMatrix, attachMatrix
+from ...toolbox.executor import workerPool, WorkerPool, ThreadWorkerPool, SerialWorkerPool, OrderedAssembler
 
-from multiprocessing import Pool
 from tqdm import tqdm
 
+import scipy.sparse
+import scipy.stats
+import collections
+import itertools
 import pandas
 import numpy
+import threading
+import math
 import time
+import uuid
 import sys
 import os
 
@@ -40,48 +50,1061 @@ matrix (a .csv file) and filter based on user-defined parameters. Then select in
 features according to the user-defined threshold. Report reproducibilty upon user's request.
 """
 
+# shortest remove-one-feature task (in seconds) that MinusOneVNE(backend = 'auto') runs on threads
+thread_task_seconds = 0.002
+# largest sample leverage for which the predictions of InfinitesimalJackknifeVNE are trusted
+leverage_warning = 0.5
+
+
 class MinusOneVNE:
     """
     For a given RawDataImport.data matrix. Remove one feature (column) at a time and
     calculate the von Neumann entropy for the remaining matrix.
 
-    To speed up the computation process MinusOneVNE.data is defined as a numpy.array
+    To speed up the computation process MinusOneVNE.data is defined as a numpy.array (of type
+    <precision>; no copy when the input already is one). A scipy.sparse input stays sparse
+    (CSC) and NonDesityMatrix centers it implicitly.
+
+    Arguments:
+        engine -- Type: str
+                  'svd': decompose every remove-one-column matrix from scratch (see <method>)
+                  'downdate': eigendecompose the n x n Gram matrix of the full data once.
+                              Mean centering and scaling are per column, so removing
+                              column j subtracts c_j * c_j.transpose from the Gram matrix
+                              (c_j: the centered column j). The eigenvalues of every
+                              remove-one-column matrix then come from the secular equation
+                              in O(n^2) instead of a full SVD.
+                  'batched': stack the remove-one-column problems of a block of features into one
+                             (batch, k, k) array and get their eigenvalues with a single
+                             numpy.linalg.eigvalsh call. k = n (Gram matrix minus c_j * c_j.transpose)
+                             when n < p, otherwise k = p - 1 (covariance matrix without row and
+                             column j). No multiprocessing; the batch size is set by <memory_budget>.
+        method -- Type: str
+                  How NonDesityMatrix gets the eigenvalues when engine = 'svd'. One of 'auto',
+                  'svd', 'gram', 'cov', 'randomized' and 'slq'. With 'randomized' or 'slq', the
+                  result summary has an extra 'vNE_error_bound' column
+        tolerance -- Type: float
+                     Largest acceptable error bound (in bits) when method = 'randomized'
+        num_probe -- Type: int
+                     Number of random probe vectors when method = 'slq'
+        lanczos_steps -- Type: int
+                         Number of Lanczos steps per probe vector when method = 'slq'
+        memory_budget -- Type: int
+                         Number of bytes the stacked matrices may use when engine = 'batched'
+        screen -- Type: float or None
+                  When set, screenedResult() estimates every von Neumann entropy with perturbationVNE()
+                  first and only calculates the exact values for the features that fall within
+                  <screen> standard deviations of the information-rich feature thresholds
+        prune -- Type: boolean
+                 When True, prunedResult() bounds every von Neumann entropy from one eigendecomposition
+                 and only calculates the features whose information-rich call the bounds leave open
+        precision -- Type: str
+                     'float64' or 'float32'. Floating point type of every decomposition
+        refine -- Type: float or None
+                  When <precision> is 'float32', refinedResult() recalculates the features within
+                  <refine> standard deviations of the thresholds in float64
+        pool -- Type: toolbox.executor.WorkerPool, RemoteWorkerPool or None
+                Persistent worker processes (or remote worker daemons) to run the remove-one-feature
+                tasks on. Default: a temporary pool of <num_cpu> workers for every minusOneResult() call
+        backend -- Type: str
+                   'processes': run the remove-one-feature tasks on worker processes (<pool>).
+                   'serial': run them one after another in this thread.
+                   'threads': run them on <num_cpu> threads of this process, which share the data
+                              matrix without copies. numpy releases the GIL inside LAPACK, so this
+                              scales when a task is mostly decomposition.
+                   'auto': time one task and pick 'threads' when it takes at least
+                           <thread_task_seconds>, otherwise 'processes'. Always 'processes' when
+                           <pool> is remote.
+        max_tasks -- Type: int or None
+                     Largest number of remove-one-feature tasks that run at the same time, to stay
+                     within a memory budget (see toolbox.planner.MemoryPlan). Default: <num_cpu>
+        worker_contexts -- Type: int or None
+                           MinusOneVNE objects each worker process keeps between tasks (backend 'processes'),
+                           or that the threads keep besides the ones they run (backend 'threads'), to stay
+                           within a memory budget. Default: <worker_cache_size> and 1
     """
 
-    def __init__(self, data, normalize, feature_names, num_cpu):
-        self.data = numpy.array(data)
+    def __init__(self, data, normalize, feature_names, num_cpu, engine = 'svd', method = 'auto',
+                 tolerance = 0.01, num_probe = 30, lanczos_steps = 30, memory_budget = 2 ** 28, screen = None,
+                 precision = 'float64', refine = None, pool = None, backend = 'processes', max_tasks = None,
+                 worker_contexts = None, prune = False, suppress = False):
+        self.suppress = suppress
+        self.pool = pool
+        self.max_tasks = max_tasks
+        self.worker_contexts = worker_contexts
+        try:
+            if precision not in ['float64', 'float32']:
+                raise Error(code = '49')
+        except Error as e:
+            raise ErrorCode49(suppress = self.suppress) from e
+        self.precision = precision
+        self.dtype = numpy.dtype(precision)
+        self.refine = refine
+        self.max_precision_deviation = None
+
+        # refinedResult() goes back to the input for float64 values
+        self.source_data = data
+        try:
+            self.data = asMatrix(data, dtype = self.dtype)
+        except (TypeError, ValueError) as e:
+            raise ErrorCode46(suppress = self.suppress) from e
         self.feature_names = feature_names
         self.num_cpu = num_cpu
         self.normalize = normalize
+        self.method = method
+        self.tolerance = tolerance
+        self.num_probe = num_probe
+        self.lanczos_steps = lanczos_steps
+        self.memory_budget = memory_budget
+        self.screen = screen
+        self.prune = prune
+        self.num_pruned = None
+
+        try:
+            if engine not in ['svd', 'downdate', 'batched']:
+                raise Error(code = '49')
+        except Error as e:
+            raise ErrorCode49(suppress = self.suppress) from e
+        self.engine = engine
+        self.approximate = (engine == 'svd' and method in ['randomized', 'slq'])
+
+        try:
+            if backend not in ['processes', 'threads', 'serial', 'auto']:
+                raise Error(code = '49')
+        except Error as e:
+            raise ErrorCode49(suppress = self.suppress) from e
+        self.backend = backend
+        # subsample MinusOneVNE objects of jackknifeResult() on the 'threads' and 'serial' backends
+        self.subsample_cache = collections.OrderedDict()
+        self.subsample_lock = threading.Lock()
 
     def minusOneVNE(self, col_to_remove):
         """
         Remove specific feature from the data matrix and calculate the von Neumann entropy
         from the remaining matrix.
         """
-        subset = numpy.array(self.data)
         # delete column by index
-        subset = numpy.delete(subset, col_to_remove, axis = 1)
+        subset = deleteIndex(self.data, col_to_remove, axis = 1)
+
+        non_density_matrix = NonDesityMatrix(subset, normalize = self.normalize, method = self.method, tolerance = self.tolerance,
+                                             num_probe = self.num_probe, lanczos_steps = self.lanczos_steps, precision = self.precision)
+        minusOneVNE = [col_to_remove, self.feature_names[col_to_remove], non_density_matrix.vNE()]
 
-        minusOneVNE = [col_to_remove, self.feature_names[col_to_remove], NonDesityMatrix(subset, normalize = self.normalize).vNE()]
+        if self.approximate == True:
+            minusOneVNE.append(non_density_matrix.vNE_error_bound)
         return(minusOneVNE)
 
-    def minusOneResult(self):
+    def prepareDowndate(self):
+        """
+        Eigendecompose the Gram matrix of the mean centered (and scaled) data matrix once.
+        Every remove-one-column matrix is a rank-one downdate of this decomposition.
+        """
+        self.matrix_for_downdate = NonDesityMatrix(self.data, normalize = self.normalize, precision = self.precision)
+        self.matrix_for_downdate.prepareMatrix()
+        self.epsilon = self.matrix_for_downdate.epsilon
+
+        # kept for the columns that dominate the spectrum (see downdatedEigvals())
+        self.gram = self.matrix_for_downdate.gramMatrix()
+        gram_eigvals, self.gram_eigvecs = numpy.linalg.eigh(self.gram)
+        self.gram_eigvals = numpy.clip(gram_eigvals, 0, None)
+
+    def downdateVNE(self, col_to_remove):
+        """
+        Same as minusOneVNE(), but get the eigenvalues of the remaining matrix by downdating
+        the Gram matrix eigendecomposition prepared by prepareDowndate().
+        """
+        column = self.matrix_for_downdate.centeredColumns([col_to_remove]).ravel()
+        eigvals = downdatedEigvals(self.gram, self.gram_eigvals, self.gram_eigvecs, column)
+
+        downdateVNE = [col_to_remove, self.feature_names[col_to_remove],
+                       entropyFromNormEigvals(normalizeEigvals(eigvals, epsilon = self.epsilon))]
+        return(downdateVNE)
+
+    def featureVNE(self, col_to_remove):
+        """
+        minusOneVNE() or, when engine = 'downdate', downdateVNE()
+        """
+        if self.engine == 'downdate':
+            return(self.downdateVNE(col_to_remove))
+        return(self.minusOneVNE(col_to_remove))
+
+    def chooseBackend(self, features):
+        """
+        'threads', 'serial' or 'processes'. With backend = 'auto', time the first of <features>
+        here: a task that runs for at least <thread_task_seconds> is mostly LAPACK, which releases
+        the GIL, so threads keep up with processes without copying the data matrix into every worker.
+        """
+        if self.backend != 'auto':
+            return(self.backend)
+        if self.pool is not None and self.pool.remote:
+            return('processes')
+        if len(features) == 0:
+            return('threads')
+        if self.engine == 'downdate' and getattr(self, 'matrix_for_downdate', None) is None:
+            self.prepareDowndate()
+        start = time.perf_counter()
+        self.featureVNE(features[0])
+        return('threads' if (time.perf_counter() - start) >= thread_task_seconds else 'processes')
+
+    def batchSize(self, size):
+        """
+        Number of (size x size) matrices that fit in <self.memory_budget>. eigvalsh needs a
+        working copy of the stacked array, so count each matrix three times (stack, copy
+        and temporary).
+        """
+        return(int(max(1, self.memory_budget // (3 * self.dtype.itemsize * size * size))))
+
+    def batchedResult(self, features):
+        """
+        Calculate the von Neumann entropy of the remove-one-column matrices of <features>, one
+        block of features at a time, with a stacked numpy.linalg.eigvalsh call per block.
+        """
+        matrix_for_batch = NonDesityMatrix(self.data, normalize = self.normalize, precision = self.precision)
+        matrix_for_batch.prepareMatrix()
+        epsilon = matrix_for_batch.epsilon
+        nrow, ncol = matrix_for_batch.nrow, matrix_for_batch.ncol
+
+        use_gram = nrow < ncol
+        if use_gram:
+            product = matrix_for_batch.gramMatrix()
+            size = nrow
+        else:
+            product = matrix_for_batch.covMatrix()
+            size = ncol - 1
+
+        batch_size = self.batchSize(size)
+        result_summary = []
+
+        features = numpy.array(features, dtype = int)
+        with tqdm(total = len(features)) as pbar:
+            for start in range(0, len(features), batch_size):
+                cols = features[start:(start + batch_size)]
+
+                if use_gram:
+                    c = numpy.transpose(matrix_for_batch.centeredColumns(cols))
+                    stack = product[numpy.newaxis, :, :] - c[:, :, numpy.newaxis] * c[:, numpy.newaxis, :]
+                else:
+                    stack = principalSubmatrices(product, cols)
+
+                eigvals = numpy.linalg.eigvalsh(stack)
+
+                for b in range(len(cols)):
+                    vNE = entropyFromNormEigvals(normalizeEigvals(numpy.clip(eigvals[b], 0, None), epsilon = epsilon))
+                    result_summary.append([cols[b], self.feature_names[cols[b]], vNE])
+                pbar.update(len(cols))
+
+        return(result_summary)
+
+    def minusOneResult(self, features = None):
         """
         Systematically remove one feature at a time and calculate the von Neumann entropy
         for the remaining data matrix. Allow multiprocessing.
+
+        Arguments:
+            features -- Type: list or None
+                        Indexes of the features to remove. Default: all features
+        """
+        self.feature_num = len(self.feature_names)
+        if features is None:
+            features = range(self.feature_num)
+
+        if self.engine == 'batched':
+            self.result_summary = pandas.DataFrame(data = self.batchedResult(features), columns = ['feature_no', 'feature_name', 'vNE'])
+            return(self.result_summary)
+
+        prepared = {}
+        if self.engine == 'downdate':
+            self.prepareDowndate()
+            prepared = {'gram': self.gram, 'gram_eigvals': self.gram_eigvals, 'gram_eigvecs': self.gram_eigvecs}
+
+        backend = self.chooseBackend(features)
+        if backend in ['threads', 'serial']:
+            blocks, executor, task, tasks = [], self.localExecutor(backend), self.featureVNE, features
+        else:
+            # a task only carries the names of the shared memory blocks and the options, so the
+            # same persistent workers can serve every MinusOneVNE of the run
+            blocks, context = self.shareContext(prepared)
+            executor, task, tasks = workerPool(self.pool, self.num_cpu), minusOneTask, ((context, col) for col in features)
+        # every row goes to the position of its feature in <features>, whichever worker finishes first
+        assembler = OrderedAssembler(features)
+        try:
+            with executor as pool:
+                with tqdm(total = len(assembler.results)) as pbar:
+                    for res in pool.imapUnordered(task, tasks, max_tasks = self.max_tasks):
+                        assembler.add(res[0], res)
+                        pbar.update()
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        columns = ['feature_no', 'feature_name', 'vNE']
+        if self.approximate == True:
+            columns.append('vNE_error_bound')
+        self.result_summary = pandas.DataFrame(data = assembler.results, columns = columns)
+
+        return(self.result_summary)
+
+    def jackknifeResult(self, rows = None, block_num = None):
+        """
+        minusOneResult() of every remove-one-sample subset of the data matrix, scheduled as one
+        set of (subsample x feature block) tasks so that the workers stay busy from the first
+        subsample to the last, with a single progress bar. Each worker removes the sample from
+        the shared data matrix itself.
+
+        Yield (row, result_summary) in the order of <rows>, as soon as every block of that
+        subsample (and of the subsamples before it) is done.
+
+        Arguments:
+            rows -- Type: list or None
+                    Indexes of the samples to leave out (tuples of indexes to leave out several
+                    samples together). Default: all samples
+            block_num -- Type: int or None
+                         Number of feature blocks per subsample. Default: 4 * num_cpu
+        """
+        rows = list(range(self.data.shape[0]) if rows is None else rows)
+        self.feature_num = len(self.feature_names)
+        if block_num is None:
+            block_num = 4 * self.num_cpu
+        feature_blocks = [block.tolist() for block in numpy.array_split(numpy.arange(self.feature_num),
+                                                                        max(1, min(block_num, self.feature_num)))]
+        columns = ['feature_no', 'feature_name', 'vNE']
+        if self.approximate == True:
+            columns.append('vNE_error_bound')
+
+        backend = self.chooseBackend(feature_blocks[0])
+        if backend in ['threads', 'serial']:
+            blocks, executor, task = [], self.localExecutor(backend), self.subsampleBlockVNE
+            tasks = ((j, b, feature_blocks[b]) for j in rows for b in range(len(feature_blocks)))
+        else:
+            blocks, context = self.shareContext({})
+            executor, task = workerPool(self.pool, self.num_cpu), minusOneBlockTask
+            tasks = ((dict(context, row = j, token = context['token'] + '_' + str(j)), b, feature_blocks[b])
+                     for j in rows for b in range(len(feature_blocks)))
+        pending = {}
+        finished = {}
+        next_position = 0
+        try:
+            with executor as pool:
+                with tqdm(total = len(rows) * self.feature_num) as pbar:
+                    for row, block_no, res in pool.imapUnordered(task, tasks, max_tasks = self.max_tasks):
+                        pending.setdefault(row, {})[block_no] = res
+                        pbar.update(len(res))
+                        if len(pending[row]) == len(feature_blocks):
+                            subsample = pending.pop(row)
+                            finished[row] = [line for b in range(len(feature_blocks)) for line in subsample[b]]
+                        # hand the subsamples on in the order of <rows>
+                        while next_position < len(rows) and rows[next_position] in finished:
+                            result_summary = finished.pop(rows[next_position])
+                            yield(rows[next_position], pandas.DataFrame(data = result_summary, columns = columns))
+                            next_position += 1
+        finally:
+            self.subsample_cache.clear()
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def subsampleBlockVNE(self, task):
+        """
+        Task of jackknifeResult() on the 'threads' and 'serial' backends: von Neumann entropies after removing
+        each column of a feature block from one jackknife subsample. The threads share the
+        MinusOneVNE of the last few subsamples.
+
+        Arguments:
+            task -- Type: tuple (int, int, list)
+                    Sample to leave out, block number and the columns to remove
+        """
+        row, block_no, cols = task
+        with self.subsample_lock:
+            minus_one = self.subsample_cache.get(row)
+        if minus_one is None:
+            minus_one = MinusOneVNE(data = deleteIndex(self.data, row, axis = 0), normalize = self.normalize,
+                                    feature_names = self.feature_names, num_cpu = 1, **self.options())
+            if minus_one.engine == 'downdate':
+                minus_one.prepareDowndate()
+            with self.subsample_lock:
+                self.subsample_cache[row] = minus_one
+                kept = 1 if self.worker_contexts is None else self.worker_contexts
+                while len(self.subsample_cache) > min(self.num_cpu, self.max_tasks or self.num_cpu) + kept:
+                    self.subsample_cache.popitem(last = False)
+        return(row, block_no, [minus_one.featureVNE(col) for col in cols])
+
+    def localExecutor(self, backend):
+        """
+        Executor of the 'threads' and 'serial' backends, which run the bound methods of this
+        object in this process
+        """
+        if backend == 'threads':
+            return(ThreadWorkerPool(num_cpu = self.num_cpu))
+        return(SerialWorkerPool())
+
+    def shareContext(self, prepared):
+        """
+        Share the data matrix, the feature names and the arrays in <prepared> with the worker
+        processes (see toolbox.technical.shareMatrix()). Worker daemons on other computers
+        (a remote <pool>) receive the arrays with the tasks instead.
+
+        Return:
+            Type: tuple (list, dict)
+            The shared memory blocks (close() and unlink() them when the workers are done) and
+            the context that every minusOneTask() carries
+        """
+        share = inlineMatrix if (self.pool is not None and self.pool.remote) else shareMatrix
+        shared = dict(prepared, feature_names = numpy.asarray(list(self.feature_names), dtype = str))
+        blocks, descriptor = share(self.data)
+        context = {'token': uuid.uuid4().hex, 'data': descriptor, 'normalize': self.normalize,
+                   'options': self.options(), 'shared': {}}
+        for name, array in shared.items():
+            array_blocks, context['shared'][name] = share(array)
+            blocks.extend(array_blocks)
+        return(blocks, context)
+
+    def options(self):
+        """
+        Keyword arguments that rebuild this MinusOneVNE (apart from data, normalize,
+        feature_names and num_cpu)
+        """
+        return({'engine': self.engine, 'method': self.method, 'tolerance': self.tolerance, 'num_probe': self.num_probe,
+                'lanczos_steps': self.lanczos_steps, 'memory_budget': self.memory_budget, 'screen': self.screen,
+                'precision': self.precision, 'refine': self.refine, 'backend': self.backend, 'max_tasks': self.max_tasks,
+                'worker_contexts': self.worker_contexts, 'prune': self.prune, 'suppress': self.suppress})
+
+    def screenResult(self):
+        """
+        First-order estimate of the von Neumann entropy after removing each feature (see
+        perturbationVNE()). One eigendecomposition of the smaller one of the Gram and the
+        p x p matrix, then O(n * p * k) for all features at once.
         """
         self.feature_num = len(self.feature_names)
-        result_summary = [[] for i in range(self.feature_num)]
+        matrix_for_screen = NonDesityMatrix(self.data, normalize = self.normalize, precision = self.precision)
+        matrix_for_screen.prepareMatrix()
+
+        if matrix_for_screen.nrow <= matrix_for_screen.ncol:
+            # z_ij = u_i . c_j
+            eigvals, eigvecs = numpy.linalg.eigh(matrix_for_screen.gramMatrix())
+            weights = numpy.power(matrix_for_screen.matrixForSVD.T @ eigvecs, 2)
+        else:
+            # z_ij = s_i * v_ji, with s_i^2 the eigenvalue
+            eigvals, eigvecs = numpy.linalg.eigh(matrix_for_screen.covMatrix())
+            weights = numpy.power(eigvecs, 2) * numpy.clip(eigvals, 0, None)[numpy.newaxis, :]
+
+        vNE, relative_shift = perturbationVNE(numpy.clip(eigvals, 0, None), weights, epsilon = matrix_for_screen.epsilon)
+        self.screen_summary = pandas.DataFrame(data = {'feature_no': numpy.arange(self.feature_num),
+                                                       'feature_name': list(self.feature_names),
+                                                       'vNE': vNE})
+        self.relative_shift = relative_shift
+        return(self.screen_summary)
+
+    def screenedResult(self, upper_threshold_factor, lower_threshold_factor, max_relative_shift = 0.25):
+        """
+        Estimate every von Neumann entropy with screenResult(), then replace the estimates
+        near the information-rich feature thresholds (mean +/- factor * sd of the estimates)
+        with exact values from minusOneResult(), and correct the remaining estimates with the
+        exact values (see calibrateEstimates()). The correction moves the thresholds, so this
+        repeats with the new thresholds until no further estimate is near them (the same fixed
+        point as prunedResult()). "Near" means within <self.screen> standard deviations, or
+        within the largest error of the corrected estimates of the exact features when that is
+        larger. Features that are too large for the first-order expansion
+        (their removal shifts an eigenvalue by more than <max_relative_shift> of its value) are
+        always calculated exactly. The 'screening' column records which values are exact.
+
+        Arguments:
+            upper_threshold_factor -- Type: float or str ('None')
+            lower_threshold_factor -- Type: float or str ('None')
+            max_relative_shift -- Type: float
+        """
+        screen_summary = self.screenResult().copy()
+        approximate_vNE = numpy.array(screen_summary['vNE'])
+        current_vNE = approximate_vNE.copy()
+
+        exact = numpy.zeros(self.feature_num, dtype = bool)
+        near = (self.relative_shift > max_relative_shift) | nearThreshold(current_vNE, upper_threshold_factor,
+                                                                          lower_threshold_factor, margin = self.screen)
+        screen_summary['screening'] = 'first_order'
+        while True:
+            features = numpy.flatnonzero(near & ~exact)
+            if len(features) == 0:
+                break
+            exact_summary = self.minusOneResult(features = list(features))
+            rows = mergeResultSummary(screen_summary, exact_summary)
+            current_vNE[rows] = numpy.array(exact_summary['vNE'])
+            exact[rows] = True
+            current_vNE[~exact] = calibrateEstimates(approximate_vNE[exact], current_vNE[exact], approximate_vNE[~exact])
+            # the estimates are only trusted to the largest error of the corrected estimates of the
+            # exact features that the first-order expansion covers
+            covered = exact & (self.relative_shift <= max_relative_shift)
+            error = numpy.max(numpy.abs(calibrateEstimates(approximate_vNE[exact], current_vNE[exact], approximate_vNE[covered]) -
+                                        current_vNE[covered]), initial = 0)
+            margin = max(self.screen, error / numpy.std(current_vNE, ddof = 1))
+            near = nearThreshold(current_vNE, upper_threshold_factor, lower_threshold_factor, margin = margin)
+
+        screen_summary['vNE'] = current_vNE
+        screen_summary.loc[exact, 'screening'] = 'exact'
+        self.result_summary = screen_summary
+        return(self.result_summary)
+
+    def prunedResult(self, upper_threshold_factor, lower_threshold_factor, batch_fraction = 0.1):
+        """
+        Bound the von Neumann entropy after removing each feature with interlacingEntropyBounds()
+        (one eigendecomposition of the smaller one of the Gram and the p x p matrix), then
+        calculate exactly only the features whose information-rich call the bounds do not settle
+        (see certainCalling()). Every exact value narrows the possible thresholds, so this repeats
+        until every call is settled. The first round calculates the <batch_fraction> of the
+        bounded features with the widest bounds among the open ones (among all bounded ones when
+        only exact features are left open), and every further round twice the fraction of the one
+        before.
+
+        Bounded features get the values within their bounds that minimize the spread of all
+        values, so InfoRichCalling.infoRich() calls the same features as with every value exact.
+        The 'pruning' column records which values are exact, and <self.num_pruned> counts the
+        features that were never calculated.
+
+        Arguments:
+            upper_threshold_factor -- Type: float or str ('None')
+            lower_threshold_factor -- Type: float or str ('None')
+            batch_fraction -- Type: float
+        """
+        self.feature_num = len(self.feature_names)
+        matrix_for_bounds = NonDesityMatrix(self.data, normalize = self.normalize, precision = self.precision)
+        matrix_for_bounds.prepareMatrix()
+        if matrix_for_bounds.nrow <= matrix_for_bounds.ncol:
+            eigvals = numpy.linalg.eigvalsh(matrix_for_bounds.gramMatrix())
+        else:
+            eigvals = numpy.linalg.eigvalsh(matrix_for_bounds.covMatrix())
+        lower, upper = interlacingEntropyBounds(eigvals, matrix_for_bounds.columnSquaredNorms(), epsilon = matrix_for_bounds.epsilon)
+
+        exact = numpy.zeros(self.feature_num, dtype = bool)
+        exact_summaries = []
+        fraction = batch_fraction
+        while True:
+            certain = certainCalling(lower, upper, upper_threshold_factor, lower_threshold_factor)
+            if numpy.all(certain):
+                break
+            # the widest bounds leave the thresholds the most room, so calculate those first
+            candidates = numpy.flatnonzero(~certain & ~exact)
+            if len(candidates) == 0:
+                # only exact values are left open: narrow the thresholds with the other features
+                candidates = numpy.flatnonzero(~exact)
+            batch_size = max(1, int(numpy.ceil(fraction * numpy.sum(~exact))))
+            widest = numpy.argsort(-(upper[candidates] - lower[candidates]), kind = 'stable')
+            features = numpy.sort(candidates[widest[0:batch_size]])
+            # uninformative bounds (for example: every column has the same norm with <normalize>)
+            # should not cost more than a few rounds
+            fraction = min(1, 2 * fraction)
+            exact_summary = self.minusOneResult(features = list(features))
+            exact_summaries.append(exact_summary)
+            position = numpy.array(exact_summary['feature_no'], dtype = int)
+            lower[position] = upper[position] = numpy.array(exact_summary['vNE'])
+            exact[position] = True
+
+        pruned_summary = pandas.DataFrame(data = {'feature_no': numpy.arange(self.feature_num),
+                                                  'feature_name': list(self.feature_names),
+                                                  'vNE': leastSpread(lower, upper)})
+        pruned_summary['pruning'] = 'bounded'
+        for exact_summary in exact_summaries:
+            mergeResultSummary(pruned_summary, exact_summary)
+        pruned_summary.loc[exact, 'pruning'] = 'exact'
+        self.num_pruned = int(numpy.sum(~exact))
+        self.result_summary = pruned_summary
+        return(self.result_summary)
+
+    def refinedResult(self, result_summary, upper_threshold_factor, lower_threshold_factor):
+        """
+        Compare a float32 <result_summary> with float64 values and record the largest
+        difference in <self.max_precision_deviation>. With <self.refine> set, the features
+        within <self.refine> standard deviations of the information-rich feature thresholds
+        are recalculated in float64 from the original data and their values replaced (the
+        'precision' column records which). Otherwise up to 10 evenly spaced features are
+        recalculated only for the comparison.
+
+        Arguments:
+            result_summary -- Type: pandas.DataFrame
+                              Output of minusOneResult() or screenedResult()
+            upper_threshold_factor -- Type: float or str ('None')
+            lower_threshold_factor -- Type: float or str ('None')
+        """
+        feature_no = numpy.array(result_summary['feature_no'], dtype = int)
+        if self.refine is None:
+            features = numpy.unique(numpy.linspace(0, self.feature_num - 1, min(self.feature_num, 10)).astype(int))
+        else:
+            near = nearThreshold(numpy.array(result_summary['vNE']), upper_threshold_factor, lower_threshold_factor,
+                                 margin = self.refine)
+            features = numpy.sort(feature_no[near])
+
+        self.max_precision_deviation = 0
+        self.num_precision_compared = len(features)
+        if len(features) == 0:
+            if self.refine is not None:
+                result_summary['precision'] = self.precision
+            return(result_summary)
+
+        options = self.options()
+        options['precision'] = 'float64'
+        refined_summary = MinusOneVNE(data = self.source_data, normalize = self.normalize, feature_names = self.feature_names,
+                                      num_cpu = self.num_cpu, pool = self.pool, **options).minusOneResult(features = list(features))
+
+        position = pandas.Index(feature_no).get_indexer(refined_summary['feature_no'])
+        deviation = numpy.abs(numpy.array(result_summary['vNE'])[position] - numpy.array(refined_summary['vNE']))
+        # first-order estimates from screenedResult() and bounds from prunedResult() are not float32 results
+        if 'screening' in result_summary.columns:
+            deviation = deviation[numpy.array(result_summary['screening'])[position] == 'exact']
+        if 'pruning' in result_summary.columns:
+            deviation = deviation[numpy.array(result_summary['pruning'])[position] == 'exact']
+        self.max_precision_deviation = numpy.max(deviation, initial = 0)
+
+        if self.refine is not None:
+            result_summary['precision'] = self.precision
+            mergeResultSummary(result_summary, refined_summary)
+            result_summary.loc[result_summary.index[position], 'precision'] = 'float64'
+            if 'screening' in result_summary.columns:
+                result_summary.loc[result_summary.index[position], 'screening'] = 'exact'
+            if 'pruning' in result_summary.columns:
+                result_summary.loc[result_summary.index[position], 'pruning'] = 'exact'
+        return(result_summary)
+
+
+# MinusOneVNE objects of the current worker process by context token (see attachMinusOneVNE()).
+# Keep a few, so that concurrent callers sharing one WorkerPool do not rebuild them at every task
+worker_cache = collections.OrderedDict()
+worker_cache_size = 4
+
+
+def attachMinusOneVNE(context):
+    """
+    Rebuild the MinusOneVNE of the parent process in a worker, on zero-copy views of the
+    shared arrays (see MinusOneVNE.shareContext()). A persistent worker keeps it for the
+    following tasks with the same context and drops the least recently used one when more
+    than <worker_cache_size> contexts (or the 'worker_contexts' option of <context>) are cached.
+
+    Arguments:
+        context -- Type: dict
+                   Output of MinusOneVNE.shareContext()
+
+    Return:
+        Type: MinusOneVNE
+    """
+    if context['token'] in worker_cache:
+        worker_cache.move_to_end(context['token'])
+        return(worker_cache[context['token']][0])
+
+    blocks, data = attachMatrix(context['data'])
+    shared = {}
+    for name, descriptor in context['shared'].items():
+        array_blocks, shared[name] = attachMatrix(descriptor)
+        blocks.extend(array_blocks)
+    # jackknife subsample (see MinusOneVNE.jackknifeResult())
+    if context.get('row') is not None:
+        data = deleteIndex(data, context['row'], axis = 0)
+
+    minus_one = MinusOneVNE(data = data, normalize = context['normalize'], feature_names = shared['feature_names'].tolist(),
+                            num_cpu = 1, **context['options'])
+
+    if minus_one.engine == 'downdate' and 'gram_eigvecs' not in shared:
+        minus_one.prepareDowndate()
+    elif minus_one.engine == 'downdate':
+        minus_one.matrix_for_downdate = NonDesityMatrix(minus_one.data, normalize = context['normalize'],
+                                                        precision = minus_one.precision)
+        minus_one.matrix_for_downdate.prepareMatrix()
+        minus_one.epsilon = minus_one.matrix_for_downdate.epsilon
+        minus_one.gram = shared['gram']
+        minus_one.gram_eigvals = shared['gram_eigvals']
+        minus_one.gram_eigvecs = shared['gram_eigvecs']
+
+    worker_cache[context['token']] = (minus_one, blocks)
+    cache_size = context['options'].get('worker_contexts') or worker_cache_size
+    while len(worker_cache) > cache_size:
+        dropped_blocks = worker_cache.popitem(last = False)[1][1]
+        releaseMinusOneVNE(dropped_blocks)
+    return(minus_one)
+
+
+def releaseMinusOneVNE(blocks):
+    """
+    Detach this worker from the shared memory blocks of a dropped MinusOneVNE
+    """
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            # a view is still referenced; the mapping is released with the process
+            pass
+
+
+def minusOneTask(task):
+    """
+    Pool task: von Neumann entropy after removing a column, with the MinusOneVNE the task's
+    context describes (see attachMinusOneVNE())
+
+    Arguments:
+        task -- Type: tuple (dict, int)
+                Context from MinusOneVNE.shareContext() and the column to remove
+    """
+    context, col_to_remove = task
+    return(attachMinusOneVNE(context).featureVNE(col_to_remove))
+
+
+def minusOneBlockTask(task):
+    """
+    Pool task of MinusOneVNE.jackknifeResult(): von Neumann entropies after removing each
+    column of a feature block from one jackknife subsample
+
+    Arguments:
+        task -- Type: tuple (dict, int, list)
+                Context of the subsample, block number and the columns to remove
+    """
+    context, block_no, cols = task
+    minus_one = attachMinusOneVNE(context)
+    return(context['row'], block_no, [minus_one.featureVNE(col) for col in cols])
+
+
+def nearThreshold(vNE, upper_threshold_factor, lower_threshold_factor, margin):
+    """
+    Boolean mask of the von Neumann entropies within <margin> standard deviations of the
+    information-rich feature thresholds (mean +/- factor * sd, as in InfoRichCalling.infoRich())
+
+    Arguments:
+        vNE -- Type: numpy.ndarray
+        upper_threshold_factor -- Type: float or str ('None')
+        lower_threshold_factor -- Type: float or str ('None')
+        margin -- Type: float
+    """
+    entro_mean = numpy.mean(vNE)
+    entro_sd = numpy.std(vNE, ddof = 1)
+
+    near = numpy.zeros(len(vNE), dtype = bool)
+    for factor, sign in [(upper_threshold_factor, 1), (lower_threshold_factor, -1)]:
+        if factor != 'None':
+            threshold = entro_mean + sign * factor * entro_sd
+            near = near | (numpy.abs(vNE - threshold) <= margin * entro_sd)
+    return(near)
+
+
+def calibrateEstimates(estimates, exact_values, other_estimates):
+    """
+    Correct first-order von Neumann entropy estimates with the features calculated exactly.
+    Entropy is concave, so the estimates share a bias that grows with the size of the feature:
+    fit exact_values = a + b * estimates (least squares) and apply it to <other_estimates>.
+    With fewer than three exact values, or estimates that are all the same, only remove the
+    median bias.
+    """
+    if len(estimates) < 3 or numpy.ptp(estimates) == 0:
+        return(other_estimates + numpy.median(exact_values - estimates))
+    slope, intercept = numpy.polyfit(estimates, exact_values, 1)
+    return(intercept + slope * other_estimates)
 
-        with Pool(processes = self.num_cpu) as p:
-            with tqdm(total = self.feature_num) as pbar:
-                for i, res in enumerate(p.imap_unordered(self.minusOneVNE, range(self.feature_num))):
-                    result_summary[i] = res
-                    pbar.update()
 
-        self.result_summary = pandas.DataFrame(data = result_summary, columns = ['feature_no', 'feature_name', 'vNE'])
+def leastSpread(lower, upper):
+    """
+    Values within [<lower>, <upper>] with the smallest standard deviation: every value clipped
+    to a common level that equals their mean (found by bisection)
+    """
+    level_low, level_high = numpy.min(lower), numpy.max(upper)
+    for _ in range(100):
+        level = (level_low + level_high) / 2
+        if numpy.mean(numpy.clip(level, lower, upper)) > level:
+            level_low = level
+        else:
+            level_high = level
+    return(numpy.clip((level_low + level_high) / 2, lower, upper))
+
+
+def certainCalling(lower, upper, upper_threshold_factor, lower_threshold_factor):
+    """
+    Boolean mask of the features whose information-rich call (InfoRichCalling.infoRich()) is the
+    same for every set of von Neumann entropies within [<lower>, <upper>]. The thresholds
+    mean +/- factor * sd can only lie between the ones of the smallest mean and the smallest
+    standard deviation (leastSpread()) and the ones of the largest mean and an upper bound of
+    the standard deviation (the spread around the mean of the interval midpoints, taking
+    whichever end of each interval is farther).
+
+    Arguments:
+        lower -- Type: numpy.ndarray
+        upper -- Type: numpy.ndarray
+        upper_threshold_factor -- Type: float or str ('None')
+        lower_threshold_factor -- Type: float or str ('None')
+    """
+    num = len(lower)
+    mean_low, mean_high = numpy.mean(lower), numpy.mean(upper)
+    sd_low = numpy.std(leastSpread(lower, upper), ddof = 1)
+    center = numpy.mean((lower + upper) / 2)
+    sd_high = numpy.sqrt(numpy.sum(numpy.maximum(numpy.power(lower - center, 2), numpy.power(upper - center, 2))) / (num - 1))
+
+    called = numpy.zeros(num, dtype = bool)
+    not_called = numpy.ones(num, dtype = bool)
+    if upper_threshold_factor != 'None':
+        called |= lower > mean_high + upper_threshold_factor * sd_high
+        not_called &= upper <= mean_low + upper_threshold_factor * sd_low
+    if lower_threshold_factor != 'None':
+        called |= upper < mean_low - lower_threshold_factor * sd_high
+        not_called &= lower >= mean_high - lower_threshold_factor * sd_low
+    return(called | not_called)
+
+
+def principalSubmatrices(product, cols):
+    """
+    Stack of the principal submatrices of the p x p matrix <product> without row and column j,
+    for each j in <cols>. Shape: (len(<cols>), p - 1, p - 1)
+    """
+    keep = numpy.array([numpy.delete(numpy.arange(numpy.size(product, 0)), j) for j in cols])
+    return(product[keep[:, :, numpy.newaxis], keep[:, numpy.newaxis, :]])
+
+
+def mergeResultSummary(result_summary, new_summary):
+    """
+    Replace the rows of <result_summary> with the rows of <new_summary> that have the same
+    'feature_no'. Columns that only <new_summary> has are added (NaN in the other rows).
+    Return the row positions that were replaced.
+
+    Arguments:
+        result_summary -- Type: pandas.DataFrame
+                          One row per feature (MinusOneVNE.result_summary). Changed in place
+        new_summary -- Type: pandas.DataFrame
+                       MinusOneVNE.result_summary of some of the features
+    """
+    position = pandas.Index(result_summary['feature_no']).get_indexer(new_summary['feature_no'])
+    rows = result_summary.index[position]
+    for column in new_summary.columns:
+        if column not in result_summary.columns:
+            result_summary[column] = numpy.nan
+        result_summary.loc[rows, column] = list(new_summary[column])
+    return(position)
+
 
+class JackknifeVNE:
+    """
+    Leave-one-sample-out counterpart of MinusOneVNE for reproducibility(). Instead of
+    copying and recentering every subsample, derive the subsample without row r from the
+    mean centered full data matrix C:
+
+    - recentering the remaining rows adds c_r / (n - 1) to each of them (c_r: centered row r),
+      so the subsample Gram matrix is the full Gram matrix without row and column r plus a
+      rank-two correction, and the p x p scatter matrix is a rank-one downdate,
+      S - n / (n - 1) * c_r * c_r.transpose
+    - with <normalize>, the column variances of the subsample are
+      (sum of squares of C - n / (n - 1) * c_r^2) / (n - 2)
+
+    The remove-one-column entropies of each subsample then come from stacked eigvalsh calls,
+    as engine = 'batched' in MinusOneVNE: the subsample Gram matrix minus c_j * c_j.transpose
+    when the subsamples have fewer rows than columns, otherwise the subsample p x p matrix
+    without row and column j.
+
+    Only this setup is shared between the subsamples: with <normalize> the rescaled Gram matrix
+    is formed again by a matrix product, and the p eigendecompositions per subsample cost the
+    same as a MinusOneVNE(engine = 'batched') sweep of the subsample. Downdating one
+    eigendecomposition per subsample column by column (downdatedEigvals()) does fewer
+    operations, but its secular equation solver is slower than the stacked LAPACK calls up to
+    several hundred samples.
+
+    A scipy.sparse input is densified: the per-column downdate vectors are dense anyway.
+
+    Arguments:
+        data -- Type: numpy.ndarray or scipy.sparse matrix
+        normalize -- Type: boolean
+        feature_names -- Type: list
+        precision -- Type: str
+                     'float64' or 'float32'
+        memory_budget -- Type: int
+                         Number of bytes the stacked matrices may use
+    """
+
+    def __init__(self, data, normalize, feature_names, precision = 'float64', memory_budget = 2 ** 28, suppress = False):
+        self.suppress = suppress
+        try:
+            if precision not in ['float64', 'float32']:
+                raise Error(code = '49')
+        except Error as e:
+            raise ErrorCode49(suppress = self.suppress) from e
+        self.dtype = numpy.dtype(precision)
+
+        if scipy.sparse.issparse(data):
+            data = data.toarray()
+        try:
+            self.data = asMatrix(data, dtype = self.dtype)
+        except (TypeError, ValueError) as e:
+            raise ErrorCode46(suppress = self.suppress) from e
+
+        self.normalize = normalize
+        self.feature_names = feature_names
+        self.memory_budget = memory_budget
+        self.nrow, self.ncol = numpy.shape(self.data)
+
+        full_matrix = NonDesityMatrix(self.data, normalize = False, precision = precision)
+        self.centered = full_matrix.prepareMatrix()
+        self.epsilon = full_matrix.epsilon
+        self.colsquaresum = numpy.sum(numpy.power(self.centered, 2), axis = 0)
+
+        # same choice as MinusOneVNE.batchedResult(), for the n - 1 rows of a subsample
+        self.use_gram = self.nrow - 1 < self.ncol
+        if self.use_gram:
+            self.gram = full_matrix.gramMatrix()
+        else:
+            self.scatter = full_matrix.covMatrix()
+
+    def minusOneResult(self, row):
+        """
+        Von Neumann entropy after removing each feature from the data matrix without <row>.
+        Same output as MinusOneVNE.minusOneResult() on numpy.delete(<self.data>, <row>, axis = 0).
+        """
+        n = self.nrow
+        centered_row = self.centered[row, :]
+        if self.normalize == True:
+            colvar = (self.colsquaresum - n / (n - 1) * numpy.power(centered_row, 2)) / (n - 2)
+            scale = 1 / numpy.sqrt(colvar)
+
+        vNE = []
+        if self.use_gram:
+            centered = numpy.delete(self.centered, row, axis = 0) + centered_row / (n - 1)
+            if self.normalize == False:
+                g = numpy.delete(self.gram[:, row], row)
+                gram = numpy.delete(numpy.delete(self.gram, row, axis = 0), row, axis = 1)
+                gram = gram + (g[:, numpy.newaxis] + g[numpy.newaxis, :]) / (n - 1) + self.gram[row, row] / (n - 1) ** 2
+            else:
+                centered = centered * scale
+                gram = numpy.matmul(centered, numpy.transpose(centered))
+
+            size = n - 1
+        else:
+            scatter = self.scatter - n / (n - 1) * numpy.outer(centered_row, centered_row)
+            if self.normalize == True:
+                scatter = scatter * numpy.outer(scale, scale)
+            size = self.ncol - 1
+
+        batch_size = int(max(1, self.memory_budget // (3 * self.dtype.itemsize * size * size)))
+        for start in range(0, self.ncol, batch_size):
+            cols = numpy.arange(start, min(start + batch_size, self.ncol))
+            if self.use_gram:
+                c = numpy.transpose(centered[:, cols])
+                stack = gram[numpy.newaxis, :, :] - c[:, :, numpy.newaxis] * c[:, numpy.newaxis, :]
+            else:
+                stack = principalSubmatrices(scatter, cols)
+
+            eigvals = numpy.linalg.eigvalsh(stack)
+            for b in range(len(cols)):
+                vNE.append(entropyFromNormEigvals(normalizeEigvals(numpy.clip(eigvals[b], 0, None), epsilon = self.epsilon)))
+
+        self.result_summary = pandas.DataFrame(data = {'feature_no': numpy.arange(self.ncol),
+                                                       'feature_name': list(self.feature_names),
+                                                       'vNE': vNE})
+        return(self.result_summary)
+
+
+class InfinitesimalJackknifeVNE:
+    """
+    Infinitesimal jackknife approximation of JackknifeVNE: the first-order influence of every
+    sample on every remove-one-column von Neumann entropy, from one eigendecomposition per
+    column of the full data matrix (about the cost of one MinusOneVNE sweep with engine =
+    'batched') instead of one sweep per subsample.
+
+    For the mean centered (and scaled) matrix M without column j, with eigenvalues lamda_i,
+    a_ri = (row r of M) . (eigenvector i) and b_ki = sqrt(lamda_i) * (eigenvector i)_k:
+
+    - leaving out sample r (and recentering) lowers lamda_i by n / (n - 1) * a_ri^2 (see
+      JackknifeVNE)
+    - with <normalize>, the scale of column k changes by the factor g_rk = sqrt(var_k / var_k
+      without sample r), which moves lamda_i by 2 * sum_k (g_rk - 1) * b_ki^2
+    - dH/d(lamda_i) = -(log2(p_i) + H) / T as in perturbationVNE()
+
+    so H_j without sample r is about H_j + sum_i dH/d(lamda_i) * (shift of lamda_i). The
+    expansion treats each sample as a small part of the spectrum, so it is only accurate when
+    the leverage of every sample, sum_i a_ri^2 / lamda_i, is small (many more samples than
+    features). With fewer samples than features, every sample has a leverage close to one:
+    leaving it out removes a whole dimension, and the predictions are poor.
+
+    Arguments:
+        data -- Type: numpy.ndarray or scipy.sparse matrix
+        normalize -- Type: boolean
+        feature_names -- Type: list
+
+    Attributes:
+        vNE -- Type: numpy.ndarray
+               Von Neumann entropy after removing each feature from the full data matrix
+        influence -- Type: numpy.ndarray
+                     n x p first-order change of those entropies when each sample is left out
+        max_leverage -- Type: float
+                        Largest leverage of a sample on any remove-one-column matrix
+    """
+
+    def __init__(self, data, normalize, feature_names, suppress = False):
+        self.suppress = suppress
+        if scipy.sparse.issparse(data):
+            data = data.toarray()
+        try:
+            self.data = asMatrix(data, dtype = numpy.float64)
+        except (TypeError, ValueError) as e:
+            raise ErrorCode46(suppress = self.suppress) from e
+
+        self.normalize = normalize
+        self.feature_names = feature_names
+        self.nrow, self.ncol = numpy.shape(self.data)
+
+        full_matrix = NonDesityMatrix(self.data, normalize = normalize)
+        self.matrix = full_matrix.prepareMatrix()
+        self.epsilon = full_matrix.epsilon
+        self.use_gram = self.nrow < self.ncol
+        self.product = full_matrix.gramMatrix() if self.use_gram else full_matrix.covMatrix()
+
+        # relative change of every column scale when each sample is left out
+        self.scale_shift = None
+        if self.normalize == True:
+            n = self.nrow
+            centered = self.data - numpy.mean(self.data, axis = 0)
+            colsquaresum = numpy.sum(numpy.power(centered, 2), axis = 0)
+            subsample_colvar = (colsquaresum - n / (n - 1) * numpy.power(centered, 2)) / (n - 2)
+            self.scale_shift = numpy.sqrt(colsquaresum / (n - 1) / numpy.clip(subsample_colvar, self.epsilon, None)) - 1
+
+    def featureInfluence(self, col):
+        """
+        (von Neumann entropy of the matrix without column <col>, first-order change of it when
+        each sample is left out, largest leverage of a sample)
+        """
+        n = self.nrow
+        keep_cols = numpy.delete(numpy.arange(self.ncol), col)
+        matrix = self.matrix[:, keep_cols]
+        if self.use_gram:
+            c = self.matrix[:, col]
+            eigvals, eigvecs = numpy.linalg.eigh(self.product - numpy.outer(c, c))
+            eigvals = numpy.clip(eigvals, 0, None)
+            a = eigvecs * numpy.sqrt(eigvals)[numpy.newaxis, :]
+            b = numpy.matmul(numpy.transpose(matrix), eigvecs)
+        else:
+            eigvals, eigvecs = numpy.linalg.eigh(self.product[numpy.ix_(keep_cols, keep_cols)])
+            eigvals = numpy.clip(eigvals, 0, None)
+            a = numpy.matmul(matrix, eigvecs)
+            b = eigvecs * numpy.sqrt(eigvals)[numpy.newaxis, :]
+
+        norm_eigvals = normalizeEigvals(eigvals, epsilon = self.epsilon)
+        vNE = entropyFromNormEigvals(norm_eigvals)
+        keep = norm_eigvals > 0
+        total = numpy.sum(eigvals[eigvals >= self.epsilon])
+        gradient = -(numpy.log2(norm_eigvals[keep]) + vNE) / total
+
+        eigval_shift = -n / (n - 1) * numpy.power(a[:, keep], 2)
+        leverage = numpy.max(numpy.sum(numpy.power(a[:, keep], 2) / eigvals[keep][numpy.newaxis, :], axis = 1), initial = 0)
+        if self.normalize == True:
+            eigval_shift += 2 * numpy.matmul(self.scale_shift[:, keep_cols], numpy.power(b[:, keep], 2))
+        return(vNE, numpy.matmul(eigval_shift, gradient), leverage)
+
+    def influenceResult(self):
+        """
+        Fill <self.vNE> and <self.influence>
+        """
+        self.vNE = numpy.zeros(self.ncol)
+        self.influence = numpy.zeros((self.nrow, self.ncol))
+        self.max_leverage = 0
+        for col in range(self.ncol):
+            self.vNE[col], self.influence[:, col], leverage = self.featureInfluence(col)
+            self.max_leverage = max(self.max_leverage, leverage)
+        return(self.influence)
+
+    def minusOneResult(self, row):
+        """
+        Approximate MinusOneVNE.minusOneResult() of the data matrix without <row>
+        """
+        if not hasattr(self, 'influence'):
+            self.influenceResult()
+        self.result_summary = pandas.DataFrame(data = {'feature_no': numpy.arange(self.ncol),
+                                                       'feature_name': list(self.feature_names),
+                                                       'vNE': self.vNE + self.influence[row, :]})
         return(self.result_summary)
 
 
@@ -98,18 +1121,51 @@ class InfoRichCalling:
     """
 
     def __init__(self, data, current_feature_names, upper_threshold_factor, lower_threshold_factor,
-                 num_cpu, direct_from_result_summary, normalize, silence = False, suppress = False):
+                 num_cpu, direct_from_result_summary, normalize, minus_one_options = None, precomputed_result_summary = None,
+                 silence = False, suppress = False):
+        # keyword arguments (for example: engine) passed on to MinusOneVNE
+        self.minus_one_options = {} if minus_one_options is None else minus_one_options
+        # MinusOneVNE.result_summary of <data> computed elsewhere (for example: JackknifeVNE)
+        self.precomputed_result_summary = precomputed_result_summary
+
         if len(direct_from_result_summary) == 0:
-            self.data = numpy.array(data)
+            self.data = asMatrix(data)
             self.feature_names = current_feature_names
             self.normalize = normalize
-            self.current_result_summary = MinusOneVNE(data = self.data, normalize = self.normalize, feature_names = self.feature_names, num_cpu = num_cpu).minusOneResult()
+            # largest difference from float64 (None when everything ran in float64)
+            self.max_precision_deviation = None
+            # von Neumann entropies that the bounds made unnecessary (None without pruning)
+            self.num_pruned = None
+            # largest sample leverage of reproducibility(jackknife = 'infinitesimal') (None otherwise)
+            self.max_leverage = None
+            if self.precomputed_result_summary is not None:
+                self.current_result_summary = self.precomputed_result_summary
+            else:
+                minus_one = MinusOneVNE(data = self.data, normalize = self.normalize, feature_names = self.feature_names,
+                                        num_cpu = num_cpu, **self.minus_one_options)
+                if minus_one.prune == True:
+                    self.current_result_summary = minus_one.prunedResult(upper_threshold_factor = upper_threshold_factor,
+                                                                         lower_threshold_factor = lower_threshold_factor)
+                    self.num_pruned = minus_one.num_pruned
+                elif minus_one.screen is None:
+                    self.current_result_summary = minus_one.minusOneResult()
+                else:
+                    self.current_result_summary = minus_one.screenedResult(upper_threshold_factor = upper_threshold_factor,
+                                                                           lower_threshold_factor = lower_threshold_factor)
+                if minus_one.precision != 'float64':
+                    self.current_result_summary = minus_one.refinedResult(self.current_result_summary,
+                                                                          upper_threshold_factor = upper_threshold_factor,
+                                                                          lower_threshold_factor = lower_threshold_factor)
+                    self.max_precision_deviation = minus_one.max_precision_deviation
             self.start_from_data = True
             self.force_output = False
         else:
             #self.data = data                           # not important when set direct_from_result_summary = True. Can even be ''.
             #self.feature_names = current_feature_names # not important when set direct_from_result_summary = True. Can even be ''.
             self.current_result_summary = direct_from_result_summary
+            self.max_precision_deviation = None
+            self.num_pruned = None
+            self.max_leverage = None
             self.start_from_data = False
             self.force_output = True                    # avoid abort the program when arise ErrorCode4
 
@@ -194,8 +1250,77 @@ class InfoRichCalling:
         self.info_rich_feature = self.result_summary.loc[self.result_summary["info_rich_feature"] > 0]   # <class 'pandas.core.frame.DataFrame'>
 
 
+class SequentialStop:
+    """
+    Sequential early stopping of the jackknife in reproducibility(). After every subsample, a
+    feature is settled 'in' once its occurrence reaches <infoRich_threshold> (out of all
+    <num_subsample> subsamples), or once the lower bound of the Wilson score interval of its
+    nomination rate at <confidence> predicts that it will; 'out' once it can no longer reach
+    <infoRich_threshold> in the subsamples left, or once the upper bound predicts that it will
+    not. The jackknife stops when every feature is settled.
+
+    Arguments:
+        feature_names -- Type: list
+        num_subsample -- Type: int
+                         Number of subsamples the jackknife would run without stopping
+        infoRich_threshold -- Type: int
+        confidence -- Type: float
+                      Confidence level of the bounds (1: stop only when every decision is certain)
+        min_subsample -- Type: int
+                         Subsamples before the bounds may settle a feature
+
+    Attributes:
+        num_used -- Type: int
+                    Number of subsamples so far
+        num_undecided -- Type: int
+                         Number of features that are not settled yet
+        settled -- Type: boolean
+    """
+
+    def __init__(self, feature_names, num_subsample, infoRich_threshold, confidence = 0.95, min_subsample = 10):
+        self.feature_names = list(feature_names)
+        self.num_subsample = num_subsample
+        self.infoRich_threshold = infoRich_threshold
+        self.confidence = confidence
+        self.min_subsample = min_subsample
+        self.z = scipy.stats.norm.ppf(0.5 + confidence / 2) if confidence < 1 else None
+        self.num_used = 0
+        self.num_undecided = len(self.feature_names)
+        self.settled = False
+
+    def wilsonBounds(self, occurrence):
+        """
+        Wilson score interval of the nomination rate of every feature after num_used subsamples
+        """
+        k, z = float(self.num_used), self.z
+        rate = occurrence / k
+        center = (rate + z * z / (2 * k)) / (1 + z * z / k)
+        half_width = z * numpy.sqrt(rate * (1 - rate) / k + z * z / (4 * k * k)) / (1 + z * z / k)
+        return(center - half_width, center + half_width)
+
+    def update(self, infoRich_dict):
+        """
+        Count one more subsample (already added to <infoRich_dict>) and check whether every
+        feature is settled
+        """
+        self.num_used += 1
+        occurrence = numpy.array([infoRich_dict.get(name, 0) for name in self.feature_names], dtype = float)
+        settled_in = occurrence >= self.infoRich_threshold
+        settled_out = occurrence + (self.num_subsample - self.num_used) < self.infoRich_threshold
+        if self.z is not None and self.num_used >= self.min_subsample:
+            lower, upper = self.wilsonBounds(occurrence)
+            threshold_rate = self.infoRich_threshold / self.num_subsample
+            settled_in |= lower >= threshold_rate
+            settled_out |= upper < threshold_rate
+        self.num_undecided = int(numpy.sum(~(settled_in | settled_out)))
+        self.settled = self.num_undecided == 0
+        return(self.settled)
+
+
 def reproducibility(InfoRichCalling_class, infoRich_dict, nrow, basename, vNE_output_folder,
-                    output_file_tag, direct_from_result_summary, num_cpu, normalize):
+                    output_file_tag, direct_from_result_summary, num_cpu, normalize, minus_one_options = None,
+                    jackknife = 'refit', subsamples = None, stopping = None, seed = 0, cache = None, cache_key = None,
+                    suppress = False):
     ## Need to be careful about the data and feature_names. They should be updated if user
     ## call the filtering function. To avoid confusion, I decided to not to list this
     ## function under MinusOneVNE or InfoRichCalling
@@ -206,36 +1331,168 @@ def reproducibility(InfoRichCalling_class, infoRich_dict, nrow, basename, vNE_ou
     1. Aovid potential confusion regrading the data matrix (-1 row compared to the data matrix in
        InfoRichCalling_class)
     2. Easier for multiprocessing
-    """
-    for j in range(nrow):
-        # delete row by index
-        jackknift_subset = numpy.delete(InfoRichCalling_class.data, j, 0)
 
-        info_rich_result = InfoRichCalling(data = jackknift_subset,
-                                           current_feature_names = InfoRichCalling_class.feature_names,
-                                           upper_threshold_factor = InfoRichCalling_class.upper_threshold_factor,
-                                           lower_threshold_factor = InfoRichCalling_class.lower_threshold_factor,
-                                           num_cpu = num_cpu, normalize = normalize,
-                                           direct_from_result_summary = direct_from_result_summary)
+    Arguments:
+        jackknife -- Type: str
+                     'refit': calculate the von Neumann entropies of every subsample from scratch with
+                              MinusOneVNE (<minus_one_options>), as one set of tasks over all
+                              subsamples (see MinusOneVNE.jackknifeResult()) unless screening,
+                              pruning or float32 needs the thresholds of each subsample first
+                     'update': derive every subsample from the full data matrix with JackknifeVNE
+                               (exact; only the 'precision' and 'memory_budget' entries of
+                               <minus_one_options> apply)
+                     'infinitesimal': predict every subsample from the first-order influence of
+                                      its sample on the full data matrix with InfinitesimalJackknifeVNE
+                                      (approximate, about the cost of one sweep; ignores
+                                      <minus_one_options>)
+                     'subsample': same as 'refit', but for the delete-d subsamples in <subsamples>
+                                  instead of the <nrow> leave-one-out ones
+        subsamples -- Type: list of tuples or None
+                      Rows to delete together for jackknife = 'subsample' (see drawSubsamples())
+        stopping -- Type: SequentialStop or None
+                    Stop as soon as every feature is settled. The leave-one-out subsamples then
+                    run in a random order (drawn with <seed>) instead of the row order; the
+                    detail_vNE files keep the index of the sample left out.
+        cache -- Type: toolbox.cache.ResultCache or None
+                 Reuse the subsamples calculated by earlier runs, and store the new ones
+        cache_key -- Type: dict
+                     What the von Neumann entropies of the full data matrix depend on (see
+                     Kernal.cacheKey()); the subsample and <jackknife> are added to it
+    """
+    try:
+        if jackknife not in ['refit', 'update', 'subsample', 'infinitesimal']:
+            raise Error(code = '49')
+        if (jackknife == 'subsample') != (subsamples is not None):
+            raise Error(code = '49')
+    except Error as e:
+        raise ErrorCode49(suppress = suppress) from e
+
+    rows = list(range(nrow)) if subsamples is None else subsamples
+    if stopping is not None and subsamples is None:
+        rows = numpy.random.default_rng(seed).permutation(nrow).tolist()
+
+    # subsamples calculated by an earlier run
+    cached_results = {}
+    if cache is not None:
+        for j in rows:
+            cached_result = cache.get(cache.key(subsample = j, jackknife = jackknife, **cache_key))
+            if cached_result is not None:
+                cached_results[j] = cached_result
+    missing = [j for j in rows if j not in cached_results]
+
+    options = {} if minus_one_options is None else minus_one_options
+    if len(missing) == 0:
+        subsample_results = iter([])
+    elif jackknife == 'update':
+        jackknife_vNE = JackknifeVNE(data = InfoRichCalling_class.data, normalize = normalize,
+                                     feature_names = InfoRichCalling_class.feature_names,
+                                     precision = options.get('precision', 'float64'),
+                                     memory_budget = options.get('memory_budget', 2 ** 28))
+        subsample_results = ((j, jackknife_vNE.minusOneResult(j)) for j in missing)
+    elif jackknife == 'infinitesimal':
+        jackknife_vNE = InfinitesimalJackknifeVNE(data = InfoRichCalling_class.data, normalize = normalize,
+                                                  feature_names = InfoRichCalling_class.feature_names, suppress = suppress)
+        jackknife_vNE.influenceResult()
+        # reported by Kernal.infoRichCallingAndReproducibility()
+        InfoRichCalling_class.max_leverage = jackknife_vNE.max_leverage
+        subsample_results = ((j, jackknife_vNE.minusOneResult(j)) for j in missing)
+    elif (options.get('engine', 'svd') != 'batched' and options.get('screen') is None and
+          options.get('prune', False) == False and options.get('precision', 'float64') == 'float64'):
+        # one flat set of (subsample x feature block) tasks instead of a pool barrier per subsample
+        subsample_results = MinusOneVNE(data = InfoRichCalling_class.data, normalize = normalize,
+                                        feature_names = InfoRichCalling_class.feature_names,
+                                        num_cpu = num_cpu, **options).jackknifeResult(rows = missing)
+    else:
+        # screening, pruning and float32 refinement need the thresholds of each subsample
+        subsample_results = ((j, None) for j in missing)
+    subsample_results = mergeCachedResults(rows, cached_results, subsample_results)
+
+    try:
+        for position, (j, precomputed_result_summary) in enumerate(subsample_results):
+            # delete row(s) by index
+            jackknift_subset = deleteIndex(InfoRichCalling_class.data, j, axis = 0)
+
+            info_rich_result = InfoRichCalling(data = jackknift_subset,
+                                               current_feature_names = InfoRichCalling_class.feature_names,
+                                               upper_threshold_factor = InfoRichCalling_class.upper_threshold_factor,
+                                               lower_threshold_factor = InfoRichCalling_class.lower_threshold_factor,
+                                               num_cpu = num_cpu, normalize = normalize,
+                                               direct_from_result_summary = direct_from_result_summary,
+                                               minus_one_options = minus_one_options,
+                                               precomputed_result_summary = precomputed_result_summary)
+            if cache is not None and j not in cached_results:
+                cache.put(cache.key(subsample = j, jackknife = jackknife, **cache_key),
+                          info_rich_result.current_result_summary.copy())
+
+            info_rich_result.infoRichSelect()
+
+            detail_calling_result = info_rich_result.result_summary
+            detail_calling_result['info_rich_feature'] = detail_calling_result['info_rich_feature'].replace([0, 1], ["No", "Yes"])
+            detail_vNE_file_name = os.path.join(vNE_output_folder, basename.replace(".csv", "")) + output_file_tag + "__sub_" + str(j if subsamples is None else position) + "_detail_vNE.csv"
+            detail_calling_result.to_csv(detail_vNE_file_name)
+
+            for element in info_rich_result.info_rich_feature['feature_name']:
+                if element in infoRich_dict.keys():
+                    infoRich_dict[element] += 1
+                else:
+                    infoRich_dict[element] = 1
 
-        info_rich_result.infoRichSelect()
+            if stopping is not None and stopping.update(infoRich_dict):
+                break
+    finally:
+        # stop a MinusOneVNE.jackknifeResult() that an error left half done, and free its shared memory
+        subsample_results.close()
+    return(infoRich_dict)
 
-        detail_calling_result = info_rich_result.result_summary
-        detail_calling_result['info_rich_feature'] = detail_calling_result['info_rich_feature'].replace([0, 1], ["No", "Yes"])
-        detail_vNE_file_name = os.path.join(vNE_output_folder, basename.replace(".csv", "")) + output_file_tag + "__sub_" + str(j) + "_detail_vNE.csv"
-        detail_calling_result.to_csv(detail_vNE_file_name)
 
-        for element in info_rich_result.info_rich_feature['feature_name']:
-            if element in infoRich_dict.keys():
-                infoRich_dict[element] += 1
+def mergeCachedResults(rows, cached_results, computed_results):
+    """
+    Yield (row, result_summary) in the order of <rows>: from <cached_results> for the cached
+    rows, otherwise the next item of <computed_results> (which yields the other rows in order).
+    Closing this generator closes <computed_results>.
+    """
+    try:
+        for j in rows:
+            if j in cached_results:
+                yield(j, cached_results[j])
             else:
-                infoRich_dict[element] = 1
-    return(infoRich_dict)
+                yield(next(computed_results))
+    finally:
+        if hasattr(computed_results, 'close'):
+            computed_results.close()
+
+
+def drawSubsamples(nrow, num_subsample, delete_num, seed = 0):
+    """
+    Draw <num_subsample> different sets of <delete_num> rows (out of <nrow>) at random for the
+    delete-d jackknife, or take every set when there are no more than <num_subsample> of them.
+
+    Return:
+        Type: list of tuples
+        Sorted row indices to delete from each subsample
+    """
+    if math.comb(nrow, delete_num) <= num_subsample:
+        return(list(itertools.combinations(range(nrow), delete_num)))
 
+    rng = numpy.random.default_rng(seed)
+    subsamples = []
+    drawn = set()
+    while len(subsamples) < num_subsample:
+        rows = tuple(sorted(rng.choice(nrow, size = delete_num, replace = False).tolist()))
+        if rows not in drawn:
+            drawn.add(rows)
+            subsamples.append(rows)
+    return(subsamples)
 
-def reproducibility_summary(filtered_matrix, infoRich_dict):
-    filtered_matrix = numpy.array(filtered_matrix)
-    nrow = numpy.size(filtered_matrix, 0)
+
+def reproducibility_summary(filtered_matrix, infoRich_dict, num_subsample = None):
+    """
+    Occurrence and reproducibility (%) of every feature in <infoRich_dict>, out of the leave-one-out
+    subsamples of <filtered_matrix>, or out of <num_subsample> random delete-d subsamples. The
+    latter also reports the Monte Carlo standard error of the reproducibility:
+    100 * sqrt(p * (1 - p) / num_subsample), where p is the fraction of the subsamples.
+    """
+    nrow = numpy.shape(filtered_matrix)[0] if num_subsample is None else num_subsample
 
     infoRich_dict_to_list = []
 
@@ -246,6 +1503,9 @@ def reproducibility_summary(filtered_matrix, infoRich_dict):
     infoRich_reproducibility = pandas.DataFrame(data = infoRich_dict_to_list,
                                                 columns=['feature_name', 'occurrence'])
     infoRich_reproducibility['repreducibility (%)'] = infoRich_reproducibility['occurrence'] / nrow * 100
+    if num_subsample is not None:
+        fraction = infoRich_reproducibility['occurrence'] / nrow
+        infoRich_reproducibility['standard_error (%)'] = numpy.sqrt(fraction * (1 - fraction) / nrow) * 100
     return(infoRich_reproducibility)
 
 
@@ -256,11 +1516,11 @@ class Kernal:
 
     def __init__(self, file_name, detection_limit, tolerance, filter, upper_lim, lower_lim,
                  infoRich_threshold, quick_look, use_fractional_abundance, vNE_output_folder,
-                 output_file_tag, num_cpu, notebook_name, normalize, neglect = False, silence = False,
-                 suppress = False):
+                 output_file_tag, num_cpu, notebook_name, normalize, minus_one_options = None, sparse = False,
+                 reproducibility_options = None, cache = None, neglect = False, silence = False, suppress = False):
 
         self.input_matrix = RawDataImport(file_name = file_name, for_merging_file = False,
-                                          suppress = False, second_chance = False)
+                                          suppress = False, second_chance = False, sparse = sparse)
         self.basename = os.path.basename(file_name)
         print('\nworking on: ' + self.basename)
 
@@ -279,6 +1539,11 @@ class Kernal:
         self.num_cpu = num_cpu
         self.neglect = neglect
         self.normalize = normalize
+        self.minus_one_options = minus_one_options
+        # keyword arguments (for example: jackknife) passed on to reproducibility()
+        self.reproducibility_options = {} if reproducibility_options is None else reproducibility_options
+        # toolbox.cache.ResultCache of the von Neumann entropies of earlier runs (None: no cache)
+        self.cache = cache
         self.silence = silence
         self.suppress = suppress
 
@@ -292,13 +1557,17 @@ class Kernal:
 
         if self.detection_limit > 0:
             try:
-                if max(self.input_matrix.data.max()) < self.detection_limit:
+                if self.input_matrix.maxValue() < self.detection_limit:
                     raise Error(code = 6)
             except Error as e:
                 raise ErrorCode6(suppress = self.suppress)
 
             self.input_matrix.detectionLimit(detection_limit = self.detection_limit)
 
+            # a dense raw_data_before_filter is the same DataFrame that detectionLimit() changes in place
+            if self.input_matrix.sparse == True and self.use_fractional_abundance == True:
+                self.input_matrix.raw_data_before_filter = self.input_matrix.applyDetectionLimit(self.input_matrix.raw_data_before_filter)
+
         if self.filter:
           if self.filter == 'HardFilter':
               self.input_matrix.hardFilter(zero_tolerance_level = self.tolerance)
@@ -314,10 +1583,144 @@ class Kernal:
         notebook.updateFilterResult(num_sample = num_sample, num_feature = num_feature, num_feature_removed = num_feature_removed, basename = self.basename)
 
 
+    def planMemory(self, data):
+        """
+        MinusOneVNE options for <data>. With a 'max_memory' entry (bytes) or engine = 'auto',
+        toolbox.planner.MemoryPlan picks the engine (when 'auto'), the backend (when 'auto') and
+        the number of tasks at a time that fit the budget (default: the memory of this computer).
+        """
+        options = {} if self.minus_one_options is None else dict(self.minus_one_options)
+        max_memory = options.pop('max_memory', None)
+        if max_memory is None and options.get('engine') != 'auto':
+            return(options)
+        if max_memory is None:
+            max_memory = physicalMemory()
+
+        backend = options.get('backend', 'processes')
+        # the serial backend runs one task at a time in this process, like a single thread
+        plan = MemoryPlan(nrow = data.shape[0], ncol = data.shape[1],
+                          itemsize = numpy.dtype(options.get('precision', 'float64')).itemsize,
+                          num_cpu = 1 if backend == 'serial' else self.num_cpu, max_memory = max_memory,
+                          engine = options.get('engine', 'svd'), backend = 'threads' if backend == 'serial' else backend,
+                          nnz = data.nnz if scipy.sparse.issparse(data) else None, num_workers = self.poolWorkers(options),
+                          suppress = self.suppress)
+        options['engine'] = plan.engine
+        options['max_tasks'] = plan.max_tasks
+        options['worker_contexts'] = plan.worker_contexts
+        if backend != 'serial':
+            options['backend'] = plan.backend
+        if plan.memory_budget is not None:
+            options['memory_budget'] = plan.memory_budget
+
+        print('memory plan: ' + plan.summary())
+        notebook = UpdateNoteBook(notebook_name = self.notebook_name, neglect = self.neglect)
+        notebook.updateMemoryPlan(basename = self.basename, plan_summary = plan.summary())
+        return(options)
+
+    def poolWorkers(self, options):
+        """
+        Number of local worker processes that keep MinusOneVNE objects between tasks: those of the
+        shared WorkerPool (which may be larger than <num_cpu> when files run concurrently), otherwise
+        <num_cpu>. None for the 'serial' backend.
+        """
+        if options.get('backend', 'processes') == 'serial':
+            return(None)
+        pool = options.get('pool')
+        if isinstance(pool, WorkerPool):
+            return(pool.num_cpu)
+        return(self.num_cpu)
+
+
+    def subsampleDesign(self, nrow, sweep_seconds):
+        """
+        reproducibility() options (a 'stop_confidence' entry is handled by
+        infoRichCallingAndReproducibility()). For jackknife = 'subsample', draw the delete-d subsamples:
+        'delete_num' rows each (default: the square root of <nrow>), 'subsample_num' of them, or
+        without 'subsample_num', as many as fit in 'budget' seconds when every subsample takes
+        as long as the full data matrix did (<sweep_seconds>). 'budget' counts wall-clock time,
+        or CPU time of the num_cpu CPUs with 'budget_clock' = 'cpu'. Default: <nrow> subsamples,
+        as many as leave-one-out.
+        """
+        options = dict(self.reproducibility_options)
+        if options.get('jackknife') != 'subsample':
+            return(options)
+
+        delete_num = options.pop('delete_num', None)
+        subsample_num = options.pop('subsample_num', None)
+        budget = options.pop('budget', None)
+        budget_clock = options.pop('budget_clock', 'wall')
+        seed = options.pop('seed', 0)
+
+        if delete_num is None:
+            delete_num = max(1, int(round(numpy.sqrt(nrow))))
+        if subsample_num is None and budget is not None:
+            wall_seconds = budget / self.num_cpu if budget_clock == 'cpu' else budget
+            subsample_num = max(2, int(wall_seconds // max(sweep_seconds, 1e-9)))
+        if subsample_num is None:
+            subsample_num = nrow
+
+        try:
+            # every subsample keeps at least two samples
+            if delete_num < 1 or delete_num > nrow - 2 or subsample_num < 2:
+                raise Error(code = '53')
+        except Error as e:
+            raise ErrorCode53(suppress = self.suppress) from e
+
+        options['subsamples'] = drawSubsamples(nrow = nrow, num_subsample = subsample_num, delete_num = delete_num, seed = seed)
+
+        design = (str(len(options['subsamples'])) + ' subsample(s) without ' + str(delete_num) + ' of ' + str(nrow) +
+                  ' samples each (full data: ' + str(round(sweep_seconds, 3)) + ' s)')
+        print('delete-d jackknife: ' + design)
+        notebook = UpdateNoteBook(notebook_name = self.notebook_name, neglect = self.neglect)
+        notebook.updateSubsampleDesign(basename = self.basename, design = design)
+        return(options)
+
+
+    def cacheKey(self, data, minus_one_options):
+        """
+        What the von Neumann entropies of <data> depend on, for toolbox.cache.ResultCache: the
+        values of the filtered matrix, the feature names, normalize, epsilon, the filter, the
+        MinusOneVNE options that change the values, and the thresholds when screening, pruning
+        or refinement depends on them
+        """
+        options = {name: value for name, value in minus_one_options.items() if name not in execution_options}
+        thresholds = None
+        if options.get('screen') is not None or options.get('prune', False) or options.get('refine') is not None:
+            thresholds = (self.upper_lim, self.lower_lim)
+        return({'matrix': matrixDigest(data), 'feature_names': tuple(self.filtered_data.feature_names),
+                'normalize': self.normalize, 'epsilon': default_epsilon,
+                'filter': (self.filter, self.tolerance, self.detection_limit, self.use_fractional_abundance),
+                'options': tuple(sorted(options.items())), 'thresholds': thresholds})
+
+
     def infoRichCallingAndReproducibility(self):
-        self.info_rich_result = InfoRichCalling(data = self.filtered_data.data, current_feature_names = self.filtered_data.feature_names,
+        data = self.filtered_data.numericData()
+        minus_one_options = self.planMemory(data)
+
+        cache_key = None
+        cached_result = None
+        if self.cache is not None:
+            cache_key = self.cacheKey(data, minus_one_options)
+            cached_result = self.cache.get(self.cache.key(subsample = None, **cache_key))
+
+        sweep_start = time.perf_counter()
+        self.info_rich_result = InfoRichCalling(data = data, current_feature_names = self.filtered_data.feature_names,
                                                 upper_threshold_factor = self.upper_lim, lower_threshold_factor = self.lower_lim,
-                                                num_cpu = self.num_cpu, normalize = self.normalize, direct_from_result_summary = '', silence = self.silence)
+                                                num_cpu = self.num_cpu, normalize = self.normalize, direct_from_result_summary = '',
+                                                minus_one_options = minus_one_options, silence = self.silence,
+                                                precomputed_result_summary = None if cached_result is None else cached_result['result_summary'])
+        sweep_seconds = time.perf_counter() - sweep_start
+        if self.cache is not None:
+            if cached_result is None:
+                self.cache.put(self.cache.key(subsample = None, **cache_key),
+                               {'result_summary': self.info_rich_result.current_result_summary.copy(), 'seconds': sweep_seconds,
+                                'num_pruned': self.info_rich_result.num_pruned,
+                                'max_precision_deviation': self.info_rich_result.max_precision_deviation})
+            else:
+                # the -subsampleBudget plan needs the time of the calculation, not of the cache
+                sweep_seconds = cached_result['seconds']
+                self.info_rich_result.num_pruned = cached_result['num_pruned']
+                self.info_rich_result.max_precision_deviation = cached_result.get('max_precision_deviation')
 
         if self.quick_look == True:
             print("Feature reduction with emmer...")
@@ -335,15 +1738,49 @@ class Kernal:
         else:
             print("\nCalculating the reproducibility of information-rich feature calling...")
             self.infoRich_dict = {}
-            self.nrow = numpy.size(numpy.array(self.info_rich_result.data), 0)
+            self.nrow = numpy.size(self.info_rich_result.data, 0)
+            reproducibility_options = self.subsampleDesign(nrow = self.nrow, sweep_seconds = sweep_seconds)
+            subsamples = reproducibility_options.get('subsamples')
+            stop_confidence = reproducibility_options.pop('stop_confidence', None)
+            stopping = None
+            if stop_confidence is not None:
+                stopping = SequentialStop(feature_names = self.info_rich_result.feature_names,
+                                          num_subsample = self.nrow if subsamples is None else len(subsamples),
+                                          infoRich_threshold = self.infoRich_threshold, confidence = stop_confidence)
+                reproducibility_options['stopping'] = stopping
 
             infoRich_dict = reproducibility(InfoRichCalling_class = self.info_rich_result, infoRich_dict = self.infoRich_dict,
                                             nrow = self.nrow, basename = self.basename, vNE_output_folder = self.vNE_output_folder,
                                             output_file_tag = self.output_file_tag, normalize = self.normalize, num_cpu = self.num_cpu,
-                                            direct_from_result_summary = '')
+                                            direct_from_result_summary = '', minus_one_options = minus_one_options,
+                                            cache = self.cache, cache_key = cache_key, **reproducibility_options)
             infoRich_dict_filtered = {key:val for key, val in infoRich_dict.items() if val >= self.infoRich_threshold}
-
-            info_rich_features_w_reproducibility = reproducibility_summary(self.info_rich_result.data, infoRich_dict_filtered)
+            num_subsample = None if subsamples is None else len(subsamples)
+
+            if stopping is not None and stopping.num_used < stopping.num_subsample:
+                # features settled 'in' are nominated in at least infoRich_threshold / num_subsample of the subsamples used
+                infoRich_dict_filtered = {key:val for key, val in infoRich_dict.items()
+                                          if val * stopping.num_subsample >= self.infoRich_threshold * stopping.num_used}
+                num_subsample = stopping.num_used
+            if stopping is not None:
+                print('sequential stopping: ' + str(stopping.num_used) + ' of ' + str(stopping.num_subsample) + ' subsample(s) used')
+                notebook = UpdateNoteBook(notebook_name = self.notebook_name, neglect = self.neglect)
+                notebook.updateSequentialStop(basename = self.basename, num_used = stopping.num_used,
+                                              num_subsample = stopping.num_subsample, confidence = stopping.confidence)
+
+            max_leverage = self.info_rich_result.max_leverage
+            if max_leverage is not None:
+                print('infinitesimal jackknife: largest sample leverage ' + str(round(max_leverage, 4)))
+                notebook = UpdateNoteBook(notebook_name = self.notebook_name, neglect = self.neglect)
+                notebook.updateLeverage(basename = self.basename, max_leverage = max_leverage)
+                try:
+                    if max_leverage > leverage_warning:
+                        raise WarningCode14(silence = self.silence)
+                except WarningCode14:
+                    self.warning_code = '14'
+
+            info_rich_features_w_reproducibility = reproducibility_summary(self.info_rich_result.data, infoRich_dict_filtered,
+                                                                           num_subsample = num_subsample)
 
             r, c = info_rich_features_w_reproducibility.shape
             max_num = numpy.minimum(numpy.size(self.info_rich_result.data, 0), numpy.size(self.info_rich_result.data, 1))
@@ -360,5 +1797,21 @@ class Kernal:
 
             self.list_of_info_rich_features = list(self.info_rich_features_w_reproducibility['feature_name'])
 
+        if self.cache is not None:
+            # counts of the whole run (input files processed at the same time share the cache)
+            print('result cache: ' + str(self.cache.hits) + ' hit(s), ' + str(self.cache.misses) + ' miss(es) so far')
+
+        if self.info_rich_result.num_pruned is not None:
+            num_feature = len(self.info_rich_result.feature_names)
+            print('Pruning: ' + str(self.info_rich_result.num_pruned) + ' of ' + str(num_feature) +
+                  ' exact von Neumann entropy calculation(s) skipped')
+            notebook = UpdateNoteBook(notebook_name = self.notebook_name, neglect = self.neglect)
+            notebook.updatePruneResult(num_pruned = self.info_rich_result.num_pruned, num_feature = num_feature)
+
+        if self.info_rich_result.max_precision_deviation is not None:
+            print('Largest deviation of the von Neumann entropy from float64: ' + str(self.info_rich_result.max_precision_deviation))
+            notebook = UpdateNoteBook(notebook_name = self.notebook_name, neglect = self.neglect)
+            notebook.updatePrecisionResult(max_deviation = self.info_rich_result.max_precision_deviation)
+
         notebook = UpdateNoteBook(notebook_name = self.notebook_name, neglect = self.neglect)
         notebook.updateEmmerResult(num_info_rich = len(self.list_of_info_rich_features))
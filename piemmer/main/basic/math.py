@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 
-from ...troubleshoot.err.error import Error, ErrorCode41, ErrorCode46
+from ...troubleshoot.err.error import Error, ErrorCode41, ErrorCode46, ErrorCode49
 
+from scipy.sparse.linalg import LinearOperator
+import scipy.sparse
+import scipy.stats
 import pandas
 import numpy
 import math
@@ -11,18 +14,54 @@ This module stores the mathematical tools for converting the input matrix into
 a density matrix and calculate the von Neumann entropy.
 """
 
+# machine precision of the eigenvalues: 10^-default_epsilon
+default_epsilon = 8
+
+# largest share of an eigenvalue (z_k^2 / eigvals_k), and of the trace (sum of z^2), that
+# downdateEigvals() removes accurately. Beyond it the secular equation cancels catastrophically
+# (the removed column dominates the spectrum) and downdatedEigvals() decomposes directly.
+downdate_max_ratio = 0.999
+downdate_max_trace_share = 0.9
+
+
 class NonDesityMatrix:
     """
     Transform a numeric non-density matrix and calculate the von Neumann entropy.
 
     Arguments:
-        data -- Type: RawDataImport.data (pandas.DataFrame)
+        data -- Type: RawDataImport.data (pandas.DataFrame), numpy.ndarray or scipy.sparse matrix
+                A scipy.sparse matrix is never densified: mean centering and scaling are applied
+                implicitly (see CenteredSparseMatrix)
         epsilon -- Type: int
                    Define machine percision. When set at '8', it means that the
                    machine percision is 10^-8
         use_cor_matrix -- Type: boolean
                           When set as True, calculated the eigenvalue from the
                           correlation matrix
+        method -- Type: str
+                  How to get the eigenvalues.
+                  'svd': SVD of the n x p <self.matrixForSVD>
+                  'gram': eigvalsh of the n x n Gram matrix (M * M.transpose). Cheap when n << p
+                  'cov': eigvalsh of the p x p matrix (M.transpose * M). Cheap when p << n
+                  'randomized': approximate. Top-k spectrum from a randomized range finder; the
+                                unresolved tail only enters the entropy through its bounds
+                                (see approximateSpectrum())
+                  'auto': choose one of 'svd', 'gram' and 'cov' from the shape of the matrix and the
+                          percision required by <epsilon> (see chooseMethod())
+                  'slq': approximate. Stochastic Lanczos quadrature; only needs products of the
+                         matrix with vectors, so neither the Gram matrix nor any dense decomposition
+                         is formed (see stochasticLanczosEntropy())
+        tolerance -- Type: float
+                     Largest acceptable error bound (in bits) of the von Neumann entropy when
+                     method = 'randomized'
+        num_probe -- Type: int
+                     Number of random probe vectors when method = 'slq'
+        lanczos_steps -- Type: int
+                         Number of Lanczos steps per probe vector when method = 'slq'
+        precision -- Type: str
+                     'float64' or 'float32'. Floating point type of the centered matrix and of the
+                     decompositions. 'float32' halves the memory traffic; the entropy itself is
+                     always summed in float64
 
     Attribute:
         data -- Type: numpy.ndarray
@@ -41,7 +80,9 @@ class NonDesityMatrix:
                   A matrix that has one row and <self.ncol> columns, each element in
                   this matrix represents the standard deviation of its corresponding
                   column in <self.data>
-        matrixForSVD -- Type: numpy.ndarray
+        sparse -- Type: boolean
+                  Whether <self.data> is a scipy.sparse (CSR) matrix
+        matrixForSVD -- Type: numpy.ndarray or CenteredSparseMatrix (when <self.sparse> is True)
                         A matrix that is transform from <self.data> and ready for SVD.
                         The transformation is conducted so the <self.matrixForSVD> will
                         satistify the following relationship:
@@ -55,14 +96,49 @@ class NonDesityMatrix:
         numZeroEig -- Type: numpy.int64
                       The number of normalized eigenvalues that equals to zero or less
                       than <self.epsilon>
+        method_used -- Type: str
+                       The method that actually generated the eigenvalues ('svd', 'gram' or 'cov')
+        squared_singular_values -- Type: numpy.ndarray
+                                   Cached squared singular values of <self.matrixForSVD> in descending
+                                   order. None until spectrum() runs
+        singular_values -- Type: numpy.ndarray
+                           Cached singular values of <self.matrixForSVD>
+        norm_eigvals -- Type: numpy.ndarray
+                        Cached normalized eigenvalues. Shared by normEigvals(), vNE() and numZeroEig()
+        U -- Type: numpy.ndarray
+             Cached left singular vectors (row: sample; col: principal components). None until
+             spectrum(compute_uv = True) runs
+        Vh -- Type: numpy.ndarray
+              Cached right singular vectors (row: principal components; col: features)
+        tail_entropy -- Type: float
+                        Entropy added to that of the resolved eigenvalues to account for the mass
+                        that was not resolved. Zero unless method = 'randomized'
+        vNE_error_bound -- Type: float
+                           Largest possible error of <self.vNE> when method = 'randomized'; half
+                           width of the 95% confidence interval of the probes plus the estimated
+                           quadrature error when method = 'slq' (see stochasticLanczosEntropy()).
+                           Zero otherwise
     """
-    def __init__(self, data, normalize, epsilon = 8, suppress = False):
-        self.data = numpy.array(data)
+    def __init__(self, data, normalize, epsilon = default_epsilon, suppress = False, method = 'auto', tolerance = 0.01,
+                 num_probe = 30, lanczos_steps = 30, precision = 'float64'):
+        self.suppress = suppress
+        try:
+            if precision not in ['float64', 'float32']:
+                raise Error(code = '49')
+        except Error as e:
+            raise ErrorCode49(suppress = self.suppress) from e
+        self.dtype = numpy.dtype(precision)
+
+        self.sparse = scipy.sparse.issparse(data)
+        if self.sparse == True:
+            self.data = scipy.sparse.csr_matrix(data, dtype = self.dtype)
+        else:
+            # no copy; prepareMatrix() never changes <self.data>
+            self.data = numpy.asarray(data)
         self.epsilon = 10 ** (-epsilon)
         self.normalize = normalize   # when True: use correlation matrix instead of covariance matrix
         self.nrow = numpy.size(self.data, 0)
         self.ncol = numpy.size(self.data, 1)
-        self.suppress = suppress
 
         try:
             if self.nrow < 2:
@@ -70,43 +146,297 @@ class NonDesityMatrix:
         except Error as e:
             raise ErrorCode41(suppress = self.suppress) from e
 
+        try:
+            if method not in ['auto', 'svd', 'gram', 'cov', 'randomized', 'slq']:
+                raise Error(code = '49')
+        except Error as e:
+            raise ErrorCode49(suppress = self.suppress) from e
+        self.method = method
+        self.tolerance = tolerance
+        self.num_probe = num_probe
+        self.lanczos_steps = lanczos_steps
 
-    def normEigvals(self):
-        """
-        Prepare normalized eigenvalues for the von Neumann entropy calculation
+        self.matrixForSVD = None
+        self.squared_singular_values = None
+        self.U = None
+        self.Vh = None
 
-        The math behide this computational process is:
-        (signular_val of M)^2 = eigvals of (M * M.transpose)
+
+    def prepareMatrix(self):
         """
+        Mean center (and scale, when <self.normalize> is True) the input matrix so the
+        squared singular values of <self.matrixForSVD> are the eigenvalues we need.
+        """
+        if self.sparse == True:
+            return(self.prepareSparseMatrix())
 
-        ##--1--## preparing matrix
         # mean center the matrix:
         # the element in each column minus the corresponding colmean
         try:
-            self.colmean = numpy.mean(numpy.array(self.data), axis = 0)
-        except TypeError as e:
+            data = numpy.asarray(self.data, dtype = self.dtype)
+            self.colmean = numpy.mean(data, axis = 0)
+        except (TypeError, ValueError) as e:
             raise ErrorCode46(suppress = self.suppress)
 
-        S = numpy.tile(self.colmean, (self.nrow, 1))
-        meanCenteredData = self.data - S
+        # broadcasting instead of numpy.tile(colmean) and numpy.diag(1/colstd): same values, but
+        # no n x p (or p x p) helper matrices
+        meanCenteredData = data - self.colmean
 
         if self.normalize == False:
             # equivalence of calculating eignevalues of a covariance matrix
             self.matrixForSVD = meanCenteredData
         else:
             # equivalence of calculating eignevalues of a correlation matrix
-            self.colstd = numpy.std(numpy.array(meanCenteredData), ddof = 1, axis = 0)
-            self.matrixForSVD = numpy.matmul(meanCenteredData, numpy.diag(1/self.colstd))
+            self.colstd = numpy.std(meanCenteredData, ddof = 1, axis = 0)
+            self.matrixForSVD = meanCenteredData * (1/self.colstd)
+
+        return(self.matrixForSVD)
+
+
+    def prepareSparseMatrix(self):
+        """
+        Same as prepareMatrix() for a scipy.sparse <self.data>. Column means and standard
+        deviations come from the stored entries only; the centered (and scaled) matrix is
+        represented by a CenteredSparseMatrix, so the zeros stay implicit.
+        """
+        colsum = numpy.asarray(self.data.sum(axis = 0)).ravel()
+        colsquaresum = numpy.asarray(self.data.multiply(self.data).sum(axis = 0)).ravel()
+        self.colmean = colsum / self.nrow
+
+        if self.normalize == False:
+            scale = numpy.ones(self.ncol)
+        else:
+            colvar = numpy.clip(colsquaresum - self.nrow * numpy.power(self.colmean, 2), 0, None) / (self.nrow - 1)
+            self.colstd = numpy.sqrt(colvar)
+            scale = 1/self.colstd
+
+        self.matrixForSVD = CenteredSparseMatrix(self.data, colmean = self.colmean.astype(self.dtype), scale = scale.astype(self.dtype))
+        return(self.matrixForSVD)
+
+
+    def gramMatrix(self):
+        """
+        M * M.transpose (n x n) of <self.matrixForSVD>
+        """
+        if self.sparse == True:
+            return(self.matrixForSVD.gram())
+        return(numpy.matmul(self.matrixForSVD, numpy.transpose(self.matrixForSVD)))
+
+
+    def covMatrix(self):
+        """
+        M.transpose * M (p x p) of <self.matrixForSVD>
+        """
+        if self.sparse == True:
+            return(self.matrixForSVD.cov())
+        return(numpy.matmul(numpy.transpose(self.matrixForSVD), self.matrixForSVD))
+
+
+    def centeredColumns(self, cols):
+        """
+        Dense n x len(<cols>) block of <self.matrixForSVD>
+        """
+        if self.sparse == True:
+            return(self.matrixForSVD.columns(cols))
+        return(self.matrixForSVD[:, cols])
+
+
+    def denseMatrixForSVD(self):
+        """
+        <self.matrixForSVD> as a numpy.ndarray. Densifies a sparse input; only used when a full
+        SVD is requested explicitly.
+        """
+        if self.sparse == True:
+            return(self.matrixForSVD.toarray())
+        return(self.matrixForSVD)
+
+
+    def squaredFrobeniusNorm(self):
+        """
+        Sum of all squared elements of <self.matrixForSVD>, which is also the sum of all eigenvalues
+        """
+        if self.sparse == True:
+            return(self.matrixForSVD.squaredFrobeniusNorm())
+        return(numpy.sum(numpy.power(self.matrixForSVD, 2)))
+
+
+    def columnSquaredNorms(self):
+        """
+        Sum of the squared elements of every column of <self.matrixForSVD>
+        """
+        if self.sparse == True:
+            return(self.matrixForSVD.columnSquaredNorms())
+        return(numpy.sum(numpy.power(self.matrixForSVD, 2), axis = 0))
+
+
+    def chooseMethod(self):
+        """
+        Decide how to get the eigenvalues when <self.method> is 'auto'.
+
+        Forming the Gram (or the p x p) matrix squares the singular values, so the absolute
+        error of the eigenvalues is about k * (machine epsilon) * (largest eigenvalue), with
+        k = min(nrow, ncol) and the machine epsilon of <precision>. Use SVD when this error is
+        not well below the normalized eigenvalues that we keep (<self.epsilon>), or when the
+        matrix is close to square and there is little to gain. With float32 and the default
+        <epsilon> this is always SVD.
+        """
+        if self.method != 'auto':
+            return(self.method)
+
+        # a full SVD would densify a sparse matrix
+        if self.sparse == True:
+            return('gram' if self.ncol > self.nrow else 'cov')
+
+        k = min(self.nrow, self.ncol)
+        squared_error = k * numpy.finfo(self.dtype).eps
+
+        if squared_error > 0.01 * self.epsilon or max(self.nrow, self.ncol) < 2 * k:
+            return('svd')
+        elif self.ncol > self.nrow:
+            return('gram')
+        else:
+            return('cov')
+
+
+    def squaredSingularValues(self):
+        """
+        Squared singular values of <self.matrixForSVD> in descending order. Report
+        min(nrow, ncol) values, no matter which method generates them, except for the
+        'randomized' method, which only reports the resolved top of the spectrum.
+        """
+        self.method_used = self.chooseMethod()
+        self.tail_mass = 0
+        self.tail_entropy = 0
+        self.vNE_error_bound = 0
+        k = min(self.nrow, self.ncol)
+
+        if self.method_used == 'randomized':
+            eigvals = self.approximateSpectrum()
+        elif self.method_used == 'slq':
+            eigvals = self.stochasticSpectrum()
+        elif self.method_used == 'gram':
+            eigvals = numpy.linalg.eigvalsh(self.gramMatrix())
+            eigvals = numpy.clip(eigvals[::-1][0:k], 0, None)
+        elif self.method_used == 'cov':
+            eigvals = numpy.linalg.eigvalsh(self.covMatrix())
+            eigvals = numpy.clip(eigvals[::-1][0:k], 0, None)
+        else:
+            s = numpy.linalg.svd(self.denseMatrixForSVD(), compute_uv = False)
+            eigvals = numpy.power(s, 2)
+
+        return(eigvals)
+
+
+    def approximateSpectrum(self, initial_rank = 16, oversample = 10):
+        """
+        Resolve the top of the spectrum with randomizedSquaredSingularValues() and bound the
+        entropy of the rest.
+
+        The sum of all eigenvalues is the squared Frobenius norm of <self.matrixForSVD>, so the
+        normalized mass that was not resolved, t, is known exactly (the residual Frobenius norm).
+        entropyBounds() turns the top-k values and t into an interval for the von Neumann
+        entropy. The midpoint is reported as the entropy and the half width as
+        <self.vNE_error_bound>. k doubles until the error bound drops below <self.tolerance>;
+        when k gets close to min(nrow, ncol), the exact SVD is used instead.
+        """
+        m = min(self.nrow, self.ncol)
+        self.total_variance = self.squaredFrobeniusNorm()
+        rank = initial_rank
+
+        while 2 * (rank + oversample) < m:
+            eigvals = randomizedSquaredSingularValues(self.matrixForSVD, rank = rank, oversample = oversample)
+            norm_top = normalizeEigvals(eigvals, epsilon = self.epsilon, total = self.total_variance)
+            lower, upper = entropyBounds(norm_top, num_eigvals = m)
+
+            if (upper - lower) / 2 <= self.tolerance:
+                self.tail_mass = max(1 - numpy.sum(norm_top), 0)
+                self.tail_entropy = (upper + lower) / 2 - entropyFromNormEigvals(norm_top)
+                self.vNE_error_bound = (upper - lower) / 2
+                self.rank_used = rank
+                return(eigvals)
+            rank = rank * 2
+
+        # not worth it: fall back to the exact spectrum
+        self.rank_used = m
+        s = numpy.linalg.svd(self.denseMatrixForSVD(), compute_uv = False)
+        return(numpy.power(s, 2))
+
+
+    def stochasticSpectrum(self):
+        """
+        Estimate the von Neumann entropy with stochastic Lanczos quadrature on the smaller one
+        of M * M.transpose and M.transpose * M, divided by the squared Frobenius norm of M so
+        its eigenvalues are the normalized eigenvalues. The operator is only applied as two
+        matrix-vector products. No eigenvalue is resolved: the whole estimate goes to
+        <self.tail_entropy>, and an empty array is returned.
+        """
+        matrix = self.matrixForSVD
+        total = self.squaredFrobeniusNorm()
+
+        if self.nrow <= self.ncol:
+            matvec = lambda x: (matrix @ (matrix.T @ x)) / total
+        else:
+            matvec = lambda x: (matrix.T @ (matrix @ x)) / total
+
+        self.tail_entropy, self.vNE_error_bound, self.zero_count_estimate = stochasticLanczosEntropy(
+            matvec, dim = min(self.nrow, self.ncol), num_probe = self.num_probe, lanczos_steps = self.lanczos_steps,
+            epsilon = self.epsilon, dtype = self.dtype)
+        self.tail_mass = 1
+        return(numpy.array([]))
+
+
+    def spectrum(self, compute_uv = False):
+        """
+        Decompose <self.matrixForSVD> once and keep the result. Later calls (from vNE(),
+        numZeroEig(), normEigvals() or viewer.Projection) reuse the cached values instead of
+        decomposing the matrix again.
+
+        Arguments:
+            compute_uv -- Type: boolean
+                          When True, also keep the singular vectors (<self.U> and <self.Vh>).
+                          This always uses a full SVD. A cached spectrum without singular
+                          vectors is recomputed once when they are requested.
+
+        Return:
+            Type: numpy.ndarray
+            Squared singular values in descending order
+        """
+        if self.squared_singular_values is not None and (compute_uv == False or self.U is not None):
+            return(self.squared_singular_values)
+
+        ##--1--## preparing matrix
+        if self.matrixForSVD is None:
+            self.prepareMatrix()
 
         ##--2--## calculate singular values
-        s = numpy.linalg.svd(self.matrixForSVD, compute_uv = False)
-        eigvalsFromSVD = numpy.power(s, 2)
-        eigvalsFromSVD[eigvalsFromSVD < self.epsilon] = 0
+        if compute_uv == True:
+            self.U, self.singular_values, self.Vh = numpy.linalg.svd(self.denseMatrixForSVD())
+            self.squared_singular_values = numpy.power(self.singular_values, 2)
+            self.method_used = 'svd'
+            self.tail_mass = 0
+            self.tail_entropy = 0
+            self.vNE_error_bound = 0
+        else:
+            self.squared_singular_values = self.squaredSingularValues()
+            self.singular_values = numpy.sqrt(self.squared_singular_values)
 
         ##--3--## eigenvalues normalization
-        normEigvals = eigvalsFromSVD/sum(eigvalsFromSVD)
-        normEigvals[normEigvals < self.epsilon] = 0
-        self.normEigvals = normEigvals
+        if self.method_used == 'randomized' and self.vNE_error_bound > 0:
+            self.norm_eigvals = normalizeEigvals(self.squared_singular_values, epsilon = self.epsilon, total = self.total_variance)
+        else:
+            self.norm_eigvals = normalizeEigvals(self.squared_singular_values, epsilon = self.epsilon)
+        return(self.squared_singular_values)
+
+
+    def normEigvals(self):
+        """
+        Prepare normalized eigenvalues for the von Neumann entropy calculation
+
+        The math behide this computational process is:
+        (signular_val of M)^2 = eigvals of (M * M.transpose)
+        """
+        self.spectrum()
+        self.normEigvals = self.norm_eigvals
         return(self.normEigvals)
 
 
@@ -114,9 +444,8 @@ class NonDesityMatrix:
         """
         Calculate the von Neumann entropy
         """
-        beta = self.normEigvals()
-        beta = numpy.array([i for i in beta if i != 0])
-        self.vNE = sum(-numpy.transpose(beta)*numpy.log2(beta))
+        self.spectrum()
+        self.vNE = entropyFromNormEigvals(self.norm_eigvals) + self.tail_entropy
         return(self.vNE)
 
 
@@ -124,10 +453,540 @@ class NonDesityMatrix:
         """
         Report the number of eigenvalues that equals to zero in the vector of normalized eigenvalues
         """
-        self.numZeroEig = sum(self.normEigvals() == 0)
+        self.spectrum()
+        if self.method_used == 'slq':
+            self.numZeroEig = self.zero_count_estimate
+        else:
+            self.numZeroEig = sum(self.norm_eigvals == 0)
+
+        # unresolved eigenvalues of the 'randomized' method are only known to be zero when the tail is empty
+        if self.tail_mass < self.epsilon:
+            self.numZeroEig = self.numZeroEig + (min(self.nrow, self.ncol) - len(self.norm_eigvals))
 
         # the number of reported singular values equals to the min(self.nrow, self.ncol)
         if (self.nrow < self.ncol and self.numZeroEig > 0):
              self.numZeroEig = self.numZeroEig + (self.ncol - self.nrow)
 
         return(self.numZeroEig)
+
+
+class CenteredSparseMatrix(LinearOperator):
+    """
+    (X - 1 * colmean.transpose) * diag(scale) for a sparse X, without forming it. Products
+    with dense matrices, the Gram matrix and the p x p matrix are computed from sparse
+    products of X plus rank-one corrections, so the zeros of X are never stored.
+
+    Arguments:
+        data -- Type: scipy.sparse.csr_matrix
+        colmean -- Type: numpy.ndarray
+                   Column means of <data>
+        scale -- Type: numpy.ndarray
+                 Multiplier of each centered column (ones, or 1/colstd for the correlation matrix)
+    """
+    def __init__(self, data, colmean, scale):
+        self.data = data
+        self.colmean = colmean
+        self.scale = scale
+        self.scaled_mean = colmean * scale
+        self.scaled_data = data @ scipy.sparse.diags(scale)
+        super().__init__(dtype = data.dtype, shape = data.shape)
+
+    def _matmat(self, B):
+        return(self.scaled_data @ B - numpy.outer(numpy.ones(self.shape[0]), numpy.matmul(self.scaled_mean, B)))
+
+    def _rmatmat(self, B):
+        return(self.scaled_data.T @ B - numpy.outer(self.scaled_mean, numpy.sum(B, axis = 0)))
+
+    def _matvec(self, x):
+        return(self._matmat(numpy.reshape(x, (-1, 1))).ravel())
+
+    def _rmatvec(self, x):
+        return(self._rmatmat(numpy.reshape(x, (-1, 1))).ravel())
+
+    def gram(self):
+        """
+        M * M.transpose = X*S*S*X.transpose - v*1.transpose - 1*v.transpose + c*1*1.transpose,
+        with v = X*S*S*colmean and c = ||S*colmean||^2
+        """
+        G = (self.scaled_data @ self.scaled_data.T).toarray()
+        v = self.scaled_data @ self.scaled_mean
+        c = numpy.dot(self.scaled_mean, self.scaled_mean)
+        return(G - v[:, numpy.newaxis] - v[numpy.newaxis, :] + c)
+
+    def cov(self):
+        """
+        M.transpose * M = S*X.transpose*X*S - n * (S*colmean) * (S*colmean).transpose
+        """
+        C = (self.scaled_data.T @ self.scaled_data).toarray()
+        return(C - self.shape[0] * numpy.outer(self.scaled_mean, self.scaled_mean))
+
+    def columns(self, cols):
+        """
+        Dense block of the centered (and scaled) columns <cols>
+        """
+        return(self.scaled_data[:, cols].toarray() - self.scaled_mean[cols])
+
+    def columnSquaredNorms(self):
+        colsquaresum = numpy.asarray(self.scaled_data.multiply(self.scaled_data).sum(axis = 0)).ravel()
+        return(colsquaresum - self.shape[0] * numpy.power(self.scaled_mean, 2))
+
+    def squaredFrobeniusNorm(self):
+        return(numpy.sum(self.columnSquaredNorms()))
+
+    def toarray(self):
+        return(self.scaled_data.toarray() - self.scaled_mean)
+
+
+def normalizeEigvals(eigvals, epsilon, total = None):
+    """
+    Set eigenvalues that are less than <epsilon> to zero, then normalize the remaining
+    eigenvalues so they sum to one. Eigenvalues that become less than <epsilon> after
+    the normalization are also set to zero.
+
+    Arguments:
+        eigvals -- Type: numpy.ndarray
+                   Eigenvalues (squared singular values) of a mean centered matrix
+        epsilon -- Type: float
+                   Machine percision
+        total -- Type: float
+                 Sum of all eigenvalues, when <eigvals> only holds part of the spectrum.
+                 Default: sum of <eigvals>
+    """
+    eigvals = numpy.array(eigvals, dtype = float)
+    eigvals[eigvals < epsilon] = 0
+
+    if total is None:
+        total = sum(eigvals)
+    normEigvals = eigvals/total
+    normEigvals[normEigvals < epsilon] = 0
+    return(normEigvals)
+
+
+def entropyFromNormEigvals(normEigvals):
+    """
+    Calculate the von Neumann entropy from a vector of normalized eigenvalues
+    """
+    beta = numpy.array([i for i in normEigvals if i != 0])
+    return(sum(-numpy.transpose(beta)*numpy.log2(beta)))
+
+
+def randomizedSquaredSingularValues(matrix, rank, oversample = 10, power_iter = 2, seed = 0):
+    """
+    Top <rank> squared singular values of <matrix> from a randomized range finder: project
+    the matrix on (rank + oversample) random directions, sharpen the range with a few power
+    iterations (re-orthogonalized by QR), then decompose the small projected matrix.
+
+    Arguments:
+        matrix -- Type: numpy.ndarray or CenteredSparseMatrix
+        rank -- Type: int
+                Number of singular values to report
+        oversample -- Type: int
+                      Number of extra random directions
+        power_iter -- Type: int
+                      Number of power iterations
+        seed -- Type: int
+                Seed of the random directions, so the result is reproducible
+
+    Return:
+        Type: numpy.ndarray
+        Squared singular values in descending order
+    """
+    rng = numpy.random.default_rng(seed)
+    size = min(rank + oversample, matrix.shape[0], matrix.shape[1])
+
+    Q, R = numpy.linalg.qr(matrix @ rng.standard_normal((matrix.shape[1], size)))
+    for i in range(power_iter):
+        Q, R = numpy.linalg.qr(matrix.T @ Q)
+        Q, R = numpy.linalg.qr(matrix @ Q)
+
+    s = numpy.linalg.svd(numpy.transpose(matrix.T @ Q), compute_uv = False)
+    return(numpy.power(s[0:rank], 2))
+
+
+def entropyBounds(norm_top, num_eigvals):
+    """
+    Lower and upper bounds of the von Neumann entropy when only the top of the normalized
+    spectrum is known.
+
+    Ritz values from a projection never exceed the true eigenvalues, so every spectrum that
+    agrees with what we know has beta_i >= <norm_top>_i (i <= k), at most <num_eigvals>
+    eigenvalues, and sums to one. Within this set, the entropy is the smallest when all of
+    the missing mass t = 1 - sum(<norm_top>) sits on the first eigenvalue (this spectrum
+    majorizes every other one) and the largest when the missing mass fills up the spectrum
+    evenly from the bottom (water filling).
+
+    Arguments:
+        norm_top -- Type: numpy.ndarray
+                    Resolved normalized eigenvalues in descending order
+        num_eigvals -- Type: int
+                       Total number of eigenvalues
+
+    Return:
+        Type: tuple
+        (lower bound, upper bound)
+    """
+    resolved = numpy.array([i for i in norm_top if i > 0])
+    tail_mass = max(1 - numpy.sum(resolved), 0)
+    k = len(resolved)
+
+    if tail_mass == 0 or num_eigvals == k:
+        entropy = entropyFromNormEigvals(resolved)
+        return(entropy, entropy)
+    if k == 0:
+        return(0, numpy.log2(num_eigvals))
+
+    # smallest: put the missing mass on the largest eigenvalue
+    concentrated = resolved.copy()
+    concentrated[0] = concentrated[0] + tail_mass
+    lower = entropyFromNormEigvals(concentrated)
+
+    # largest: raise the bottom of the spectrum to a common level c
+    prefix = numpy.concatenate([[0], numpy.cumsum(resolved)])
+    for level in range(k, -1, -1):
+        c = (1 - prefix[level]) / (num_eigvals - level)
+        if level == 0 or resolved[level - 1] >= c:
+            break
+    upper = entropyFromNormEigvals(resolved[0:level]) - (num_eigvals - level) * c * numpy.log2(c)
+
+    return(min(lower, upper), upper)
+
+
+def stochasticLanczosEntropy(matvec, dim, num_probe, lanczos_steps, epsilon, seed = 0, dtype = float):
+    """
+    Estimate tr(-rho * log2(rho)) by stochastic Lanczos quadrature.
+
+    For a Rademacher vector z, E[z.transpose * f(rho) * z] = tr(f(rho)). Starting Lanczos from
+    v = z / ||z|| for k steps gives a k x k tridiagonal matrix whose eigenvalues theta_j and
+    squared first eigenvector components tau_j form a Gauss quadrature rule, so
+    z.transpose * f(rho) * z ~ dim * sum_j tau_j * f(theta_j). The estimates of the probes are
+    averaged. Lanczos vectors are fully re-orthogonalized. The same <seed> gives the same
+    probes, so estimates of matrices that differ by one column share their random numbers.
+
+    The error bound adds two parts: the half width of the 95% confidence interval of the
+    probe average, and the quadrature error, which does not average out over the probes.
+    f has an unbounded slope at zero, so the rule converges slowly when there are many small
+    eigenvalues. The quadrature error is estimated by the change of the average from the rule of
+    the first half of the Lanczos steps (the leading block of the tridiagonal matrix) to the
+    full rule; the error of the full rule is smaller. A probe whose Lanczos run found an
+    invariant subspace is exact.
+
+    Arguments:
+        matvec -- Type: function
+                  Returns rho * x for a vector x. rho is symmetric, positive semi-definite
+                  and has trace one
+        dim -- Type: int
+               Dimension of rho
+        num_probe -- Type: int
+                     Number of probe vectors
+        lanczos_steps -- Type: int
+                         Number of Lanczos steps per probe vector
+        epsilon -- Type: float
+                   Ritz values less than <epsilon> count as zero eigenvalues
+        seed -- Type: int
+                Seed of the probe vectors
+        dtype -- Type: numpy.dtype
+                 Floating point type of rho. Lanczos stops (the rule is exact) once the new
+                 direction is within its rounding error
+
+    Return:
+        Type: tuple
+        (entropy, error bound: half width of the 95% confidence interval of the probes plus the
+        quadrature error estimate, estimated number of zero eigenvalues)
+    """
+    rng = numpy.random.default_rng(seed)
+    steps = min(lanczos_steps, dim)
+    breakdown = dim * numpy.finfo(dtype).eps
+    entropy = []
+    half_step_entropy = []
+    zero_count = []
+
+    def gaussRule(alpha, beta):
+        T = numpy.diag(alpha) + numpy.diag(beta, 1) + numpy.diag(beta, -1)
+        theta, S = numpy.linalg.eigh(T)
+        tau = numpy.power(S[0], 2)
+        nonzero = theta > epsilon
+        return(dim * numpy.sum(-tau[nonzero] * theta[nonzero] * numpy.log2(theta[nonzero])), dim * numpy.sum(tau[~nonzero]))
+
+    for i in range(num_probe):
+        V = numpy.zeros((steps, dim))
+        alpha = []
+        beta = []
+        v = rng.choice([-1.0, 1.0], size = dim) / numpy.sqrt(dim)
+
+        for j in range(steps):
+            V[j] = v
+            w = matvec(v)
+            alpha.append(numpy.dot(w, v))
+
+            # full re-orthogonalization (twice is enough)
+            w = w - numpy.matmul(numpy.matmul(V[0:j + 1], w), V[0:j + 1])
+            w = w - numpy.matmul(numpy.matmul(V[0:j + 1], w), V[0:j + 1])
+
+            b = numpy.linalg.norm(w)
+            exact = b <= breakdown   # invariant subspace found: the rule is exact
+            if j == steps - 1 or exact:
+                break
+            beta.append(b)
+            v = w / b
+
+        probe_entropy, probe_zero_count = gaussRule(alpha, beta)
+        entropy.append(probe_entropy)
+        zero_count.append(probe_zero_count)
+        if exact or len(alpha) < 2:
+            half_step_entropy.append(probe_entropy)
+        else:
+            half = (len(alpha) + 1) // 2
+            half_step_entropy.append(gaussRule(alpha[0:half], beta[0:half - 1])[0])
+
+    half_width = 0
+    if num_probe > 1:
+        # the standard deviation is estimated from the probes themselves
+        half_width = scipy.stats.t.ppf(0.975, num_probe - 1) * numpy.std(entropy, ddof = 1) / numpy.sqrt(num_probe)
+    quadrature_error = abs(numpy.mean(entropy) - numpy.mean(half_step_entropy))
+
+    return(numpy.mean(entropy), half_width + quadrature_error, int(numpy.round(numpy.mean(zero_count))))
+
+
+def downdateEigvals(eigvals, z, max_iter = 100):
+    """
+    Eigenvalues of (D - z * z.transpose), where D = diag(<eigvals>), by solving the
+    secular equation
+
+        f(lamda) = 1 - sum_k z_k^2 / (eigvals_k - lamda) = 0
+
+    f is monotonically decreasing between two neighbouring poles, so each interval
+    (eigvals_k-1, eigvals_k), plus (eigvals_0 - sum(z^2), eigvals_0), holds exactly one
+    root. Each iteration models the poles on the left and on the right of the root by
+    one pole each (matching value and slope) and solves the resulting quadratic. The
+    step falls back to bisection whenever it leaves the bracket.
+
+    Used for removing one column c from a mean centered matrix M: if M * M.transpose =
+    Q * D * Q.transpose, the eigenvalues of the remaining matrix are the eigenvalues of
+    (D - z * z.transpose) with z = Q.transpose * c.
+
+    Arguments:
+        eigvals -- Type: numpy.ndarray
+                   Eigenvalues of the symmetric matrix before the downdate
+        z -- Type: numpy.ndarray
+             Downdate vector expressed in the eigenvector basis
+        max_iter -- Type: int
+                    Maximum number of iterations
+
+    Return:
+        Type: numpy.ndarray
+        Eigenvalues after the downdate in ascending order
+    """
+    d = numpy.array(eigvals, dtype = float)
+    w = numpy.power(numpy.array(z, dtype = float), 2)
+    order = numpy.argsort(d)
+    d = d[order]
+    w = w[order]
+
+    machine_eps = numpy.finfo(float).eps
+    scale = max(numpy.max(numpy.abs(d)), numpy.sum(w), numpy.finfo(float).tiny)
+    tol = len(d) * machine_eps * scale
+
+    ##--1--## deflation
+    # components with negligible weight keep their eigenvalue
+    keep = w > tol
+    deflated = [d[~keep]]
+    d = d[keep]
+    w = w[keep]
+
+    # (numerically) repeated poles: all but one eigenvalue stay on the pole, the
+    # remaining one interacts with the combined weight
+    if len(d) > 1:
+        last_in_group = numpy.append(numpy.diff(d) > tol, True)
+        group_id = numpy.cumsum(numpy.insert(last_in_group[:-1], 0, True)) - 1
+        deflated.append(d[~last_in_group])
+        w = numpy.bincount(group_id, weights = w)
+        d = d[last_in_group]
+
+    if len(d) == 0:
+        return(numpy.sort(numpy.concatenate(deflated)))
+
+    ##--2--## secular equation
+    left = numpy.concatenate([[d[0] - numpy.sum(w)], d[:-1]])
+    right = d
+    width = right - left
+    lo = left.copy()
+    hi = right.copy()
+    lamda = (lo + hi) / 2
+
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        for i in range(max_iter):
+            gap = d[numpy.newaxis, :] - lamda[:, numpy.newaxis]
+            ratio = w[numpy.newaxis, :] / gap
+            slope = ratio / gap
+
+            # split the sum into the poles on the left and on the right of each root
+            psi_left = numpy.sum(numpy.tril(ratio, -1), axis = 1)
+            dpsi_left = numpy.sum(numpy.tril(slope, -1), axis = 1)
+            psi_right = numpy.sum(ratio, axis = 1) - psi_left
+            dpsi_right = numpy.sum(slope, axis = 1) - dpsi_left
+            f = 1 - psi_left - psi_right
+
+            # f decreases in each interval: f > 0 means the root is on the right
+            go_right = f > 0
+            lo = numpy.where(go_right, lamda, lo)
+            hi = numpy.where(go_right, hi, lamda)
+
+            # psi_left ~ a + b / (left - x); psi_right ~ c + e / (right - x)
+            gap_left = left - lamda
+            gap_right = right - lamda
+            b = dpsi_left * gap_left ** 2
+            a = psi_left - dpsi_left * gap_left
+            e = dpsi_right * gap_right ** 2
+            c = psi_right - dpsi_right * gap_right
+
+            # 1 - a - c = b / (left - x) + e / (right - x); solve for t = x - left
+            A = 1 - a - c
+            B = b + e - A * width
+            C = -b * width
+            disc = numpy.sqrt(numpy.maximum(B ** 2 - 4 * A * C, 0))
+            t = numpy.where(B <= 0, (-B + disc) / (2 * A), -2 * C / (B + disc))
+            step = left + t
+
+            inside = (step >= lo) & (step <= hi)
+            update = numpy.where(inside, step, (lo + hi) / 2)
+
+            converged = numpy.abs(update - lamda) <= 4 * machine_eps * numpy.maximum(numpy.abs(update), tol)
+            lamda = update
+            if numpy.all(converged):
+                break
+
+    deflated.append(lamda)
+    return(numpy.sort(numpy.concatenate(deflated)))
+
+
+def downdatedEigvals(gram, eigvals, eigvecs, column):
+    """
+    Eigenvalues of (<gram> - column * column.transpose), where <gram> = eigvecs * diag(<eigvals>)
+    * eigvecs.transpose: from downdateEigvals() when the column removes at most
+    <downdate_max_ratio> of every eigenvalue and <downdate_max_trace_share> of the trace,
+    otherwise from eigvalsh of the downdated matrix
+
+    Arguments:
+        gram -- Type: numpy.ndarray
+        eigvals -- Type: numpy.ndarray
+        eigvecs -- Type: numpy.ndarray
+        column -- Type: numpy.ndarray
+    """
+    z = numpy.matmul(numpy.transpose(eigvecs), column)
+    w = numpy.power(z, 2)
+    d = numpy.clip(eigvals, 0, None)
+    # directions with no variance carry (numerically) no weight of the column either
+    tol = len(d) * numpy.finfo(float).eps * max(numpy.max(d), numpy.sum(w), numpy.finfo(float).tiny)
+    supported = d > tol
+    if numpy.sum(w) <= downdate_max_trace_share * numpy.sum(d) and numpy.all(w[supported] <= downdate_max_ratio * d[supported]):
+        return(downdateEigvals(eigvals, z))
+    return(numpy.linalg.eigvalsh(gram - numpy.outer(column, column)))
+
+
+def perturbationVNE(eigvals, weights, epsilon):
+    """
+    First-order estimate of the von Neumann entropy after removing each column, from one
+    eigendecomposition of the full mean centered matrix M.
+
+    With T = sum(eigvals) and p = eigvals / T, the entropy is H = log2(T) - sum(eigvals * log2(eigvals)) / T,
+    so dH/d(eigvals_i) = -(log2(p_i) + H) / T. Removing column c_j lowers eigvals_i by about
+    z_ij^2, where z_ij is c_j expressed in the eigenvector basis, therefore
+
+        H_j ~ H + sum_i z_ij^2 * (log2(p_i) + H) / T
+
+    The eigenvalues that normalizeEigvals() sets to zero do not contribute. The expansion
+    only holds when every z_ij^2 is small compared with eigvals_i, so the largest ratio is
+    reported next to each estimate.
+
+    Arguments:
+        eigvals -- Type: numpy.ndarray
+                   k eigenvalues of M * M.transpose (or M.transpose * M)
+        weights -- Type: numpy.ndarray
+                   p x k matrix of z_ij^2. Each row sums to the squared norm of c_j
+        epsilon -- Type: float
+                   Machine percision
+
+    Return:
+        Type: tuple (numpy.ndarray, numpy.ndarray)
+        Approximated von Neumann entropy after removing each of the p columns, and the
+        largest relative eigenvalue shift max_i(z_ij^2 / eigvals_i) of each column
+    """
+    norm_eigvals = normalizeEigvals(eigvals, epsilon = epsilon)
+    vNE = entropyFromNormEigvals(norm_eigvals)
+
+    eigvals = numpy.array(eigvals, dtype = float)
+    total = numpy.sum(eigvals[eigvals >= epsilon])
+    keep = norm_eigvals > 0
+
+    weights = numpy.array(weights, dtype = float)
+    change = numpy.matmul(weights[:, keep], numpy.log2(norm_eigvals[keep])) + vNE * numpy.sum(weights, axis = 1)
+    relative_shift = numpy.max(weights[:, keep] / eigvals[keep][numpy.newaxis, :], axis = 1, initial = 0)
+    return(vNE + change / total, relative_shift)
+
+
+def interlacingEntropyBounds(eigvals, column_sqnorms, epsilon, max_elements = 2 ** 22):
+    """
+    Lower and upper bounds of the von Neumann entropy after removing each column c_j of a mean
+    centered matrix M, from the eigenvalues of M * M.transpose and the squared norms of the
+    columns only.
+
+    Removing c_j subtracts the rank-one matrix c_j * c_j.transpose, so with the eigenvalues
+    lamda_1 >= lamda_2 >= ... before and mu_1 >= mu_2 >= ... after (Cauchy interlacing and Weyl):
+
+        max(lamda_i+1, lamda_i - |c_j|^2) <= mu_i <= lamda_i,   sum(mu) = sum(lamda) - |c_j|^2
+
+    The entropy is Schur-concave, so among these spectra it is the smallest when the mass
+    fills the largest eigenvalues first (this spectrum majorizes every other one) and the
+    largest when the mass fills them to a common level (water filling). The bounds are
+    widened by the entropy that normalizeEigvals() can remove with <epsilon>.
+
+    Arguments:
+        eigvals -- Type: numpy.ndarray
+                   Eigenvalues of M * M.transpose (or M.transpose * M), in any order
+        column_sqnorms -- Type: numpy.ndarray
+                          |c_j|^2 of each of the p columns
+        epsilon -- Type: float
+                   Machine percision
+        max_elements -- Type: int
+                        Largest (columns x eigenvalues) block to bound at once
+
+    Return:
+        Type: tuple (numpy.ndarray, numpy.ndarray)
+        Lower and upper bounds for each of the p columns
+    """
+    lamda = numpy.sort(numpy.clip(numpy.array(eigvals, dtype = float), 0, None))[::-1]
+    below = numpy.append(lamda[1:], 0)
+    column_sqnorms = numpy.array(column_sqnorms, dtype = float)
+    total = numpy.sum(lamda) - column_sqnorms
+    slack = len(lamda) * epsilon * numpy.log2(1 / epsilon) + 1e-9
+
+    def entropy(mu, total):
+        beta = mu / total[:, numpy.newaxis]
+        return(-numpy.sum(numpy.where(beta > 0, beta * numpy.log2(numpy.where(beta > 0, beta, 1)), 0), axis = 1))
+
+    lower = numpy.zeros(len(column_sqnorms))
+    upper = numpy.zeros(len(column_sqnorms))
+    block = max(1, max_elements // max(1, len(lamda)))
+    for start in range(0, len(column_sqnorms), block):
+        cols = slice(start, start + block)
+        low = numpy.maximum(below[numpy.newaxis, :], lamda[numpy.newaxis, :] - column_sqnorms[cols, numpy.newaxis])
+        room = lamda[numpy.newaxis, :] - low
+        mass = numpy.clip(total[cols] - numpy.sum(low, axis = 1), 0, None)
+
+        # smallest entropy: fill the largest eigenvalues first
+        filled = numpy.cumsum(room, axis = 1) - room
+        concentrated = low + numpy.clip(mass[:, numpy.newaxis] - filled, 0, room)
+
+        # largest entropy: mu_i = clip(level, low_i, lamda_i) with the level found by bisection
+        level_low = numpy.zeros(len(mass))
+        level_high = numpy.full(len(mass), lamda[0] if len(lamda) > 0 else 0.0)
+        for _ in range(100):
+            level = (level_low + level_high) / 2
+            too_much = numpy.sum(numpy.clip(level[:, numpy.newaxis], low, lamda[numpy.newaxis, :]), axis = 1) > total[cols]
+            level_high = numpy.where(too_much, level, level_high)
+            level_low = numpy.where(too_much, level_low, level)
+        even = numpy.clip(level_low[:, numpy.newaxis], low, lamda[numpy.newaxis, :])
+
+        lower[cols] = entropy(concentrated, total[cols]) - slack
+        upper[cols] = entropy(even, total[cols]) + slack
+    return(lower, upper)
@@ -3,6 +3,7 @@
 from ...toolbox.technical import *
 from ...troubleshoot.err.error import *
 
+import scipy.sparse
 import pandas
 import numpy
 import glob
@@ -28,6 +29,12 @@ class RawDataImport:
                            for self.detectionLimit()
         zero_tolerance_level -- Type: float
                                 for self.zero_tolerance_level()
+        sparse -- Type: boolean
+                  Read the csv file in chunks into a scipy.sparse matrix instead of a dense
+                  pandas.DataFrame. Filtering and relativeAbundance() then work on the sparse
+                  matrix
+        chunk_size -- Type: int
+                      Number of rows read at a time when <sparse> is True
 
     Attributes:
         file_name -- Type: str
@@ -49,11 +56,17 @@ class RawDataImport:
                          column header
         detection_limit -- Type: float
         zero_tolerance_level -- Type: float
+        sparse_data -- Type: scipy.sparse.csr_matrix
+                       Only when <sparse> is True. Same values as <self.data>; <self.data> is then
+                       a pandas.DataFrame with sparse columns built from it
     """
 
-    def __init__(self, file_name, for_merging_file = False, suppress = False, second_chance = False):  ## TODO: retire second_chance
+    def __init__(self, file_name, for_merging_file = False, suppress = False, second_chance = False,  ## TODO: retire second_chance
+                 sparse = False, chunk_size = 10000):
 
         self.file_name = file_name
+        self.sparse = sparse
+        self.chunk_size = chunk_size
         self.basename = os.path.basename(file_name)
         self.for_merging_file = for_merging_file
         self.suppress = suppress
@@ -72,18 +85,21 @@ class RawDataImport:
         """
         Import data from a CSV file.
         """
-        try:
-            self.raw_data = pandas.read_csv(self.file_name, index_col = 0, header = 0)
-        except FileNotFoundError as e:
-            raise ErrorCode1(suppress = self.suppress) from e
+        if self.sparse == True:
+            self.readSparseCSV()
+        else:
+            try:
+                self.raw_data = pandas.read_csv(self.file_name, index_col = 0, header = 0)
+            except FileNotFoundError as e:
+                raise ErrorCode1(suppress = self.suppress) from e
 
-        ## TODO: self.raw_data should only have number (no NA)
-            ## TODO: or convert NA to zero
+            ## TODO: self.raw_data should only have number (no NA)
+                ## TODO: or convert NA to zero
 
 
-        # delete any column that only contain zeros
-        self.data = self.raw_data.loc[:, (self.raw_data != 0).any(axis=0)]
-        self.data = self.data.loc[(self.data != 0).any(axis=1), ]
+            # delete any column that only contain zeros
+            self.data = self.raw_data.loc[:, (self.raw_data != 0).any(axis=0)]
+            self.data = self.data.loc[(self.data != 0).any(axis=1), ]
 
         # update sample_id and feature_names
         self.sample_id = [str(element) for element in list(self.data.index.values)] # prevent using number as row names
@@ -105,6 +121,35 @@ class RawDataImport:
 
         return(self.data)
 
+    def readSparseCSV(self):
+        """
+        Read the csv file <self.chunk_size> rows at a time and stack the chunks into a
+        scipy.sparse matrix, so the dense table never sits in memory as a whole.
+        """
+        chunks = []
+        sample_id = []
+        try:
+            for chunk in pandas.read_csv(self.file_name, index_col = 0, header = 0, chunksize = self.chunk_size):
+                chunks.append(scipy.sparse.csr_matrix(chunk.to_numpy()))
+                sample_id.extend(list(chunk.index.values))
+                feature_names = list(chunk.columns.values)
+        except FileNotFoundError as e:
+            raise ErrorCode1(suppress = self.suppress) from e
+
+        raw_data = scipy.sparse.vstack(chunks, format = 'csr')
+        raw_data.eliminate_zeros()
+        self.raw_data = pandas.DataFrame.sparse.from_spmatrix(raw_data, index = sample_id, columns = feature_names)
+
+        self.setSparseData(raw_data, sample_id, feature_names)
+        self.deleteEmptyColRow()
+
+    def setSparseData(self, sparse_data, sample_id, feature_names):
+        """
+        Replace <self.sparse_data> and rebuild <self.data> (sparse pandas.DataFrame) from it.
+        """
+        self.sparse_data = sparse_data
+        self.data = pandas.DataFrame.sparse.from_spmatrix(sparse_data, index = sample_id, columns = feature_names)
+
     ## TODO:
     ## categorial data
 
@@ -112,6 +157,15 @@ class RawDataImport:
         """
         Delete any column and row that only contains zeros.
         """
+        if self.sparse == True:
+            col_mask = self.sparse_data.getnnz(axis = 0) > 0
+            sparse_data = self.sparse_data[:, col_mask]
+            row_mask = sparse_data.getnnz(axis = 1) > 0
+            self.feature_names = list(self.data.columns.values[col_mask])
+            self.sample_id = list(self.data.index.values[row_mask])
+            self.setSparseData(sparse_data[row_mask, :], self.sample_id, self.feature_names)
+            return(self.data)
+
         self.data = self.data.loc[:, (self.data != 0).any(axis=0)]
         self.feature_names = list(self.data.columns.values)
 
@@ -127,19 +181,67 @@ class RawDataImport:
         Please run relativeAbundance() before setZero() and hardFilter() if you
         wish to use setZero() and hardFilter().
         """
+        if self.sparse == True:
+            rowsum = numpy.asarray(self.sparse_data.sum(axis = 1)).ravel()
+            sparse_data = scipy.sparse.csr_matrix(self.sparse_data, dtype = float)
+            sparse_data.data = sparse_data.data / numpy.repeat(rowsum, numpy.diff(sparse_data.indptr))
+            self.setSparseData(sparse_data, list(self.data.index.values), list(self.data.columns.values))
+            return
+
         self.data = self.data.div(self.data.sum(axis = 1), axis = 0)
 
     def detectionLimit(self, detection_limit):
         self.detection_limit = detection_limit
-        self.data[self.data < self.detection_limit] = 0
+        if self.sparse == True:
+            sparse_data = self.sparse_data.copy()
+            sparse_data.data[sparse_data.data < self.detection_limit] = 0
+            sparse_data.eliminate_zeros()
+            self.sparse_data = sparse_data
+        else:
+            self.data[self.data < self.detection_limit] = 0
         self.deleteEmptyColRow()
 
+    def applyDetectionLimit(self, dataframe):
+        """
+        Set the elements of a sparse pandas.DataFrame that are less than <self.detection_limit>
+        to zero. detectionLimit() on a dense <self.data> changes the DataFrame in place (so
+        every reference to it sees the change); sparse DataFrames cannot be changed in place,
+        so references are updated with this function.
+        """
+        sparse_data = dataframe.sparse.to_coo().tocsr()
+        sparse_data.data[sparse_data.data < self.detection_limit] = 0
+        sparse_data.eliminate_zeros()
+        return(pandas.DataFrame.sparse.from_spmatrix(sparse_data, index = dataframe.index, columns = dataframe.columns))
+
+    def numericData(self):
+        """
+        Input for NonDesityMatrix and MinusOneVNE: <self.sparse_data> when reading a sparse
+        matrix, otherwise <self.data>
+        """
+        if self.sparse == True:
+            return(self.sparse_data)
+        return(self.data)
+
+    def maxValue(self):
+        """
+        Largest element of <self.data>
+        """
+        if self.sparse == True:
+            return(self.sparse_data.max())
+        return(max(self.data.max()))
+
     def hardFilter(self, zero_tolerance_level):
         """
         Manually define a hard filter to clean data based on the fraction of zero
         elements in each column.
         """
         r, c = self.data.shape
+        if self.sparse == True:
+            mask = numpy.asarray((self.sparse_data > 0).sum(axis = 0)).ravel() > numpy.round(zero_tolerance_level * r)
+            self.setSparseData(self.sparse_data[:, mask], list(self.data.index.values), list(self.data.columns.values[mask]))
+            self.deleteEmptyColRow()
+            return(self.data)
+
         mask = (self.data > 0).apply(numpy.count_nonzero) > numpy.round(zero_tolerance_level * r)
 	    # True: the fraction of non-zero element is more then zero_tolerance_level
 	    # False: otherwise
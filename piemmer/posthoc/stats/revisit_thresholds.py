@@ -4,6 +4,7 @@
 from ...main.basic.read import RawDataImport, RetrospectDataImport, GetFiles
 from ...main.advanced.iteration import InfoRichCalling, reproducibility_summary
 from ...toolbox.technical import flattern, emptyNumpyArray, toFloat, floatRange
+from ...toolbox.executor import WorkerPool, workerPool, OrderedAssembler
 from ...troubleshoot.inquire.input import *
 from ...troubleshoot.err.error import *
 
@@ -15,7 +16,6 @@ from .bifurication import identifiedFeatures
 from .reproducibility import reproSummary
 from .permanova import permanovaResult
 
-from multiprocessing import Pool
 from scipy.spatial import procrustes
 from sklearn import linear_model
 from tqdm import tqdm
@@ -418,7 +418,20 @@ class RevisitThreshold:
         return(compareBeforeAndAfterDataReduction_return_list)
 
 
-    def iteratesThroughThresholdSetting(self):
+    def thresholdSettingTask(self, current_row):
+        """
+        compareBeforeAndAfterDataReduction() together with the row of the threshold setting
+        """
+        return(current_row, self.compareBeforeAndAfterDataReduction(current_row))
+
+
+    def iteratesThroughThresholdSetting(self, pool = None):
+        """
+        Arguments:
+            pool -- Type: any executor of toolbox.executor or None
+                    Persistent worker processes of the run. Default: a temporary pool of
+                    <num_cpu> workers
+        """
         self.u_list = floatRange(self.tuple_u)
         self.l_list = floatRange(self.tuple_l)
         self.t_list = floatRange(self.tuple_t)
@@ -438,18 +451,19 @@ class RevisitThreshold:
         self.threshold_setting_summary = pandas.concat([threshold_setting, summary], axis = 1, sort = True)
 
         nrow = self.threshold_setting_summary.shape[0]
-        threshold_setting_summary_result = [[] for i in range(nrow)]
+        # one row per threshold setting, in the order of self.threshold_setting_summary
+        assembler = OrderedAssembler(range(nrow))
 
         print('Precent threshold condition tested:')
 
-        with Pool(processes = self.num_cpu) as p:
+        with workerPool(pool, self.num_cpu) as p:
             with tqdm(total = nrow) as pbar:
-                for i, res in enumerate(p.imap_unordered(self.compareBeforeAndAfterDataReduction, range(nrow))):
+                for current_row, res in p.imapUnordered(self.thresholdSettingTask, range(nrow)):
                     res[3] = len(list(set(res[3])))
-                    threshold_setting_summary_result[i] = res
+                    assembler.add(current_row, res)
                     pbar.update()
 
-        threshold_setting_result = pandas.DataFrame(data = threshold_setting_summary_result,
+        threshold_setting_result = pandas.DataFrame(data = assembler.results,
                                                      columns = ['u', 'l', 't', 'num_info_rich',
                                                                 'info_to_ori_disparity', 'non_info_to_ori_disparity'])
 
@@ -491,6 +505,7 @@ def revisitThresholdResult(args, current_wd, retrospect_dir, output_file_tag, su
                                          tuple_t = revisit_threshold_args.tuple_t, tuple_u = revisit_threshold_args.tuple_u,
                                          tuple_l = revisit_threshold_args.tuple_l, num_cpu = revisit_threshold_args.num_cpu,
                                          normalize = revisit_threshold_args.normalize, output_file_name = output_file_name)
-    revisit_threshold.iteratesThroughThresholdSetting()
+    with WorkerPool(num_cpu = revisit_threshold_args.num_cpu) as pool:
+        revisit_threshold.iteratesThroughThresholdSetting(pool = pool)
     revisit_threshold.compareSettings()
     print(f'\nSuggested threshold setting: -u {revisit_threshold.selected["u"]} -l {revisit_threshold.selected["l"]} -t {revisit_threshold.selected["t"]}')
@@ -32,8 +32,10 @@ class Projection:
         self.normalize = normalize
         self.non_density_matrix = NonDesityMatrix(self.data, normalize = self.normalize)
 
-        # run normEigvals() so it will update colmean and matrixForSVD at the same time
-        self.norm_eigvals = self.non_density_matrix.normEigvals()   # percent variance explained
+        # decompose once; colmean, matrixForSVD, singular values and singular vectors are
+        # all cached on self.non_density_matrix
+        self.non_density_matrix.spectrum(compute_uv = True)
+        self.norm_eigvals = self.non_density_matrix.norm_eigvals   # percent variance explained
 
         try:
             if len(self.norm_eigvals) < 2:
@@ -51,7 +53,9 @@ class Projection:
         self.epsilon = self.non_density_matrix.epsilon
         self.matrixForSVD = self.non_density_matrix.matrixForSVD
 
-        u, s, vh = numpy.linalg.svd(self.matrixForSVD)
+        u = self.non_density_matrix.U
+        s = self.non_density_matrix.singular_values
+        vh = self.non_density_matrix.Vh
 
         self.Vh = vh
         self.V = numpy.transpose(vh[0:len(s),:])
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+## usage:
+# at a level above emmer/
+# python3 -m emmer.test.test_cache
+
+from ..toolbox.cache import ResultCache, matrixDigest
+import scipy.sparse
+import tempfile
+import unittest
+import pandas
+import numpy
+import os
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_ResultCache(self):
+        print('\ntest_ResultCache:')
+        print('        Case 1: store and read back a result summary')
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory = directory)
+            result_summary = pandas.DataFrame({'vNE': [0.5, 0.25]}, index = ['col1', 'col2'])
+            key = cache.key(matrix = 'abc', normalize = False, subsample = None)
+            self.assertEqual(key, cache.key(subsample = None, normalize = False, matrix = 'abc'))
+            self.assertNotEqual(key, cache.key(matrix = 'abc', normalize = True, subsample = None))
+            self.assertIsNone(cache.get(key))
+            cache.put(key, result_summary)
+            pandas.testing.assert_frame_equal(cache.get(key), result_summary)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+            print('        ---------------------------------------------------')
+            print('        Case 2: a broken entry is a miss')
+            with open(cache.entryPath(key), 'wb') as entry:
+                entry.write(b'not a pickle')
+            self.assertIsNone(cache.get(key))
+        print('===========================================================')
+
+
+    def test_evict(self):
+        print('\ntest_evict:')
+        print('        Case 1: the least recently used entries go first')
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory = directory, max_bytes = 2 ** 30)
+            for name in ['a', 'b', 'c']:
+                cache.put(name, numpy.zeros(1000))
+            entry_bytes = os.path.getsize(cache.entryPath('a'))
+            os.utime(cache.entryPath('a'), (1, 1))
+            os.utime(cache.entryPath('b'), (2, 2))
+            os.utime(cache.entryPath('c'), (3, 3))
+            self.assertIsNotNone(cache.get('a'))
+
+            cache.max_bytes = 2 * entry_bytes
+            cache.evict()
+            self.assertIsNone(cache.get('b'))
+            self.assertIsNotNone(cache.get('a'))
+            self.assertIsNotNone(cache.get('c'))
+
+            print('        ---------------------------------------------------')
+            print('        Case 2: stale temporary files are removed')
+            stale = os.path.join(directory, 'old.tmp')
+            open(stale, 'wb').close()
+            os.utime(stale, (1, 1))
+            cache.evict()
+            self.assertFalse(os.path.exists(stale))
+        print('===========================================================')
+
+
+    def test_matrixDigest(self):
+        print('\ntest_matrixDigest:')
+        print('        Case 1: same values, same digest')
+        data = numpy.array([[0, 1.5, 0], [2, 0, 3]])
+        self.assertEqual(matrixDigest(data), matrixDigest(data.copy()))
+        self.assertEqual(matrixDigest(scipy.sparse.csr_matrix(data)), matrixDigest(scipy.sparse.csc_matrix(data)))
+
+        print('        ---------------------------------------------------')
+        print('        Case 2: different values, shape or type')
+        changed = data.copy()
+        changed[0, 0] = 1e-12
+        self.assertNotEqual(matrixDigest(data), matrixDigest(changed))
+        self.assertNotEqual(matrixDigest(data), matrixDigest(data.reshape(3, 2)))
+        self.assertNotEqual(matrixDigest(data), matrixDigest(data.astype('float32')))
+        self.assertNotEqual(matrixDigest(data), matrixDigest(scipy.sparse.csr_matrix(data)))
+        print('===========================================================')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+## usage:
+# at a level above emmer/
+# python3 -m emmer.test.test_executor
+
+from ..toolbox.executor import WorkerPool, ThreadWorkerPool, SerialWorkerPool, RemoteWorkerPool, OrderedAssembler, workerPool, limitBlasThreads, serveWorkers
+from ..main.advanced.iteration import MinusOneVNE
+from ..troubleshoot.err.error import ErrorCode51
+import multiprocessing
+import threadpoolctl
+import tempfile
+import unittest
+import socket
+import signal
+import numpy
+import time
+import os
+
+
+def blasThreads(item):
+    return([info['num_threads'] for info in threadpoolctl.threadpool_info() if info['user_api'] == 'blas'])
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def test_imapUnordered(self):
+        print('\ntest_WorkerPool.imapUnordered:')
+        print('        Case 1: the workers start on first use and are reused by the next call')
+        pool = WorkerPool(num_cpu = 2)
+        self.assertIsNone(pool.pool)
+        self.assertEqual(sorted(pool.imapUnordered(abs, [-3, 1, -2])), [1, 2, 3])
+        started = pool.pool
+        self.assertEqual(sorted(pool.imapUnordered(abs, [-5, 4])), [4, 5])
+        self.assertIs(pool.pool, started)
+
+        print('        ---------------------------------------------------')
+        print('        Case 2: <max_tasks> tasks at a time')
+        my_result = list(pool.imapUnordered(runningTasks, range(6), max_tasks = 1))
+        self.assertEqual(max(my_result), 1)
+        stopped = pool.imapUnordered(abs, range(-6, 0), max_tasks = 1)
+        next(stopped)
+        stopped.close()
+        self.assertEqual(sorted(pool.imapUnordered(abs, [-1, -2])), [1, 2])
+
+        print('        ---------------------------------------------------')
+        print('        Case 3: closing the results early submits no further tasks (default: one task per worker)')
+        with tempfile.TemporaryDirectory() as directory:
+            stopped = pool.imapUnordered(markedTask, [(directory, item) for item in range(20)])
+            next(stopped)
+            stopped.close()
+            # let the tasks in the workers finish
+            pool.close()
+            self.assertLessEqual(len(os.listdir(directory)), 3)
+
+        print('        ---------------------------------------------------')
+        print('        Case 4: close() stops the workers; a later task starts them again')
+        pool.close()
+        self.assertIsNone(pool.pool)
+        self.assertEqual(list(pool.imapUnordered(abs, [-1])), [1])
+        pool.close()
+        print('===========================================================')
+
+
+    def test_workerPool(self):
+        print('\ntest_workerPool:')
+        print('        Case 1: use the pool of the caller and leave it running')
+        with WorkerPool(num_cpu = 1) as pool:
+            with workerPool(pool, num_cpu = 1) as my_result:
+                self.assertIs(my_result, pool)
+                list(my_result.imapUnordered(abs, [-1]))
+            self.assertIsNotNone(pool.pool)
+
+        print('        ---------------------------------------------------')
+        print('        Case 2: without one, a temporary pool is closed on exit')
+        with workerPool(None, num_cpu = 1) as my_result:
+            self.assertEqual(list(my_result.imapUnordered(abs, [-2])), [2])
+        self.assertIsNone(my_result.pool)
+        print('===========================================================')
+
+
+def runningTasks(item):
+    """
+    Number of tasks (this one included) running in the workers, counted with marker files
+    """
+    marker = os.path.join(tempfile.gettempdir(), 'piemmer_test_task_' + str(os.getpid()))
+    open(marker, 'w').close()
+    time.sleep(0.05)
+    running = len([name for name in os.listdir(tempfile.gettempdir()) if name.startswith('piemmer_test_task_')])
+    os.remove(marker)
+    return(running)
+
+
+def markedTask(task):
+    """
+    Leave a marker file for <item> in <directory>
+    """
+    directory, item = task
+    open(os.path.join(directory, str(item)), 'w').close()
+    time.sleep(0.05)
+    return(item)
+
+
+class TestSerialWorkerPool(unittest.TestCase):
+
+    def test_imapUnordered(self):
+        print('\ntest_SerialWorkerPool.imapUnordered:')
+        print('        Case 1: tasks run in order in this thread')
+        with SerialWorkerPool() as pool:
+            self.assertEqual(list(pool.imapUnordered(abs, [-3, 1, -2])), [3, 1, 2])
+        print('===========================================================')
+
+
+class TestThreadWorkerPool(unittest.TestCase):
+
+    def test_imapUnordered(self):
+        print('\ntest_ThreadWorkerPool.imapUnordered:')
+        print('        Case 1: results of every task')
+        with ThreadWorkerPool(num_cpu = 2) as pool:
+            self.assertEqual(sorted(pool.imapUnordered(abs, [-3, 1, -2])), [1, 2, 3])
+
+        print('        ---------------------------------------------------')
+        print('        Case 2: closing the results early runs no further tasks (default: one task per thread)')
+        with tempfile.TemporaryDirectory() as directory:
+            with ThreadWorkerPool(num_cpu = 2) as pool:
+                stopped = pool.imapUnordered(markedTask, [(directory, item) for item in range(20)])
+                next(stopped)
+                stopped.close()
+            self.assertLessEqual(len(os.listdir(directory)), 3)
+
+        print('        ---------------------------------------------------')
+        print('        Case 3: <max_tasks> tasks at a time')
+        with tempfile.TemporaryDirectory() as directory:
+            with ThreadWorkerPool(num_cpu = 2) as pool:
+                stopped = pool.imapUnordered(markedTask, [(directory, item) for item in range(20)], max_tasks = 1)
+                next(stopped)
+                stopped.close()
+            self.assertLessEqual(len(os.listdir(directory)), 2)
+        print('===========================================================')
+
+
+class TestOrderedAssembler(unittest.TestCase):
+
+    def test_add(self):
+        print('\ntest_OrderedAssembler.add:')
+        print('        Case 1: results arriving in completion order end up in task order')
+        keys = [7, 3, 5, 0]
+        with WorkerPool(num_cpu = 2) as pool:
+            assembler = OrderedAssembler(keys)
+            for key, result in pool.imapUnordered(squared, keys):
+                assembler.add(key, result)
+        self.assertListEqual(assembler.results, [49, 9, 25, 0])
+        print('===========================================================')
+
+
+def squared(key):
+    return(key, key * key)
+
+
+def startDaemon(address, num_cpu):
+    daemon = multiprocessing.Process(target = serveWorkers, args = (address, 'test_key', num_cpu))
+    daemon.start()
+    for attempt in range(100):
+        try:
+            RemoteWorkerPool(addresses = [address], authkey = 'test_key', suppress = True).start()
+            break
+        except ErrorCode51:
+            time.sleep(0.1)
+    return(daemon)
+
+
+class TestRemoteWorkerPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.temp_dir = tempfile.TemporaryDirectory()
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+        cls.addresses = ['127.0.0.1:' + str(port), os.path.join(cls.temp_dir.name, 'worker.sock')]
+        cls.daemons = [startDaemon(cls.addresses[0], 1), startDaemon(cls.addresses[1], 2)]
+
+    @classmethod
+    def tearDownClass(cls):
+        for daemon in cls.daemons:
+            # stop the daemon like Ctrl-C does, so that it closes its worker processes
+            os.kill(daemon.pid, signal.SIGINT)
+            daemon.join()
+        cls.temp_dir.cleanup()
+
+
+    def test_imapUnordered(self):
+        print('\ntest_RemoteWorkerPool.imapUnordered:')
+        print('        Case 1: tasks run on daemons at a TCP port and a Unix socket on localhost')
+        pool = RemoteWorkerPool(addresses = self.addresses, authkey = 'test_key')
+        self.assertEqual(sorted(pool.imapUnordered(abs, range(-20, 0))), list(range(1, 21)))
+        self.assertEqual(pool.num_cpu, 3)
+
+        print('        ---------------------------------------------------')
+        print('        Case 2: an error in a task reaches the caller')
+        with self.assertRaises(TypeError):
+            list(pool.imapUnordered(abs, [-1, 'a']))
+
+        print('        ---------------------------------------------------')
+        print('        Case 3: wrong authkey')
+        with self.assertRaises(ErrorCode51):
+            RemoteWorkerPool(addresses = self.addresses, authkey = 'other_key', suppress = True).start()
+        print('===========================================================')
+
+
+    def test_MinusOneVNE(self):
+        print('\ntest_RemoteWorkerPool (MinusOneVNE):')
+        print('        Case 1: the data matrix goes to the daemons once and the results match')
+        data = numpy.random.default_rng(0).random((30, 400))
+        feature_names = ['col' + str(i) for i in range(data.shape[1])]
+        pool = RemoteWorkerPool(addresses = self.addresses, authkey = 'test_key')
+        for engine in ['svd', 'downdate']:
+            expected_result = MinusOneVNE(data = data, normalize = True, feature_names = feature_names, num_cpu = 1,
+                                          engine = engine, backend = 'serial').minusOneResult()
+            my_result = MinusOneVNE(data = data, normalize = True, feature_names = feature_names, num_cpu = 1,
+                                    engine = engine, pool = pool, backend = 'auto').minusOneResult().sort_values(by = 'feature_no')
+            self.assertListEqual(list(my_result['feature_name']), feature_names)
+            numpy.testing.assert_almost_equal(numpy.array(my_result['vNE']), numpy.array(expected_result['vNE']), decimal = 10)
+
+        print('        ---------------------------------------------------')
+        print('        Case 2: jackknife subsamples')
+        minus_one = MinusOneVNE(data = data[:, :40], normalize = True, feature_names = feature_names[:40], num_cpu = 2, pool = pool)
+        for row, my_result in minus_one.jackknifeResult(rows = [0, 5], block_num = 3):
+            expected_result = MinusOneVNE(data = numpy.delete(data[:, :40], row, axis = 0), normalize = True,
+                                          feature_names = feature_names[:40], num_cpu = 1, backend = 'serial').minusOneResult()
+            numpy.testing.assert_almost_equal(numpy.array(my_result['vNE']), numpy.array(expected_result['vNE']), decimal = 10)
+        print('===========================================================')
+
+
+class TestBlasThreads(unittest.TestCase):
+
+    def test_blasThreads(self):
+        print('\ntest_blasThreads:')
+        print('        Case 1: worker processes run with one BLAS thread each')
+        main_limits = limitBlasThreads(2)
+        with WorkerPool(num_cpu = 2) as pool:
+            for my_result in pool.imapUnordered(blasThreads, range(2)):
+                self.assertTrue(all(num_threads == 1 for num_threads in my_result))
+
+        print('        ---------------------------------------------------')
+        print('        Case 2: threads run with one BLAS thread and the limit is lifted afterwards')
+        before = blasThreads(None)
+        with ThreadWorkerPool(num_cpu = 2) as pool:
+            for my_result in pool.imapUnordered(blasThreads, range(2)):
+                self.assertTrue(all(num_threads == 1 for num_threads in my_result))
+        self.assertListEqual(blasThreads(None), before)
+
+        print('        ---------------------------------------------------')
+        print('        Case 3: overlapping pools (input files processed at the same time) keep the limit until the last closes')
+        first_pool = ThreadWorkerPool(num_cpu = 2)
+        second_pool = ThreadWorkerPool(num_cpu = 2)
+        list(first_pool.imapUnordered(blasThreads, range(2)))
+        list(second_pool.imapUnordered(blasThreads, range(2)))
+        first_pool.close()
+        self.assertTrue(all(num_threads == 1 for num_threads in blasThreads(None)))
+        second_pool.close()
+        self.assertListEqual(blasThreads(None), before)
+        main_limits.restore_original_limits()
+        print('===========================================================')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -200,6 +200,8 @@ class TestEMMER(unittest.TestCase):
                          notebook_name = '', neglect = '', normalize = normalize,
                          num_cpu = num_cpu, quick_look = quick_look,
                          use_fractional_abundance = use_fractional_abundance)
+        # stop its worker processes however the test ends
+        self.addCleanup(one_file.close)
         my_result = one_file.input_file_names
 
         expected_result = ['piemmer/data/data_dir_1/test_case_1.csv']
@@ -247,6 +249,7 @@ class TestEMMER(unittest.TestCase):
                          notebook_name = '', neglect = '', normalize = normalize,
                          num_cpu = num_cpu, quick_look = quick_look,
                          use_fractional_abundance = use_fractional_abundance)
+        self.addCleanup(one_file.close)
 
         one_file.singleFile()
 
@@ -294,6 +297,7 @@ class TestEMMER(unittest.TestCase):
                          notebook_name = '', neglect = '', normalize = normalize,
                          num_cpu = num_cpu, quick_look = quick_look,
                          use_fractional_abundance = use_fractional_abundance)
+        self.addCleanup(one_file.close)
 
         one_file.singleFile()
 
@@ -358,6 +362,7 @@ class TestEMMER(unittest.TestCase):
                          notebook_name = '', neglect = '', normalize = normalize,
                          num_cpu = num_cpu, quick_look = quick_look,
                          use_fractional_abundance = use_fractional_abundance)
+        self.addCleanup(one_file.close)
 
         one_file.singleFile()
         my_result = list(one_file.data.filtered_data.data.columns.values)
@@ -406,6 +411,7 @@ class TestEMMER(unittest.TestCase):
                          notebook_name = '', neglect = '', normalize = normalize,
                          num_cpu = num_cpu, quick_look = quick_look,
                          use_fractional_abundance = use_fractional_abundance)
+        self.addCleanup(one_file.close)
 
         one_file.multipleFiles()
 
@@ -460,6 +466,7 @@ class TestEMMER(unittest.TestCase):
                          notebook_name = '', neglect = '', normalize = normalize,
                          num_cpu = num_cpu, quick_look = quick_look,
                          use_fractional_abundance = use_fractional_abundance)
+        self.addCleanup(one_file.close)
 
         one_file.multipleFiles()
 
@@ -475,6 +482,39 @@ class TestEMMER(unittest.TestCase):
                                            index = ['col2', 'col3', 'col4', 'col6'])
 
         assert_frame_equal(my_result, expected_result)
+
+        print('        ---------------------------------------------------')
+        print('        case 3: every output file is written when multipleFiles() returns')
+        for file_name in (one_file.clean_df_file_names + one_file.pre_filter_data_file_names +
+                          one_file.filter_out_data_file_names + one_file.raw_not_infoRich_data_name):
+            self.assertTrue(os.path.getsize(file_name) > 0)
+
+        print('        ---------------------------------------------------')
+        print('        case 4: process the files at the same time (concurrent_files = True); same result as case 1')
+        sequential_file_names = one_file.clean_df_file_names
+        one_file = EMMER(input_dir = input_dir, output_file_tag = output_file_tag,
+                         detection_limit = detection_limit, tolerance = tolerance,
+                         filter = filter, upper_threshold_factor = upper_threshold_factor,
+                         lower_threshold_factor = lower_threshold_factor,
+                         specific_csv = specific_csv, infoRich_threshold = 2,
+                         notebook_name = '', neglect = '', normalize = normalize,
+                         num_cpu = 2, quick_look = False,
+                         use_fractional_abundance = use_fractional_abundance, concurrent_files = True)
+
+        one_file.multipleFiles()
+        one_file.close()
+
+        self.assertListEqual(list(one_file.summary_df.columns), [os.path.basename(element) for element in one_file.input_file_names])
+        self.assertListEqual(one_file.clean_df_file_names, sequential_file_names)
+        data = [[0.00, 28.57],
+                [50.00, 0.00],
+                [66.67, 0.00],
+                [0.00, 100.00],
+                [33.33, 0.00],
+                [66.67, 0.00]]
+        expected_result = pandas.DataFrame(data, columns = ['test_case_1.csv', 'test_case_2.csv'],
+                                           index = ['col1', 'col2', 'col3', 'col4', 'col5', 'col6'])
+        assert_frame_equal(one_file.summary_df.reindex(sorted(one_file.summary_df.columns), axis = 1), expected_result)
         shutil.rmtree('output')
         print('===========================================================')
 
@@ -517,6 +557,7 @@ class TestMergeDataFrame(unittest.TestCase):
                          notebook_name = '', neglect = '', normalize = normalize,
                          num_cpu = num_cpu, quick_look = quick_look,
                          use_fractional_abundance = use_fractional_abundance)
+        self.addCleanup(one_file.close)
 
         one_file.multipleFiles()
         transform_info = mergeDataFrame(EMMER_class = one_file, select = 'filtered_infoRich',
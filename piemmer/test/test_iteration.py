@@ -7,10 +7,14 @@
 import unittest
 from ..main.basic.math import NonDesityMatrix
 from ..main.basic.read import RawDataImport
-from ..main.advanced.iteration import MinusOneVNE, InfoRichCalling, reproducibility, reproducibility_summary, Kernal
+from ..main.advanced.iteration import MinusOneVNE, JackknifeVNE, InfinitesimalJackknifeVNE, InfoRichCalling, reproducibility, reproducibility_summary, drawSubsamples, SequentialStop, Kernal, leverage_warning
 from ..troubleshoot.warn.warning import *
-from ..troubleshoot.err.error import ErrorCode4, ErrorCode6
+from ..troubleshoot.err.error import ErrorCode4, ErrorCode6, ErrorCode49
+from ..toolbox.executor import WorkerPool
+from ..toolbox.cache import ResultCache, matrixDigest
 import numpy
+import scipy.sparse
+import tempfile
 import pandas
 import sys
 import os
@@ -44,6 +48,274 @@ class TestMinusOneVNE(unittest.TestCase):
         print('===========================================================')
 
 
+    def test_minusOneResult_downdate(self):
+        print('\ntest_MinusOneVNE.minusOneResult (engine = "downdate"):')
+        print('        case 1: same von Neumann entropies as running SVD on every remove-one-column matrix')
+        A = numpy.array([[1, 4, 5, 12], [5, 8, 9, 0], [6, 7, 11, 19]])
+        InputA = MinusOneVNE(data = A, normalize = False, feature_names = ["col1", "col2", "col3", "col4"], num_cpu = 1, engine = 'downdate')
+        InputA.minusOneResult()
+        my_result = list(numpy.round(numpy.array(InputA.result_summary.sort_values(by = 'feature_no')['vNE']), decimals = 6))
+
+        expected_result = [0.529410, 0.602077, 0.478102, 0.268291]
+        self.assertListEqual(my_result, expected_result)
+
+        print('        ---------------------------------------------------')
+        print('        case 2: use correlation matrix')
+        file_name = 'piemmer/data/data_dir_4/group_A.csv'
+        input_matrix = RawDataImport(file_name = file_name)
+        input_matrix.readCSV()
+        input_matrix.relativeAbundance()
+        svd_result = MinusOneVNE(data = input_matrix.data, normalize = True, feature_names = input_matrix.feature_names,
+                                 num_cpu = 1).minusOneResult().sort_values(by = 'feature_no')
+        downdate_result = MinusOneVNE(data = input_matrix.data, normalize = True, feature_names = input_matrix.feature_names,
+                                      num_cpu = 1, engine = 'downdate').minusOneResult().sort_values(by = 'feature_no')
+        numpy.testing.assert_almost_equal(numpy.array(downdate_result['vNE']), numpy.array(svd_result['vNE']), decimal = 10)
+
+        print('        ---------------------------------------------------')
+        print('        case 3: a column that dominates the spectrum, on worker processes')
+        rng = numpy.random.default_rng(0)
+        A = rng.poisson(3, size = (60, 400)).astype(float)
+        A[:, 7] = A[:, 7] * 1000
+        feature_names = ["col" + str(i) for i in range(400)]
+        features = [0, 7, 8]
+        svd_result = MinusOneVNE(data = A, normalize = False, feature_names = feature_names,
+                                 num_cpu = 1).minusOneResult(features = features).sort_values(by = 'feature_no')
+        with WorkerPool(num_cpu = 2) as pool:
+            downdate_result = MinusOneVNE(data = A, normalize = False, feature_names = feature_names, num_cpu = 2, engine = 'downdate',
+                                          pool = pool).minusOneResult(features = features).sort_values(by = 'feature_no')
+        numpy.testing.assert_almost_equal(numpy.array(downdate_result['vNE']), numpy.array(svd_result['vNE']), decimal = 10)
+        print('===========================================================')
+
+    def test_minusOneResult_batched(self):
+        print('\ntest_MinusOneVNE.minusOneResult (engine = "batched"):')
+        print('        case 1: more features than samples; stack Gram matrices')
+        A = numpy.array([[1, 4, 5, 12], [5, 8, 9, 0], [6, 7, 11, 19]])
+        InputA = MinusOneVNE(data = A, normalize = False, feature_names = ["col1", "col2", "col3", "col4"], num_cpu = 1,
+                             engine = 'batched', memory_budget = 1)
+        InputA.minusOneResult()
+        my_result = list(numpy.round(numpy.array(InputA.result_summary['vNE']), decimals = 6))
+
+        expected_result = [0.529410, 0.602077, 0.478102, 0.268291]
+        self.assertListEqual(my_result, expected_result)
+
+        print('        ---------------------------------------------------')
+        print('        case 2: more samples than features; stack covariance matrices')
+        B = numpy.array([[1, 4, 5, 12], [5, 8, 9, 0], [6, 7, 11, 19], [2, 0, 3, 7], [9, 1, 4, 4], [3, 3, 8, 1]])
+        feature_names = ["col1", "col2", "col3", "col4"]
+        svd_result = MinusOneVNE(data = B, normalize = True, feature_names = feature_names,
+                                 num_cpu = 1).minusOneResult().sort_values(by = 'feature_no')
+        batched_result = MinusOneVNE(data = B, normalize = True, feature_names = feature_names,
+                                     num_cpu = 1, engine = 'batched').minusOneResult()
+        numpy.testing.assert_almost_equal(numpy.array(batched_result['vNE']), numpy.array(svd_result['vNE']), decimal = 10)
+        print('===========================================================')
+
+
+    def test_minusOneResult_randomized(self):
+        print('\ntest_MinusOneVNE.minusOneResult (method = "randomized"):')
+        print('        case 1: report the error bound next to each von Neumann entropy')
+        rng = numpy.random.default_rng(0)
+        A = numpy.matmul(rng.standard_normal((60, 5)), rng.standard_normal((5, 80))) + 0.01 * rng.standard_normal((60, 80))
+        feature_names = ["col" + str(i) for i in range(80)]
+        svd_result = MinusOneVNE(data = A, normalize = False, feature_names = feature_names,
+                                 num_cpu = 1).minusOneResult().sort_values(by = 'feature_no')
+        randomized_result = MinusOneVNE(data = A, normalize = False, feature_names = feature_names, num_cpu = 1,
+                                        method = 'randomized', tolerance = 0.05).minusOneResult().sort_values(by = 'feature_no')
+
+        self.assertListEqual(list(randomized_result.columns), ['feature_no', 'feature_name', 'vNE', 'vNE_error_bound'])
+        error = numpy.abs(numpy.array(randomized_result['vNE']) - numpy.array(svd_result['vNE']))
+        self.assertTrue(numpy.all(error <= numpy.array(randomized_result['vNE_error_bound']) + 10**-12))
+
+        print('        ---------------------------------------------------')
+        print('        case 2: stochastic Lanczos quadrature reports its confidence interval the same way')
+        slq_result = MinusOneVNE(data = A, normalize = False, feature_names = feature_names, num_cpu = 1,
+                                 method = 'slq', num_probe = 10, lanczos_steps = 10).minusOneResult()
+        self.assertListEqual(list(slq_result.columns), ['feature_no', 'feature_name', 'vNE', 'vNE_error_bound'])
+        self.assertTrue(numpy.all(slq_result['vNE_error_bound'] > 0))
+        print('===========================================================')
+
+
+    def test_minusOneResult_sparse(self):
+        print('\ntest_MinusOneVNE.minusOneResult (scipy.sparse input):')
+        print('        case 1: every engine matches the dense result')
+        A = numpy.array([[1, 0, 5, 0], [0, 8, 0, 0], [6, 0, 11, 19], [0, 0, 3, 7], [9, 1, 0, 0]])
+        feature_names = ["col1", "col2", "col3", "col4"]
+        for engine in ['svd', 'downdate', 'batched']:
+            dense_result = MinusOneVNE(data = A, normalize = True, feature_names = feature_names, num_cpu = 1,
+                                       engine = engine).minusOneResult().sort_values(by = 'feature_no')
+            sparse_result = MinusOneVNE(data = scipy.sparse.csr_matrix(A), normalize = True, feature_names = feature_names, num_cpu = 1,
+                                        engine = engine).minusOneResult().sort_values(by = 'feature_no')
+            numpy.testing.assert_almost_equal(numpy.array(sparse_result['vNE']), numpy.array(dense_result['vNE']), decimal = 10)
+        print('===========================================================')
+
+
+    def test_minusOneResult_pool(self):
+        print('\ntest_MinusOneVNE.minusOneResult (persistent worker pool):')
+        print('        case 1: the same workers serve MinusOneVNE of different data matrices and engines')
+        A = numpy.array([[1, 0, 5, 0], [0, 8, 0, 0], [6, 0, 11, 19], [0, 0, 3, 7], [9, 1, 0, 0]])
+        B = numpy.array([[2, 3, 0, 1, 4], [5, 0, 1, 1, 0], [0, 2, 7, 3, 1]])
+        jobs = [(A, ["col1", "col2", "col3", "col4"], 'svd'), (B, ["a", "b", "c", "d", "e"], 'downdate'),
+                (A, ["col1", "col2", "col3", "col4"], 'downdate')]
+        with WorkerPool(num_cpu = 2) as pool:
+            for data, feature_names, engine in jobs:
+                expected_result = MinusOneVNE(data = data, normalize = True, feature_names = feature_names, num_cpu = 1,
+                                              engine = engine).minusOneResult().sort_values(by = 'feature_no')
+                my_result = MinusOneVNE(data = data, normalize = True, feature_names = feature_names, num_cpu = 1,
+                                        engine = engine, pool = pool).minusOneResult().sort_values(by = 'feature_no')
+                self.assertListEqual(list(my_result['feature_name']), feature_names)
+                numpy.testing.assert_almost_equal(numpy.array(my_result['vNE']), numpy.array(expected_result['vNE']), decimal = 10)
+        self.assertIsNone(pool.pool)
+
+        print('        ---------------------------------------------------')
+        print('        case 2: rows come back in the order of <features> on every backend, without sorting')
+        data = numpy.random.default_rng(0).random((6, 40))
+        feature_names = ['col' + str(i) for i in range(data.shape[1])]
+        features = list(numpy.random.default_rng(1).permutation(data.shape[1]))
+        expected_result = MinusOneVNE(data = data, normalize = True, feature_names = feature_names, num_cpu = 1,
+                                      backend = 'serial').minusOneResult(features = features)
+        self.assertListEqual(list(expected_result['feature_no']), features)
+        for backend in ['processes', 'threads']:
+            my_result = MinusOneVNE(data = data, normalize = True, feature_names = feature_names, num_cpu = 2,
+                                    backend = backend).minusOneResult(features = features)
+            pandas.testing.assert_frame_equal(my_result, expected_result)
+        print('===========================================================')
+
+
+    def test_minusOneResult_threads(self):
+        print('\ntest_MinusOneVNE.minusOneResult (backend):')
+        print('        case 1: the threads, serial and auto backends match the processes backend')
+        A = numpy.array([[1, 0, 5, 0], [0, 8, 0, 0], [6, 0, 11, 19], [0, 0, 3, 7], [9, 1, 0, 0]])
+        feature_names = ["col1", "col2", "col3", "col4"]
+        for engine in ['svd', 'downdate']:
+            expected_result = MinusOneVNE(data = A, normalize = True, feature_names = feature_names, num_cpu = 2,
+                                          engine = engine).minusOneResult().sort_values(by = 'feature_no')
+            for backend in ['threads', 'serial', 'auto']:
+                minus_one = MinusOneVNE(data = A, normalize = True, feature_names = feature_names, num_cpu = 2,
+                                        engine = engine, backend = backend)
+                my_result = minus_one.minusOneResult().sort_values(by = 'feature_no')
+                self.assertListEqual(list(my_result['feature_name']), feature_names)
+                numpy.testing.assert_almost_equal(numpy.array(my_result['vNE']), numpy.array(expected_result['vNE']), decimal = 10)
+
+                minus_one = MinusOneVNE(data = A, normalize = True, feature_names = feature_names, num_cpu = 2,
+                                        engine = engine, backend = backend)
+                for row, my_result in minus_one.jackknifeResult(block_num = 3):
+                    expected_result_sub = MinusOneVNE(data = numpy.delete(A, row, axis = 0), normalize = True, feature_names = feature_names,
+                                                      num_cpu = 1, engine = engine).minusOneResult().sort_values(by = 'feature_no')
+                    numpy.testing.assert_almost_equal(numpy.array(my_result['vNE']), numpy.array(expected_result_sub['vNE']), decimal = 10)
+
+        print('        ---------------------------------------------------')
+        print('        case 2: unknown backend')
+        with self.assertRaises(ErrorCode49):
+            MinusOneVNE(data = A, normalize = True, feature_names = feature_names, num_cpu = 1, backend = 'gpu', suppress = True)
+        print('===========================================================')
+
+
+    def test_jackknifeResult(self):
+        print('\ntest_MinusOneVNE.jackknifeResult:')
+        print('        case 1: every remove-one-sample subset matches minusOneResult(), in row order')
+        A = numpy.array([[1, 0, 5, 0], [0, 8, 0, 0], [6, 0, 11, 19], [0, 0, 3, 7], [9, 1, 0, 0]])
+        feature_names = ["col1", "col2", "col3", "col4"]
+        with WorkerPool(num_cpu = 2) as pool:
+            for engine in ['svd', 'downdate']:
+                minus_one = MinusOneVNE(data = A, normalize = True, feature_names = feature_names, num_cpu = 2,
+                                        engine = engine, pool = pool)
+                rows = []
+                for row, my_result in minus_one.jackknifeResult(block_num = 3):
+                    rows.append(row)
+                    expected_result = MinusOneVNE(data = numpy.delete(A, row, axis = 0), normalize = True, feature_names = feature_names,
+                                                  num_cpu = 1, engine = engine).minusOneResult().sort_values(by = 'feature_no')
+                    self.assertListEqual(list(my_result['feature_no']), [0, 1, 2, 3])
+                    self.assertListEqual(list(my_result['feature_name']), feature_names)
+                    numpy.testing.assert_almost_equal(numpy.array(my_result['vNE']), numpy.array(expected_result['vNE']), decimal = 10)
+                self.assertListEqual(rows, [0, 1, 2, 3, 4])
+        print('===========================================================')
+
+
+    def test_screenedResult(self):
+        print('\ntest_MinusOneVNE.screenedResult:')
+        print('        case 1: exact values near the thresholds, first-order estimates elsewhere')
+        rng = numpy.random.default_rng(0)
+        A = rng.poisson(3, size = (12, 40)).astype(float)
+        feature_names = ["col" + str(i) for i in range(40)]
+        exact_result = MinusOneVNE(data = A, normalize = True, feature_names = feature_names,
+                                   num_cpu = 1).minusOneResult().sort_values(by = 'feature_no')
+        screened = MinusOneVNE(data = A, normalize = True, feature_names = feature_names, num_cpu = 1, screen = 0.5)
+        screened_result = screened.screenedResult(upper_threshold_factor = 1.5, lower_threshold_factor = 1.5)
+
+        self.assertListEqual(list(screened_result.columns), ['feature_no', 'feature_name', 'vNE', 'screening'])
+        is_exact = numpy.array(screened_result['screening'] == 'exact')
+        self.assertTrue(0 < sum(is_exact) < 40)
+        numpy.testing.assert_almost_equal(numpy.array(screened_result['vNE'])[is_exact],
+                                          numpy.array(exact_result['vNE'])[is_exact], decimal = 10)
+        self.assertGreater(numpy.corrcoef(screened.screen_summary['vNE'], exact_result['vNE'])[0, 1], 0.99)
+
+        print('        ---------------------------------------------------')
+        print('        case 2: the same information-rich calls as the exact values once the thresholds move with the correction')
+        rng = numpy.random.default_rng(24)
+        A = rng.poisson(3, size = (15, 120)).astype(float)
+        feature_names = ["col" + str(i) for i in range(120)]
+        exact_vNE = numpy.array(MinusOneVNE(data = A, normalize = True, feature_names = feature_names,
+                                            num_cpu = 1).minusOneResult().sort_values(by = 'feature_no')['vNE'])
+        screened = MinusOneVNE(data = A, normalize = True, feature_names = feature_names, num_cpu = 1, screen = 1.0)
+        screened_result = screened.screenedResult(upper_threshold_factor = 1.5, lower_threshold_factor = 1.5)
+        self.assertTrue(sum(screened_result['screening'] == 'exact') < 120)
+        infoRichCalls = lambda vNE: list(numpy.flatnonzero(numpy.abs(vNE - numpy.mean(vNE)) > 1.5 * numpy.std(vNE, ddof = 1)))
+        self.assertListEqual(infoRichCalls(numpy.array(screened_result['vNE'])), infoRichCalls(exact_vNE))
+        print('===========================================================')
+
+
+    def test_refinedResult(self):
+        print('\ntest_MinusOneVNE.refinedResult:')
+        print('        case 1: recalculate the features near the thresholds in float64')
+        rng = numpy.random.default_rng(0)
+        A = rng.poisson(3, size = (12, 40)).astype(float)
+        feature_names = ["col" + str(i) for i in range(40)]
+        exact_result = MinusOneVNE(data = A, normalize = True, feature_names = feature_names,
+                                   num_cpu = 1).minusOneResult().sort_values(by = 'feature_no')
+        single = MinusOneVNE(data = A, normalize = True, feature_names = feature_names, num_cpu = 1,
+                             precision = 'float32', refine = 0.5)
+        self.assertEqual(single.data.dtype, numpy.float32)
+        refined_result = single.refinedResult(single.minusOneResult(), upper_threshold_factor = 1.5,
+                                              lower_threshold_factor = 1.5).sort_values(by = 'feature_no')
+
+        is_float64 = numpy.array(refined_result['precision'] == 'float64')
+        self.assertTrue(0 < sum(is_float64) < 40)
+        numpy.testing.assert_almost_equal(numpy.array(refined_result['vNE'])[is_float64],
+                                          numpy.array(exact_result['vNE'])[is_float64], decimal = 12)
+        self.assertLess(single.max_precision_deviation, 10**-4)
+        numpy.testing.assert_almost_equal(numpy.array(refined_result['vNE']), numpy.array(exact_result['vNE']), decimal = 4)
+        print('===========================================================')
+
+
+    def test_prunedResult(self):
+        print('\ntest_MinusOneVNE.prunedResult:')
+        print('        case 1: same information-rich features as minusOneResult(), without calculating most features')
+        rng = numpy.random.default_rng(0)
+        A = rng.gamma(0.5, size = (13, 80)) * rng.gamma(0.5, size = 80)
+        feature_names = ["col" + str(i) for i in range(80)]
+        for normalize in [False, True]:
+            exact_result = MinusOneVNE(data = A, normalize = normalize, feature_names = feature_names,
+                                       num_cpu = 1).minusOneResult().sort_values(by = 'feature_no')
+            pruned = MinusOneVNE(data = A, normalize = normalize, feature_names = feature_names, num_cpu = 1, prune = True)
+            pruned_result = pruned.prunedResult(upper_threshold_factor = 1.5, lower_threshold_factor = 1.5).sort_values(by = 'feature_no')
+
+            is_exact = numpy.array(pruned_result['pruning'] == 'exact')
+            self.assertEqual(pruned.num_pruned, 80 - sum(is_exact))
+            numpy.testing.assert_almost_equal(numpy.array(pruned_result['vNE'])[is_exact],
+                                              numpy.array(exact_result['vNE'])[is_exact], decimal = 12)
+            for result_summary in [exact_result, pruned_result]:
+                info_rich = InfoRichCalling(data = A, current_feature_names = feature_names, upper_threshold_factor = 1.5,
+                                            lower_threshold_factor = 1.5, num_cpu = 1, normalize = normalize,
+                                            direct_from_result_summary = '', precomputed_result_summary = result_summary.copy())
+                info_rich.infoRichSelect()
+                if result_summary is exact_result:
+                    expected_result = list(info_rich.info_rich_feature['feature_name'])
+            self.assertListEqual(list(info_rich.info_rich_feature['feature_name']), expected_result)
+            # without normalization the column norms differ and most features are pruned
+            if normalize == False:
+                self.assertGreater(pruned.num_pruned, 40)
+        print('===========================================================')
+
+
 class TestInfoRichCalling(unittest.TestCase):
 
     def test_infoRichSelect(self):
@@ -88,8 +360,57 @@ class TestInfoRichCalling(unittest.TestCase):
         print('===========================================================')
 
 
+class TestJackknifeVNE(unittest.TestCase):
+
+    def test_minusOneResult(self):
+        print('\ntest_JackknifeVNE.minusOneResult:')
+        print('        case 1: same as rebuilding every leave-one-sample-out subsample from scratch')
+        rng = numpy.random.default_rng(0)
+        for shape in [(8, 20), (20, 6)]:
+            A = rng.poisson(3, size = shape).astype(float)
+            feature_names = ["col" + str(i) for i in range(shape[1])]
+            for normalize in [False, True]:
+                jackknife = JackknifeVNE(data = A, normalize = normalize, feature_names = feature_names, memory_budget = 4096)
+                for row in range(shape[0]):
+                    expected_result = MinusOneVNE(data = numpy.delete(A, row, axis = 0), normalize = normalize, feature_names = feature_names,
+                                                  num_cpu = 1).minusOneResult().sort_values(by = 'feature_no')
+                    my_result = jackknife.minusOneResult(row)
+                    numpy.testing.assert_almost_equal(numpy.array(my_result['vNE']), numpy.array(expected_result['vNE']), decimal = 10)
+        print('===========================================================')
+
+
+class TestInfinitesimalJackknifeVNE(unittest.TestCase):
+
+    def test_influenceResult(self):
+        print('\ntest_InfinitesimalJackknifeVNE.influenceResult:')
+        print('        case 1: full data entropies match MinusOneVNE; the influences track JackknifeVNE when samples >> features')
+        rng = numpy.random.default_rng(0)
+        A = numpy.matmul(rng.normal(size = (400, 8)), rng.normal(size = (8, 8))) + 10
+        feature_names = ["col" + str(i) for i in range(8)]
+        for normalize in [False, True]:
+            approximation = InfinitesimalJackknifeVNE(data = A, normalize = normalize, feature_names = feature_names)
+            approximation.influenceResult()
+            expected_result = MinusOneVNE(data = A, normalize = normalize, feature_names = feature_names,
+                                          num_cpu = 1).minusOneResult().sort_values(by = 'feature_no')
+            numpy.testing.assert_almost_equal(approximation.vNE, numpy.array(expected_result['vNE']), decimal = 10)
+            self.assertTrue(approximation.max_leverage < 0.2)
+
+            jackknife = JackknifeVNE(data = A, normalize = normalize, feature_names = feature_names)
+            rows = range(0, 400, 20)
+            exact_change = numpy.array([numpy.array(jackknife.minusOneResult(row)['vNE']) for row in rows]) - approximation.vNE
+            predicted_change = numpy.array([numpy.array(approximation.minusOneResult(row)['vNE']) for row in rows]) - approximation.vNE
+            self.assertTrue(numpy.linalg.norm(predicted_change - exact_change) < 0.3 * numpy.linalg.norm(exact_change))
+        print('===========================================================')
+
+
 class Test_reproducibility_summary(unittest.TestCase):
 
+    def setUp(self):
+        # detail_vNE files go to a temporary folder, not the working directory
+        output_folder = tempfile.TemporaryDirectory()
+        self.addCleanup(output_folder.cleanup)
+        self.vNE_output_folder = output_folder.name
+
     def test_reproducibility_summary(self):
         print('\ntest_reproducibility_summary:')
         file_name = 'piemmer/data/test_case_1.csv'
@@ -111,7 +432,7 @@ class Test_reproducibility_summary(unittest.TestCase):
         info_rich_features_w_reproducibility = reproducibility_summary(filtered_matrix = filtered_data.data,
                                                                        infoRich_dict = reproducibility(InfoRichCalling_class = info_rich_result,
                                                                                                        infoRich_dict = infoRich_dict, nrow = nrow,
-                                                                                                       basename = '', vNE_output_folder = '',
+                                                                                                       basename = '', vNE_output_folder = self.vNE_output_folder,
                                                                                                        output_file_tag = '', num_cpu = 1,
                                                                                                        normalize = False,
                                                                                                        direct_from_result_summary = ''))
@@ -123,17 +444,108 @@ class Test_reproducibility_summary(unittest.TestCase):
         my_result = list(info_rich_features_w_reproducibility['feature_name'])
         expected_result = ['col3', 'col5', 'col2', 'col6', 'col1']
         self.assertListEqual(my_result, expected_result)
-        os.remove('__sub_0_detail_vNE.csv')
-        os.remove('__sub_1_detail_vNE.csv')
-        os.remove('__sub_2_detail_vNE.csv')
-        os.remove('__sub_3_detail_vNE.csv')
-        os.remove('__sub_4_detail_vNE.csv')
-        os.remove('__sub_5_detail_vNE.csv')
+
+        print('        ---------------------------------------------------')
+        print('        case 2: derive the subsamples from the full data matrix (jackknife = "update")')
+        info_rich_features_w_reproducibility = reproducibility_summary(filtered_matrix = filtered_data.data,
+                                                                       infoRich_dict = reproducibility(InfoRichCalling_class = info_rich_result,
+                                                                                                       infoRich_dict = {}, nrow = nrow,
+                                                                                                       basename = '', vNE_output_folder = self.vNE_output_folder,
+                                                                                                       output_file_tag = '', num_cpu = 1,
+                                                                                                       normalize = False,
+                                                                                                       direct_from_result_summary = '',
+                                                                                                       jackknife = 'update'))
+        self.assertListEqual(list(info_rich_features_w_reproducibility['occurrence']), [4, 2, 3, 4, 1])
+        self.assertListEqual(list(info_rich_features_w_reproducibility['feature_name']), ['col3', 'col5', 'col2', 'col6', 'col1'])
+
+        print('        ---------------------------------------------------')
+        print('        case 3: delete-d subsamples (jackknife = "subsample") with their Monte Carlo standard error')
+        # every one of the 6 delete-1 subsamples is the leave-one-out jackknife
+        subsamples = drawSubsamples(nrow = nrow, num_subsample = 10, delete_num = 1)
+        self.assertListEqual(subsamples, [(0,), (1,), (2,), (3,), (4,), (5,)])
+        info_rich_features_w_reproducibility = reproducibility_summary(filtered_matrix = filtered_data.data,
+                                                                       infoRich_dict = reproducibility(InfoRichCalling_class = info_rich_result,
+                                                                                                       infoRich_dict = {}, nrow = nrow,
+                                                                                                       basename = '', vNE_output_folder = self.vNE_output_folder,
+                                                                                                       output_file_tag = '', num_cpu = 1,
+                                                                                                       normalize = False,
+                                                                                                       direct_from_result_summary = '',
+                                                                                                       jackknife = 'subsample', subsamples = subsamples),
+                                                                       num_subsample = len(subsamples))
+        self.assertListEqual(list(info_rich_features_w_reproducibility['occurrence']), [4, 2, 3, 4, 1])
+        fraction = numpy.array([4, 2, 3, 4, 1]) / 6
+        numpy.testing.assert_almost_equal(numpy.array(info_rich_features_w_reproducibility['standard_error (%)']),
+                                          numpy.sqrt(fraction * (1 - fraction) / 6) * 100, decimal = 10)
+
+        # random delete-2 subsamples: different, reproducible with the seed
+        subsamples = drawSubsamples(nrow = nrow, num_subsample = 8, delete_num = 2, seed = 1)
+        self.assertEqual(len(set(subsamples)), 8)
+        self.assertTrue(all(len(rows) == 2 and rows[0] < rows[1] for rows in subsamples))
+        self.assertListEqual(subsamples, drawSubsamples(nrow = nrow, num_subsample = 8, delete_num = 2, seed = 1))
+        infoRich_dict = reproducibility(InfoRichCalling_class = info_rich_result, infoRich_dict = {}, nrow = nrow,
+                                        basename = '', vNE_output_folder = self.vNE_output_folder, output_file_tag = '', num_cpu = 1,
+                                        normalize = False, direct_from_result_summary = '',
+                                        jackknife = 'subsample', subsamples = subsamples)
+        self.assertTrue(all(0 < value <= 8 for value in infoRich_dict.values()))
+        with self.assertRaises(ErrorCode49):
+            reproducibility(InfoRichCalling_class = info_rich_result, infoRich_dict = {}, nrow = nrow,
+                            basename = '', vNE_output_folder = self.vNE_output_folder, output_file_tag = '', num_cpu = 1,
+                            normalize = False, direct_from_result_summary = '', jackknife = 'subsample', suppress = True)
+
+        print('        ---------------------------------------------------')
+        print('        case 4: stop as soon as every feature is settled (SequentialStop)')
+        # leave-one-out occurrences: col3 4, col5 2, col2 3, col6 4, col1 1
+        stopping = SequentialStop(feature_names = info_rich_result.feature_names, num_subsample = nrow,
+                                  infoRich_threshold = 3, confidence = 1)
+        infoRich_dict = reproducibility(InfoRichCalling_class = info_rich_result, infoRich_dict = {}, nrow = nrow,
+                                        basename = '', vNE_output_folder = self.vNE_output_folder, output_file_tag = '', num_cpu = 1,
+                                        normalize = False, direct_from_result_summary = '', stopping = stopping, seed = 2)
+        self.assertTrue(stopping.settled)
+        self.assertTrue(stopping.num_used <= nrow)
+        my_result = sorted(key for key, val in infoRich_dict.items() if val * nrow >= 3 * stopping.num_used)
+        self.assertListEqual(my_result, ['col2', 'col3', 'col6'])
+
+        stopping = SequentialStop(feature_names = ['a', 'b'], num_subsample = 100, infoRich_threshold = 50, confidence = 0.95)
+        for k in range(1, 11):
+            stopping.update({'a': k})
+            self.assertEqual(stopping.settled, k == 10)
+        self.assertEqual(stopping.num_used, 10)
+        stopping = SequentialStop(feature_names = ['a', 'b'], num_subsample = 100, infoRich_threshold = 50, confidence = 0.95)
+        for k in range(1, 21):
+            stopping.update({'a': k, 'b': k // 2})
+        self.assertEqual(stopping.num_undecided, 1)
+
+        print('        ---------------------------------------------------')
+        print('        case 5: predict the subsamples from the influence of each sample (jackknife = "infinitesimal")')
+        infoRich_dict = reproducibility(InfoRichCalling_class = info_rich_result, infoRich_dict = {}, nrow = nrow,
+                                        basename = '', vNE_output_folder = self.vNE_output_folder, output_file_tag = '', num_cpu = 1,
+                                        normalize = False, direct_from_result_summary = '', jackknife = 'infinitesimal')
+        self.assertTrue(all(0 < value <= nrow for value in infoRich_dict.values()))
+        self.assertTrue(set(infoRich_dict.keys()) <= set(info_rich_result.feature_names))
+
+        print('        ---------------------------------------------------')
+        print('        case 6: reuse the subsamples stored in a ResultCache')
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory = directory)
+            cache_key = {'matrix': matrixDigest(info_rich_result.data), 'normalize': False}
+            for expected_hits in [0, nrow]:
+                infoRich_dict = reproducibility(InfoRichCalling_class = info_rich_result, infoRich_dict = {}, nrow = nrow,
+                                                basename = '', vNE_output_folder = self.vNE_output_folder, output_file_tag = '', num_cpu = 1,
+                                                normalize = False, direct_from_result_summary = '',
+                                                cache = cache, cache_key = cache_key)
+                self.assertEqual(cache.hits, expected_hits)
+                self.assertDictEqual(infoRich_dict, {'col3': 4, 'col5': 2, 'col2': 3, 'col6': 4, 'col1': 1})
         print('===========================================================')
 
 
 class TestKernal(unittest.TestCase):
 
+    def setUp(self):
+        # detail_vNE files go to a temporary folder, not the working directory
+        output_folder = tempfile.TemporaryDirectory()
+        self.addCleanup(output_folder.cleanup)
+        self.vNE_output_folder = output_folder.name
+
     def test_importAndProcess(self):
         ## use "HardFilter"
         print('        ---------------------------------------------------')
@@ -157,8 +569,8 @@ class TestKernal(unittest.TestCase):
         quick_look_1 = True
         print('    use_fractional_abundance: True')
         use_fractional_abundance = True
-        print('    vNE_output_folder: ""')
-        vNE_output_folder = ''
+        print('    vNE_output_folder: temporary folder')
+        vNE_output_folder = self.vNE_output_folder
         print('    output_file_tag: out')
         output_file_tag = ''
         print('    normalize: False')
@@ -212,8 +624,8 @@ class TestKernal(unittest.TestCase):
         quick_look_1 = True
         print('    use_fractional_abundance: True')
         use_fractional_abundance = True
-        print('    vNE_output_folder: ""')
-        vNE_output_folder = ''
+        print('    vNE_output_folder: temporary folder')
+        vNE_output_folder = self.vNE_output_folder
         print('    output_file_tag: out')
         output_file_tag = ''
         print('    normalize: False')
@@ -252,8 +664,8 @@ class TestKernal(unittest.TestCase):
         quick_look_1 = True
         print('    use_fractional_abundance: True')
         use_fractional_abundance = True
-        print('    vNE_output_folder: ""')
-        vNE_output_folder = ''
+        print('    vNE_output_folder: temporary folder')
+        vNE_output_folder = self.vNE_output_folder
         print('    output_file_tag: out')
         output_file_tag = ''
         print('    normalize: False')
@@ -315,8 +727,8 @@ class TestKernal(unittest.TestCase):
         quick_look_1 = True
         print('    use_fractional_abundance: False')
         use_fractional_abundance = False
-        print('    vNE_output_folder: ""')
-        vNE_output_folder = ''
+        print('    vNE_output_folder: temporary folder')
+        vNE_output_folder = self.vNE_output_folder
         print('    output_file_tag: out')
         output_file_tag = ''
         print('    normalize: False')
@@ -378,8 +790,8 @@ class TestKernal(unittest.TestCase):
         quick_look_2 = False
         print('    use_fractional_abundance: True')
         use_fractional_abundance = True
-        print('    vNE_output_folder: ""')
-        vNE_output_folder = ''
+        print('    vNE_output_folder: temporary folder')
+        vNE_output_folder = self.vNE_output_folder
         print('    output_file_tag: out')
         output_file_tag = ''
         print('    normalize: False')
@@ -422,8 +834,8 @@ class TestKernal(unittest.TestCase):
         quick_look_2 = True
         print('    use_fractional_abundance: True')
         use_fractional_abundance = True
-        print('    vNE_output_folder: ""')
-        vNE_output_folder = ''
+        print('    vNE_output_folder: temporary folder')
+        vNE_output_folder = self.vNE_output_folder
         print('    output_file_tag: out')
         output_file_tag = ''
         print('    normalize: False')
@@ -474,8 +886,8 @@ class TestKernal(unittest.TestCase):
         quick_look_2 = False
         print('    use_fractional_abundance: True')
         use_fractional_abundance = True
-        print('    vNE_output_folder: ""')
-        vNE_output_folder = ''
+        print('    vNE_output_folder: temporary folder')
+        vNE_output_folder = self.vNE_output_folder
         print('    output_file_tag: out')
         output_file_tag = ''
         print('    normalize: False')
@@ -503,26 +915,48 @@ class TestKernal(unittest.TestCase):
         self.assertEqual(my_result, expected_result)
 
 
-        os.remove('test_case_1__sub_0_detail_vNE.csv')
-        os.remove('test_case_1__sub_1_detail_vNE.csv')
-        os.remove('test_case_1__sub_2_detail_vNE.csv')
-        os.remove('test_case_1__sub_3_detail_vNE.csv')
-        os.remove('test_case_1__sub_4_detail_vNE.csv')
-        os.remove('test_case_1__sub_5_detail_vNE.csv')
-        os.remove('group_A__detail_vNE.csv')
-        os.remove('group_A__sub_0_detail_vNE.csv')
-        os.remove('group_A__sub_1_detail_vNE.csv')
-        os.remove('group_A__sub_2_detail_vNE.csv')
-        os.remove('group_A__sub_3_detail_vNE.csv')
-        os.remove('group_A__sub_4_detail_vNE.csv')
-        os.remove('group_A__sub_5_detail_vNE.csv')
-        os.remove('group_A__sub_6_detail_vNE.csv')
-        os.remove('group_A__sub_7_detail_vNE.csv')
-        os.remove('group_A__sub_8_detail_vNE.csv')
-        os.remove('group_A__sub_9_detail_vNE.csv')
-        os.remove('group_A__sub_10_detail_vNE.csv')
-        os.remove('group_A__sub_11_detail_vNE.csv')
-        os.remove('group_A__sub_12_detail_vNE.csv')
+        print('===========================================================')
+
+
+    def test_resultCache(self):
+        print('\ntest_Kernal.resultCache:')
+        print('        case 1: a cached run reports the same as the run that filled the cache')
+        with tempfile.TemporaryDirectory() as directory:
+            cache = ResultCache(directory = os.path.join(directory, 'cache'))
+            results = []
+            for _ in range(2):
+                data = Kernal(file_name = 'piemmer/data/test_case_1.csv', detection_limit = 0, tolerance = 1,
+                              filter = 'None', upper_lim = 1, lower_lim = 1, infoRich_threshold = 1,
+                              quick_look = True, use_fractional_abundance = True,
+                              vNE_output_folder = directory, output_file_tag = '',
+                              num_cpu = 1, notebook_name = '', normalize = False, neglect = True,
+                              minus_one_options = {'precision': 'float32'}, cache = cache)
+                data.importAndProcess()
+                data.infoRichCallingAndReproducibility()
+                results.append((data.list_of_info_rich_features, data.info_rich_result.max_precision_deviation))
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            self.assertIsNotNone(results[1][1])
+            self.assertEqual(results[0], results[1])
+        print('===========================================================')
+
+
+    def test_infinitesimalLeverage(self):
+        print('\ntest_Kernal.infinitesimalLeverage:')
+        print('        case 1: the largest sample leverage goes to the notebook; with fewer samples than features it is high (Warning code 14)')
+        with tempfile.TemporaryDirectory() as directory:
+            notebook_name = os.path.join(directory, 'notebook.txt')
+            data = Kernal(file_name = 'piemmer/data/test_case_1.csv', detection_limit = 0, tolerance = 1,
+                          filter = 'None', upper_lim = 1, lower_lim = 1, infoRich_threshold = 1,
+                          quick_look = False, use_fractional_abundance = True,
+                          vNE_output_folder = directory, output_file_tag = '',
+                          num_cpu = 1, notebook_name = notebook_name, normalize = False, neglect = False,
+                          reproducibility_options = {'jackknife': 'infinitesimal'}, silence = True)
+            data.importAndProcess()
+            data.infoRichCallingAndReproducibility()
+            self.assertGreater(data.info_rich_result.max_leverage, leverage_warning)
+            self.assertEqual(data.warning_code, '14')
+            with open(notebook_name) as notebook:
+                self.assertIn('largest sample leverage ' + str(round(data.info_rich_result.max_leverage, 4)), notebook.read())
         print('===========================================================')
 
 
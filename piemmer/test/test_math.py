@@ -4,11 +4,12 @@
 # at a level above emmer/
 # python3 -m emmer.test.test_math
 
-from ..main.basic.math import NonDesityMatrix
+from ..main.basic.math import NonDesityMatrix, downdateEigvals, downdatedEigvals, entropyBounds, entropyFromNormEigvals, perturbationVNE, stochasticLanczosEntropy, interlacingEntropyBounds
 from ..posthoc.visual.viewer import Projection
 from ..troubleshoot.err.error import ErrorCode41
 
 import numpy.testing
+import scipy.sparse
 import unittest
 import pandas
 import numpy
@@ -85,5 +86,274 @@ class TestNonDesityMatrix(unittest.TestCase):
         print('===========================================================')
 
 
+    def test_method(self):
+        print('test_NonDesityMatrix.method:')
+        print('        case 1: SVD, Gram matrix and p x p matrix give the same result')
+        A = numpy.array([[1, 4, 5, 12, 3, 0], [5, 8, 9, 0, 1, 2], [6, 7, 11, 19, 0, 4]])
+
+        for normalize in [False, True]:
+            for data in [A, numpy.transpose(A)]:
+                expected_vNE = NonDesityMatrix(data, normalize = normalize, method = 'svd').vNE()
+                expected_numZeroEig = NonDesityMatrix(data, normalize = normalize, method = 'svd').numZeroEig()
+
+                for method in ['gram', 'cov', 'auto']:
+                    MatrixA = NonDesityMatrix(data, normalize = normalize, method = method)
+                    numpy.testing.assert_almost_equal(MatrixA.vNE(), expected_vNE, decimal = 10)
+                    self.assertEqual(NonDesityMatrix(data, normalize = normalize, method = method).numZeroEig(), expected_numZeroEig)
+
+        print('        ---------------------------------------------------')
+        print('        case 2: choose method from the shape of the matrix')
+        MatrixA = NonDesityMatrix(A, normalize = False)
+        MatrixA.vNE()
+        self.assertEqual(MatrixA.method_used, 'gram')
+
+        MatrixA = NonDesityMatrix(numpy.transpose(A), normalize = False)
+        MatrixA.vNE()
+        self.assertEqual(MatrixA.method_used, 'cov')
+
+        print('        ---------------------------------------------------')
+        print('        case 3: fall back to SVD when the required percision is too high')
+        MatrixA = NonDesityMatrix(A, normalize = False, epsilon = 16)
+        self.assertEqual(MatrixA.chooseMethod(), 'svd')
+
+        print('        ---------------------------------------------------')
+        print('        case 4: float32 rounding moves the cut: 3 * (float32 epsilon) is about 3.6 * 10^-7')
+        self.assertEqual(NonDesityMatrix(A, normalize = False, epsilon = 5).chooseMethod(), 'gram')
+        self.assertEqual(NonDesityMatrix(A, normalize = False, epsilon = 5, precision = 'float32').chooseMethod(), 'svd')
+        self.assertEqual(NonDesityMatrix(A, normalize = False, epsilon = 4, precision = 'float32').chooseMethod(), 'gram')
+        MatrixA = NonDesityMatrix(A, normalize = False, precision = 'float32')
+        numpy.testing.assert_almost_equal(MatrixA.vNE(), NonDesityMatrix(A, normalize = False, method = 'svd').vNE(), decimal = 5)
+        self.assertEqual(MatrixA.method_used, 'svd')
+        print('===========================================================')
+
+
+    def test_spectrum(self):
+        print('test_NonDesityMatrix.spectrum:')
+        print('        case 1: vNE() and numZeroEig() share one decomposition')
+        A = numpy.array([[1, 4, 5, 12], [5, 8, 9, 0], [6, 7, 11, 19]])
+        MatrixA = NonDesityMatrix(A, normalize = False)
+        cached = MatrixA.spectrum()
+        numpy.testing.assert_almost_equal(numpy.round(MatrixA.vNE(), decimals = 8), 0.66770591)
+        self.assertEqual(MatrixA.numZeroEig(), 2)
+        self.assertIs(MatrixA.spectrum(), cached)
+        self.assertIsNone(MatrixA.U)
+
+        print('        ---------------------------------------------------')
+        print('        case 2: singular vectors reconstruct the centered matrix')
+        MatrixA.spectrum(compute_uv = True)
+        S = numpy.zeros(MatrixA.matrixForSVD.shape)
+        S[0:3, 0:3] = numpy.diag(MatrixA.singular_values)
+        numpy.testing.assert_almost_equal(numpy.matmul(numpy.matmul(MatrixA.U, S), MatrixA.Vh), MatrixA.matrixForSVD, decimal = 10)
+        print('===========================================================')
+
+
+    def test_randomized(self):
+        print('test_NonDesityMatrix.randomized:')
+        print('        case 1: the exact von Neumann entropy lies within the reported error bound')
+        rng = numpy.random.default_rng(0)
+        A = numpy.matmul(rng.standard_normal((80, 10)), rng.standard_normal((10, 200))) + 0.01 * rng.standard_normal((80, 200))
+
+        for normalize in [False, True]:
+            expected_result = NonDesityMatrix(A, normalize = normalize, method = 'svd').vNE()
+            MatrixA = NonDesityMatrix(A, normalize = normalize, method = 'randomized', tolerance = 0.01)
+            my_result = MatrixA.vNE()
+            self.assertLess(MatrixA.rank_used, 80)
+            self.assertLessEqual(MatrixA.vNE_error_bound, 0.01)
+            self.assertLessEqual(abs(my_result - expected_result), MatrixA.vNE_error_bound)
+
+        print('        ---------------------------------------------------')
+        print('        case 2: fall back to the exact spectrum for small matrices')
+        A = numpy.array([[1, 4, 5, 12], [5, 8, 9, 0], [6, 7, 11, 19]])
+        MatrixA = NonDesityMatrix(A, normalize = False, method = 'randomized')
+        numpy.testing.assert_almost_equal(MatrixA.vNE(), 0.66770591, decimal = 6)
+        self.assertEqual(MatrixA.vNE_error_bound, 0)
+        print('===========================================================')
+
+
+    def test_sparse(self):
+        print('test_NonDesityMatrix.sparse:')
+        print('        case 1: scipy.sparse input gives the same spectrum as dense input')
+        A = numpy.array([[1, 0, 5, 0], [0, 8, 0, 0], [6, 0, 11, 19], [0, 0, 3, 7], [9, 1, 0, 0]])
+        for normalize in [False, True]:
+            for method in ['svd', 'gram', 'cov']:
+                dense_matrix = NonDesityMatrix(A, normalize = normalize, method = method)
+                sparse_matrix = NonDesityMatrix(scipy.sparse.csr_matrix(A), normalize = normalize, method = method)
+                numpy.testing.assert_almost_equal(sparse_matrix.vNE(), dense_matrix.vNE(), decimal = 10)
+                self.assertEqual(sparse_matrix.numZeroEig(), dense_matrix.numZeroEig())
+        print('===========================================================')
+
+
+    def test_precision(self):
+        print('test_NonDesityMatrix.precision:')
+        print('        case 1: float32 decompositions stay close to float64')
+        rng = numpy.random.default_rng(0)
+        A = rng.poisson(3, size = (20, 50))
+        for normalize in [False, True]:
+            for method in ['svd', 'gram', 'cov']:
+                expected_result = NonDesityMatrix(A, normalize = normalize, method = method).vNE()
+                MatrixA = NonDesityMatrix(A, normalize = normalize, method = method, precision = 'float32')
+                self.assertLess(abs(MatrixA.vNE() - expected_result), 10**-4)
+                self.assertEqual(MatrixA.prepareMatrix().dtype, numpy.float32)
+        print('===========================================================')
+
+
+class TestStochasticLanczosEntropy(unittest.TestCase):
+
+    def test_slq(self):
+        print('test_NonDesityMatrix.slq:')
+        print('        case 1: the exact von Neumann entropy lies within the confidence interval')
+        rng = numpy.random.default_rng(0)
+        A = numpy.matmul(rng.standard_normal((80, 10)), rng.standard_normal((10, 200))) + 0.01 * rng.standard_normal((80, 200))
+
+        for normalize in [False, True]:
+            expected_result = NonDesityMatrix(A, normalize = normalize, method = 'svd').vNE()
+            MatrixA = NonDesityMatrix(A, normalize = normalize, method = 'slq', num_probe = 50, lanczos_steps = 20)
+            my_result = MatrixA.vNE()
+            self.assertGreater(MatrixA.vNE_error_bound, 0)
+            self.assertLessEqual(abs(my_result - expected_result), MatrixA.vNE_error_bound)
+
+        print('        ---------------------------------------------------')
+        print('        case 2: exact when the Lanczos steps span the whole space')
+        diagonal = numpy.array([0.5, 0.25, 0.125, 0.125])
+        my_result = stochasticLanczosEntropy(lambda x: diagonal * x, dim = 4, num_probe = 5, lanczos_steps = 4, epsilon = 10**-8)
+        numpy.testing.assert_almost_equal(my_result[0], 1.75)
+        numpy.testing.assert_almost_equal(my_result[1], 0)
+
+        print('        ---------------------------------------------------')
+        print('        case 3: the bound covers the quadrature error (a diagonal rho gives every probe the same estimate)')
+        diagonal = numpy.exp(-numpy.arange(300) / 15)
+        diagonal = diagonal / numpy.sum(diagonal)
+        expected_result = entropyFromNormEigvals(diagonal)
+        my_result = stochasticLanczosEntropy(lambda x: diagonal * x, dim = 300, num_probe = 10, lanczos_steps = 10, epsilon = 10**-8)
+        self.assertGreater(abs(my_result[0] - expected_result), 0.01)
+        self.assertLessEqual(abs(my_result[0] - expected_result), my_result[1])
+
+        print('        ---------------------------------------------------')
+        print('        case 4: coverage of the exact value over independent probe sets')
+        Q = numpy.linalg.qr(rng.standard_normal((300, 300)))[0]
+        rho = numpy.matmul(Q * diagonal, numpy.transpose(Q))
+        covered = 0
+        for seed in range(40):
+            my_result = stochasticLanczosEntropy(lambda x: numpy.matmul(rho, x), dim = 300, num_probe = 30, lanczos_steps = 5,
+                                                 epsilon = 10**-8, seed = seed)
+            covered += abs(my_result[0] - expected_result) <= my_result[1]
+        self.assertGreaterEqual(covered, 36)
+        print('===========================================================')
+
+
+class TestEntropyBounds(unittest.TestCase):
+
+    def test_entropyBounds(self):
+        print('test_entropyBounds:')
+        print('        case 1: bounds contain the entropy of every spectrum that agrees with the resolved eigenvalues')
+        full = numpy.array([0.4, 0.3, 0.1, 0.1, 0.05, 0.05])
+        lower, upper = entropyBounds(full[0:3], num_eigvals = 6)
+        self.assertLessEqual(lower, entropyFromNormEigvals(full))
+        self.assertGreaterEqual(upper, entropyFromNormEigvals(full))
+        numpy.testing.assert_almost_equal(lower, entropyFromNormEigvals([0.6, 0.3, 0.1]))
+        numpy.testing.assert_almost_equal(upper, entropyFromNormEigvals([0.4, 0.3, 0.1, 0.2/3, 0.2/3, 0.2/3]))
+
+        print('        ---------------------------------------------------')
+        print('        case 2: no unresolved mass')
+        lower, upper = entropyBounds(numpy.array([0.5, 0.5]), num_eigvals = 4)
+        self.assertEqual(lower, 1)
+        self.assertEqual(upper, 1)
+        print('===========================================================')
+
+
+class TestInterlacingEntropyBounds(unittest.TestCase):
+
+    def test_interlacingEntropyBounds(self):
+        print('test_interlacingEntropyBounds:')
+        print('        case 1: bounds contain the von Neumann entropy after removing each column')
+        rng = numpy.random.default_rng(0)
+        for shape in [(8, 30), (30, 8)]:
+            A = rng.gamma(0.5, size = shape) * rng.gamma(1, size = shape[1])
+            M = A - numpy.mean(A, axis = 0)
+            product = numpy.matmul(M, numpy.transpose(M)) if shape[0] < shape[1] else numpy.matmul(numpy.transpose(M), M)
+            lower, upper = interlacingEntropyBounds(numpy.linalg.eigvalsh(product), numpy.sum(numpy.power(M, 2), axis = 0),
+                                                    epsilon = 10**-8, max_elements = 50)
+            expected_result = numpy.array([NonDesityMatrix(numpy.delete(A, j, axis = 1), normalize = False).vNE() for j in range(shape[1])])
+            self.assertTrue(numpy.all(lower <= expected_result))
+            self.assertTrue(numpy.all(expected_result <= upper))
+
+        print('        ---------------------------------------------------')
+        print('        case 2: a column of zeros leaves the spectrum as it is')
+        M = A - numpy.mean(A, axis = 0)
+        eigvals = numpy.linalg.eigvalsh(numpy.matmul(numpy.transpose(M), M))
+        lower, upper = interlacingEntropyBounds(eigvals, numpy.array([0.0]), epsilon = 10**-8)
+        numpy.testing.assert_almost_equal(lower[0], NonDesityMatrix(A, normalize = False).vNE(), decimal = 5)
+        numpy.testing.assert_almost_equal(upper[0], NonDesityMatrix(A, normalize = False).vNE(), decimal = 5)
+        print('===========================================================')
+
+
+class TestPerturbationVNE(unittest.TestCase):
+
+    def test_perturbationVNE(self):
+        print('\ntest_perturbationVNE:')
+        print('        case 1: the first-order estimate is accurate for a small column')
+        rng = numpy.random.default_rng(0)
+        A = rng.standard_normal((8, 12))
+        A[:, 0] = 0.001 * A[:, 0]
+        M = A - numpy.mean(A, axis = 0)
+        eigvals, eigvecs = numpy.linalg.eigh(numpy.matmul(M, numpy.transpose(M)))
+        weights = numpy.power(numpy.matmul(numpy.transpose(M), eigvecs), 2)
+        my_result, relative_shift = perturbationVNE(numpy.clip(eigvals, 0, None), weights, epsilon = 10**-8)
+
+        expected_result = NonDesityMatrix(numpy.delete(A, 0, axis = 1), normalize = False).vNE()
+        self.assertLess(abs(my_result[0] - expected_result), 10**-8)
+        self.assertLess(relative_shift[0], 10**-4)
+
+        print('        ---------------------------------------------------')
+        print('        case 2: report the large relative eigenvalue shift of a dominant column')
+        A[:, 1] = 100 * A[:, 1]
+        M = A - numpy.mean(A, axis = 0)
+        eigvals, eigvecs = numpy.linalg.eigh(numpy.matmul(M, numpy.transpose(M)))
+        weights = numpy.power(numpy.matmul(numpy.transpose(M), eigvecs), 2)
+        my_result, relative_shift = perturbationVNE(numpy.clip(eigvals, 0, None), weights, epsilon = 10**-8)
+        self.assertGreater(relative_shift[1], 0.25)
+        print('===========================================================')
+
+
+class TestDowndateEigvals(unittest.TestCase):
+
+    def test_downdateEigvals(self):
+        print('test_downdateEigvals:')
+        print('        case 1: remove one column from a mean centered matrix')
+        A = numpy.array([[1, 4, 5, 12], [5, 8, 9, 0], [6, 7, 11, 19]])
+        M = A - numpy.mean(A, axis = 0)
+        eigvals, eigvecs = numpy.linalg.eigh(numpy.matmul(M, numpy.transpose(M)))
+        my_result = downdateEigvals(eigvals, numpy.matmul(numpy.transpose(eigvecs), M[:, 1]))
+
+        M_minus_one = numpy.delete(M, 1, axis = 1)
+        expected_result = numpy.linalg.eigvalsh(numpy.matmul(M_minus_one, numpy.transpose(M_minus_one)))
+        numpy.testing.assert_almost_equal(my_result, expected_result, decimal = 8)
+
+        print('        ---------------------------------------------------')
+        print('        case 2: repeated eigenvalues and zero weights (deflation)')
+        d = numpy.array([0, 0, 1, 1, 1, 2, 5])
+        z = numpy.array([0, 0, 0.3, 0.2, 0, 0.5, 1])
+        my_result = downdateEigvals(d, z)
+        expected_result = numpy.linalg.eigvalsh(numpy.diag(d) - numpy.outer(z, z))
+        numpy.testing.assert_almost_equal(my_result, expected_result, decimal = 10)
+
+        print('        ---------------------------------------------------')
+        print('        case 3: a column that dominates the spectrum (downdatedEigvals() decomposes directly)')
+        rng = numpy.random.default_rng(0)
+        A = rng.poisson(3, size = (60, 400)).astype(float)
+        A[:, 7] = A[:, 7] * 1000
+        M = A - numpy.mean(A, axis = 0)
+        gram = numpy.matmul(M, numpy.transpose(M))
+        eigvals, eigvecs = numpy.linalg.eigh(gram)
+        expected_result = numpy.linalg.eigvalsh(gram - numpy.outer(M[:, 7], M[:, 7]))
+        my_result = downdatedEigvals(gram, eigvals, eigvecs, M[:, 7])
+        self.assertLess(numpy.max(numpy.abs(my_result - expected_result)) / numpy.max(expected_result), 10**-12)
+        # and the ordinary columns still match with the downdate
+        my_result = downdatedEigvals(gram, eigvals, eigvecs, M[:, 0])
+        expected_result = numpy.linalg.eigvalsh(gram - numpy.outer(M[:, 0], M[:, 0]))
+        self.assertLess(numpy.max(numpy.abs(my_result - expected_result)) / numpy.max(expected_result), 10**-12)
+        print('===========================================================')
+
+
 if __name__ == '__main__':
     unittest.main()
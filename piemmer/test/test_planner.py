@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+## usage:
+# at a level above emmer/
+# python3 -m emmer.test.test_planner
+
+from ..toolbox.planner import MemoryPlan, cached_contexts, parseMemory, worker_process_bytes
+from ..troubleshoot.err.error import ErrorCode52
+import unittest
+
+
+class TestMemoryPlan(unittest.TestCase):
+
+    def test_MemoryPlan(self):
+        print('\ntest_MemoryPlan:')
+        print('        Case 1: many more features than samples; downdate is fastest and every task fits')
+        my_result = MemoryPlan(nrow = 100, ncol = 20000, itemsize = 8, num_cpu = 8, max_memory = 2 ** 34)
+        self.assertEqual(my_result.engine, 'downdate')
+        self.assertEqual(my_result.max_tasks, 8)
+        self.assertLessEqual(my_result.peak_bytes, 2 ** 34)
+
+        print('        ---------------------------------------------------')
+        print('        Case 2: a smaller budget runs fewer tasks at a time, and every worker process keeps fewer contexts')
+        my_result = MemoryPlan(nrow = 100, ncol = 20000, itemsize = 8, num_cpu = 8, max_memory = 3 * 2 ** 29,
+                               engine = 'svd', backend = 'processes')
+        self.assertEqual(my_result.engine, 'svd')
+        self.assertLess(my_result.max_tasks, 8)
+        self.assertEqual(my_result.worker_contexts, 1)
+        self.assertGreaterEqual(my_result.peak_bytes, 8 * (worker_process_bytes + my_result.contextBytes('svd')))
+        self.assertLessEqual(my_result.peak_bytes, 3 * 2 ** 29)
+        # the 8 worker processes alone (with their interpreters) do not fit 1 GiB
+        with self.assertRaises(ErrorCode52):
+            MemoryPlan(nrow = 100, ncol = 20000, itemsize = 8, num_cpu = 8, max_memory = 2 ** 30,
+                       engine = 'svd', backend = 'processes', suppress = True)
+        my_result = MemoryPlan(nrow = 100, ncol = 20000, itemsize = 8, num_cpu = 8, max_memory = 2 ** 30,
+                               engine = 'svd', backend = 'processes', num_workers = 2)
+        self.assertEqual(my_result.max_tasks, 8)
+        self.assertEqual(my_result.worker_contexts, cached_contexts)
+
+        print('        ---------------------------------------------------')
+        print('        Case 3: without worker processes more tasks fit')
+        my_result = MemoryPlan(nrow = 100, ncol = 20000, itemsize = 8, num_cpu = 8, max_memory = 2 ** 30, engine = 'svd')
+        self.assertEqual(my_result.backend, 'threads')
+        self.assertEqual(my_result.max_tasks, 8)
+
+        print('        ---------------------------------------------------')
+        print('        Case 4: not even one task fits')
+        with self.assertRaises(ErrorCode52):
+            MemoryPlan(nrow = 100, ncol = 20000, itemsize = 8, num_cpu = 8, max_memory = 2 ** 20, suppress = True)
+        print('===========================================================')
+
+
+    def test_parseMemory(self):
+        print('\ntest_parseMemory:')
+        print('        Case 1: units')
+        self.assertEqual(parseMemory('64G'), 64 * 2 ** 30)
+        self.assertEqual(parseMemory('1.5t'), int(1.5 * 2 ** 40))
+        self.assertEqual(parseMemory('1000'), 1000)
+
+        print('        ---------------------------------------------------')
+        print('        Case 2: invalid settings')
+        for setting in ['64X', 'G', '-1G', '0']:
+            with self.assertRaises(ErrorCode52):
+                parseMemory(setting, suppress = True)
+        print('===========================================================')
+
+
+if __name__ == '__main__':
+    unittest.main()
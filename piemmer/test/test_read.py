@@ -11,6 +11,7 @@ from pandas.util.testing import assert_frame_equal
 import unittest
 import pandas
 import numpy
+import scipy.sparse
 import os
 
 
@@ -125,6 +126,24 @@ class TestRawDataImport(unittest.TestCase):
         print('===========================================================')
 
 
+    def test_sparse(self):
+        print('\ntest_RawDataImport.sparse:')
+        print('        case 1: sparse input path keeps the same samples, features and values as the dense path.')
+        dense_matrix = RawDataImport(file_name = 'piemmer/data/test_case_1.csv', for_merging_file = False, suppress = True)
+        sparse_matrix = RawDataImport(file_name = 'piemmer/data/test_case_1.csv', for_merging_file = False, suppress = True, sparse = True, chunk_size = 2)
+        for input_matrix in [dense_matrix, sparse_matrix]:
+            input_matrix.readCSV()
+            input_matrix.relativeAbundance()
+            input_matrix.detectionLimit(detection_limit = 0.2)
+            input_matrix.hardFilter(zero_tolerance_level = 0.5)
+
+        self.assertTrue(scipy.sparse.issparse(sparse_matrix.sparse_data))
+        self.assertListEqual(list(sparse_matrix.feature_names), list(dense_matrix.feature_names))
+        self.assertListEqual(list(sparse_matrix.sample_id), list(dense_matrix.sample_id))
+        numpy.testing.assert_allclose(sparse_matrix.sparse_data.toarray(), dense_matrix.data.values)
+        print('===========================================================')
+
+
 class TestMergeTargetedFiles(unittest.TestCase):
 
     def test_getMap(self):
@@ -8,6 +8,7 @@ from ..troubleshoot.err.error import ErrorCode23
 from ..toolbox.technical import *
 import unittest
 import numpy as np
+import scipy.sparse
 import pandas as pd
 import sys
 
@@ -131,7 +132,37 @@ class TestDualAssignment(unittest.TestCase):
         expected_result = {'A': [7, 8, 8], 'B': [5, 5, 5], 'C': [4, 3, 4]}
         self.assertEqual(my_result, expected_result)
         print('===========================================================')
-        
+
+
+class TestShareMatrix(unittest.TestCase):
+
+    def test_shareMatrix(self):
+        print('\ntest_shareMatrix:')
+        print('        Case 1: attach to a shared dense matrix')
+        A = np.array([[1, 0, 5, 0], [0, 8, 0, 0], [6, 0, 11, 19]], dtype = float)
+        blocks, descriptor = shareMatrix(A)
+        attached_blocks, my_result = attachMatrix(descriptor)
+        np.testing.assert_array_equal(my_result, A)
+        self.assertFalse(my_result.flags.writeable)
+        del my_result
+        for block in attached_blocks + blocks:
+            block.close()
+        for block in blocks:
+            block.unlink()
+
+        print('        ---------------------------------------------------')
+        print('        Case 2: attach to a shared scipy.sparse matrix')
+        blocks, descriptor = shareMatrix(scipy.sparse.csr_matrix(A))
+        attached_blocks, my_result = attachMatrix(descriptor)
+        self.assertTrue(scipy.sparse.issparse(my_result))
+        np.testing.assert_array_equal(my_result.toarray(), A)
+        del my_result
+        for block in attached_blocks + blocks:
+            block.close()
+        for block in blocks:
+            block.unlink()
+        print('===========================================================')
+
 
 if __name__ == '__main__':
     unittest.main()
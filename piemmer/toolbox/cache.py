@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+
+import scipy.sparse
+import tempfile
+import hashlib
+import pickle
+import fcntl
+import numpy
+import time
+import os
+
+
+"""
+On-disk cache of von Neumann entropy results (piemmer.harvest -cache).
+
+ResultCache:
+Stores the MinusOneVNE result summaries of the full data matrices and of their jackknife
+subsamples under a hash of everything they depend on, so that harvest runs on the same
+inputs (for example: with different plotting or merging options) skip the calculations.
+Entries are evicted least recently used first once the cache grows beyond its size cap.
+Several processes can share one cache directory: entries are written to a temporary file
+and renamed into place, readers treat a missing or broken entry as a miss, and eviction
+runs under a lock file.
+
+matrixDigest():
+Hash of the values, shape and type of a (dense or scipy.sparse) matrix.
+"""
+
+# temporary files older than this (in seconds) were left behind by a process that died
+stale_seconds = 3600
+
+# MinusOneVNE options that change how the von Neumann entropies are calculated, not their values
+execution_options = ['backend', 'max_tasks', 'worker_contexts', 'memory_budget', 'max_memory', 'pool', 'suppress']
+
+
+class ResultCache:
+    """
+    Arguments:
+        directory -- Type: str
+                     Cache directory, shared by every run that uses it
+        max_bytes -- Type: int
+                     Size cap of the cache directory
+
+    Attributes:
+        hits -- Type: int
+        misses -- Type: int
+    """
+
+    def __init__(self, directory, max_bytes = 2 ** 32):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.directory, exist_ok = True)
+
+    def key(self, **parts):
+        """
+        Hex digest of the keyword arguments (their repr(), in name order)
+        """
+        description = repr(sorted(parts.items()))
+        return(hashlib.sha256(description.encode()).hexdigest())
+
+    def entryPath(self, key):
+        return(os.path.join(self.directory, key + '.pkl'))
+
+    def get(self, key):
+        """
+        Cached value of <key>, or None. A hit marks the entry as recently used.
+        """
+        path = self.entryPath(key)
+        try:
+            with open(path, 'rb') as entry:
+                value = pickle.load(entry)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # missing, evicted meanwhile, or written by an incompatible version
+            self.misses += 1
+            return(None)
+        self.hits += 1
+        return(value)
+
+    def put(self, key, value):
+        """
+        Store <value> under <key> (atomically replacing an existing entry), then evict
+        """
+        descriptor, temporary = tempfile.mkstemp(dir = self.directory, suffix = '.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as entry:
+                pickle.dump(value, entry, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self.entryPath(key))
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits <self.max_bytes>, and
+        temporary files of processes that died while writing
+        """
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                entries = []
+                for name in os.listdir(self.directory):
+                    path = os.path.join(self.directory, name)
+                    try:
+                        status = os.stat(path)
+                    except OSError:
+                        continue
+                    if name.endswith('.pkl'):
+                        entries.append((status.st_mtime, status.st_size, path))
+                    elif name.endswith('.tmp') and time.time() - status.st_mtime > stale_seconds:
+                        removeEntry(path)
+
+                total = sum(size for _, size, _ in entries)
+                for _, size, path in sorted(entries):
+                    if total <= self.max_bytes:
+                        break
+                    removeEntry(path)
+                    total -= size
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def removeEntry(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def matrixDigest(data):
+    """
+    Hex digest of the values, shape and type of <data> (numpy.ndarray, pandas.DataFrame or
+    scipy.sparse matrix)
+    """
+    digest = hashlib.sha256()
+    if scipy.sparse.issparse(data):
+        data = scipy.sparse.csr_matrix(data, copy = True)
+        data.sum_duplicates()
+        data.sort_indices()
+        arrays = [data.indptr, data.indices, data.data]
+        digest.update(b'sparse')
+    else:
+        data = numpy.ascontiguousarray(data)
+        arrays = [data]
+    digest.update(repr((data.shape, str(data.dtype))).encode())
+    for array in arrays:
+        digest.update(array.tobytes())
+    return(digest.hexdigest())
@@ -0,0 +1,683 @@
+#!/usr/bin/env python3
+
+from .technical import shareMatrix, attachMatrix
+from ..troubleshoot.err.error import *
+
+from multiprocessing import Pool, AuthenticationError, resource_tracker
+from multiprocessing.connection import Listener, Client, wait
+from contextlib import contextmanager
+from functools import partial
+
+import concurrent.futures
+import threadpoolctl
+import collections
+import itertools
+import threading
+import pickle
+import queue
+import numpy
+import math
+import io
+
+
+"""
+Worker processes shared by every stage of an emmer run.
+
+WorkerPool:
+A multiprocessing.Pool that is started on first use and kept alive until close(), so that
+the MinusOneVNE calls of every input file, every jackknife subsample and every threshold
+setting of RevisitThreshold reuse the same warm workers instead of forking a new pool each.
+
+ThreadWorkerPool:
+Same interface on threads of the current process. For tasks that spend most of their time in
+LAPACK, which releases the GIL, so the threads share the data without copies.
+
+SerialWorkerPool:
+Same interface, one task after another in the calling thread. For debugging and single-CPU runs.
+
+RemoteWorkerPool and serveWorkers():
+Same interface on worker daemons (python3 -m piemmer.worker) on other computers, reached over
+TCP or Unix sockets, so that a large jackknife fans out over several compute nodes. Every daemon
+runs the tasks it receives on a WorkerPool of its own.
+
+Every executor has imapUnordered(), close() and the attribute <remote>; a stage that takes a
+<pool> argument (MinusOneVNE, RevisitThreshold) works with any of them.
+
+OrderedAssembler:
+Puts the results of imapUnordered() into the slots of their tasks as they arrive, so that a
+parallel stage returns its rows in task order, the same as a serial run.
+
+limitBlasThreads() and blasLibraries():
+Every worker process or thread that decomposes a matrix would otherwise start a BLAS thread
+pool (OpenBLAS, MKL) of its own with one thread per core. Workers run with one BLAS thread each;
+the main process gets all the CPUs of the run for single large decompositions.
+"""
+
+class WorkerPool:
+    """
+    Long-lived pool of worker processes. The workers are forked the first time a task is
+    submitted, so creating a WorkerPool that is never used costs nothing.
+
+    Tasks must not rely on a Pool initializer or on state of the parent process that changed
+    after the workers started; pass such state with the tasks instead (see
+    main.advanced.iteration.minusOneTask()).
+
+    Arguments:
+        num_cpu -- Type: int
+                   Number of worker processes
+        blas_threads -- Type: int
+                        Number of BLAS threads of each worker process
+
+    Attributes:
+        pool -- Type: multiprocessing.pool.Pool or None
+                None until the first task is submitted and after close()
+    """
+    # the workers run on this computer and can attach to its shared memory
+    remote = False
+
+    def __init__(self, num_cpu, blas_threads = 1):
+        self.num_cpu = num_cpu
+        self.blas_threads = blas_threads
+        self.pool = None
+        # several threads (for example: EMMER.concurrentFiles()) may submit at the same time
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.pool is None:
+                # the workers inherit the resource tracker of this process, which forgets the shared
+                # memory they attach to once this process unlinks it (see toolbox.technical.shareMatrix())
+                resource_tracker.ensure_running()
+                self.pool = Pool(processes = self.num_cpu, initializer = warmUpWorker, initargs = (self.blas_threads,))
+            return(self.pool)
+
+    def imapUnordered(self, func, iterable, max_tasks = None):
+        """
+        Same as multiprocessing.pool.Pool.imap_unordered(), on the persistent workers, with at
+        most <max_tasks> tasks of this call in the workers at a time (see toolbox.planner;
+        default: one per worker). Closing the generator early (for example: SequentialStop)
+        stops handing out tasks.
+        """
+        throttle = TaskThrottle(self.start(), func, iterable, self.num_cpu if max_tasks is None else max_tasks)
+        return(throttle.results())
+
+    def close(self):
+        """
+        Let the workers finish their tasks and stop them. The WorkerPool starts again if a
+        task is submitted afterwards.
+        """
+        with self.lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ThreadWorkerPool:
+    """
+    concurrent.futures.ThreadPoolExecutor with the interface of WorkerPool. Tasks run in this
+    process, so they can be bound methods and read the attributes of their object directly.
+    The BLAS thread pools of the process are limited to one thread while the threads of any
+    ThreadWorkerPool run (see SharedBlasLimit).
+
+    Arguments:
+        num_cpu -- Type: int
+                   Number of threads
+    """
+    remote = False
+
+    def __init__(self, num_cpu):
+        self.num_cpu = num_cpu
+        self.executor = None
+        # several threads (for example: EMMER.concurrentFiles()) may submit at the same time
+        self.lock = threading.Lock()
+
+    def start(self, max_tasks = None):
+        with self.lock:
+            if self.executor is None:
+                thread_blas_limit.acquire()
+                self.executor = concurrent.futures.ThreadPoolExecutor(max_workers = min(self.num_cpu, max_tasks or self.num_cpu))
+            return(self.executor)
+
+    def imapUnordered(self, func, iterable, max_tasks = None):
+        """
+        Results of func(item) for every item of <iterable>, in order of completion. <max_tasks>
+        caps the number of threads when the first tasks are submitted, and the number of tasks
+        submitted at a time: like TaskThrottle, an item is only submitted when an earlier task
+        finishes, so closing the results early runs nothing more.
+        """
+        executor = self.start(max_tasks)
+        window = min(self.num_cpu, max_tasks or self.num_cpu)
+        items = iter(iterable)
+        pending = set()
+        try:
+            while True:
+                for item in itertools.islice(items, max(0, window - len(pending))):
+                    pending.add(executor.submit(func, item))
+                if len(pending) == 0:
+                    break
+                done, pending = concurrent.futures.wait(pending, return_when = concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield(future.result())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def close(self):
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait = True, cancel_futures = True)
+                self.executor = None
+                thread_blas_limit.release()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class SharedBlasLimit:
+    """
+    One BLAS thread per thread for as long as any ThreadWorkerPool runs. Pools of input files
+    processed at the same time share the limit, and the last one to close restores the limits
+    set before the first one started (for example: limitBlasThreads() of piemmer.harvest).
+
+    Attributes:
+        users -- Type: int
+                 Number of running ThreadWorkerPool objects
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.users = 0
+        self.limits = None
+
+    def acquire(self):
+        with self.lock:
+            if self.users == 0:
+                self.limits = limitBlasThreads(1)
+            self.users += 1
+
+    def release(self):
+        with self.lock:
+            self.users -= 1
+            if self.users == 0:
+                self.limits.restore_original_limits()
+                self.limits = None
+
+
+thread_blas_limit = SharedBlasLimit()
+
+
+class SerialWorkerPool:
+    """
+    Run every task in the calling thread, one after another, with the interface of WorkerPool.
+    Like on ThreadWorkerPool, tasks can be bound methods.
+    """
+    remote = False
+
+    def __init__(self, num_cpu = 1):
+        self.num_cpu = 1
+
+    def imapUnordered(self, func, iterable, max_tasks = None):
+        """
+        Results of func(item) for every item of <iterable>, as they are calculated
+        """
+        for item in iterable:
+            yield(func(item))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RemoteWorkerPool:
+    """
+    Worker daemons (see serveWorkers()) with the interface of WorkerPool. Every imapUnordered()
+    call connects to all daemons, sends the tasks in chunks (about <chunks_per_worker> per
+    worker process, and at most two per worker process waiting at a daemon) and disconnects
+    once every result is back.
+
+    Tasks and results are pickled, so <func> must be a module-level function that the daemons
+    can import (the same piemmer version on every computer) and the items must not depend on
+    files or shared memory of this computer. A numpy array larger than <large_array_bytes> goes
+    to each daemon once per call, however many tasks refer to it, and the daemon shares it
+    with its worker processes (see SharedArray).
+
+    Both sides unpickle what they receive, which can run arbitrary code: only connect to
+    daemons you trust, on a network you trust, and keep <authkey> secret.
+
+    Arguments:
+        addresses -- Type: list
+                     'host:port' (TCP) or the path of a Unix socket of every worker daemon
+        authkey -- Type: str or bytes
+                   Shared secret of the daemons
+        chunks_per_worker -- Type: int
+
+    Attributes:
+        num_cpu -- Type: int or None
+                   Total number of worker processes of the daemons, once connected
+    """
+    remote = True
+
+    def __init__(self, addresses, authkey, chunks_per_worker = 4, suppress = False):
+        self.addresses = list(addresses)
+        self.authkey = authkey.encode() if isinstance(authkey, str) else authkey
+        self.chunks_per_worker = chunks_per_worker
+        self.suppress = suppress
+        self.num_cpu = None
+
+    def start(self):
+        """
+        Check that every daemon answers and count their worker processes
+        """
+        for daemon in self.connect():
+            daemon.close()
+        return(self)
+
+    def connect(self):
+        """
+        Return:
+            Type: list of RemoteDaemon
+            One new connection to every daemon
+        """
+        daemons = []
+        try:
+            for address in self.addresses:
+                daemons.append(RemoteDaemon(Client(parseAddress(address), authkey = self.authkey)))
+        except (OSError, EOFError, ValueError, AuthenticationError) as e:
+            for daemon in daemons:
+                daemon.close()
+            raise ErrorCode51(suppress = self.suppress) from e
+        self.num_cpu = sum(daemon.num_cpu for daemon in daemons)
+        return(daemons)
+
+    def imapUnordered(self, func, iterable, max_tasks = None):
+        """
+        Results of func(item) for every item of <iterable>, in order of completion. <max_tasks>
+        is ignored: the memory of the daemons is theirs to plan (piemmer.worker -c).
+        """
+        items = list(iterable)
+        daemons = self.connect()
+        try:
+            chunk_size = max(1, math.ceil(len(items) / (self.chunks_per_worker * self.num_cpu)))
+            chunks = (items[start:(start + chunk_size)] for start in range(0, len(items), chunk_size))
+            for daemon in daemons:
+                for chunk in itertools.islice(chunks, 2 * daemon.num_cpu):
+                    daemon.submit(func, chunk)
+
+            while any(daemon.in_flight > 0 for daemon in daemons):
+                ready = wait([daemon.connection for daemon in daemons if daemon.in_flight > 0])
+                for daemon in daemons:
+                    if daemon.connection in ready:
+                        for result in daemon.results(suppress = self.suppress):
+                            yield(result)
+                        for chunk in itertools.islice(chunks, 1):
+                            daemon.submit(func, chunk)
+        finally:
+            for daemon in daemons:
+                daemon.close()
+
+    def close(self):
+        # connections only live for one imapUnordered() call
+        pass
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class RemoteDaemon:
+    """
+    Client side of one connection of RemoteWorkerPool to a worker daemon
+
+    Arguments:
+        connection -- Type: multiprocessing.connection.Connection
+
+    Attributes:
+        num_cpu -- Type: int
+                   Number of worker processes of the daemon
+        in_flight -- Type: int
+                     Number of chunks sent and not answered yet
+        arrays -- Type: dict
+                  id() of every large array the daemon received -> (key, array). Holding the
+                  arrays keeps their id() from being reused during the call.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.num_cpu = connection.recv()
+        self.in_flight = 0
+        self.arrays = {}
+
+    def submit(self, func, chunk):
+        buffer = io.BytesIO()
+        ArrayPickler(buffer, self).dump((func, chunk))
+        self.connection.send(('tasks', buffer.getvalue()))
+        self.in_flight += 1
+
+    def arrayKey(self, obj):
+        """
+        persistent_id of ArrayPickler: send a large array ahead of the chunk the first time and
+        refer to it by key afterwards
+        """
+        if not isinstance(obj, numpy.ndarray) or obj.dtype.hasobject or obj.nbytes < large_array_bytes:
+            return(None)
+        if id(obj) not in self.arrays:
+            key = len(self.arrays)
+            self.connection.send(('array', key, obj))
+            self.arrays[id(obj)] = (key, obj)
+        return(self.arrays[id(obj)][0])
+
+    def results(self, suppress = False):
+        """
+        Results of the next chunk that the daemon finished
+        """
+        try:
+            status, payload = self.connection.recv()
+        except (OSError, EOFError) as e:
+            raise ErrorCode51(suppress = suppress) from e
+        self.in_flight -= 1
+        if status == 'error':
+            raise payload
+        return(payload)
+
+    def close(self):
+        self.connection.close()
+
+
+# smallest numpy array (in bytes) that RemoteWorkerPool sends once per daemon instead of with every chunk
+large_array_bytes = 2 ** 16
+
+
+class ArrayPickler(pickle.Pickler):
+
+    def __init__(self, file, daemon):
+        super().__init__(file, protocol = pickle.HIGHEST_PROTOCOL)
+        self.daemon = daemon
+
+    def persistent_id(self, obj):
+        return(self.daemon.arrayKey(obj))
+
+
+class ArrayUnpickler(pickle.Unpickler):
+    """
+    Unpickle a chunk in a worker daemon, with a SharedArray for every large array sent ahead
+    """
+
+    def __init__(self, file, shared):
+        super().__init__(file)
+        self.shared = shared
+
+    def persistent_load(self, key):
+        return(SharedArray(self.shared[key][1]))
+
+
+class SharedArray:
+    """
+    Stand-in for a large array that a worker daemon copied into shared memory (see
+    toolbox.technical.shareMatrix()). It is pickled as its descriptor only and turns into a
+    read-only view of the shared copy in the worker process that unpickles it.
+    """
+
+    def __init__(self, descriptor):
+        self.descriptor = descriptor
+
+    def __reduce__(self):
+        return(attachSharedArray, (self.descriptor,))
+
+
+attached_arrays = collections.OrderedDict()
+attached_arrays_size = 16
+
+
+def attachSharedArray(descriptor):
+    """
+    Unpickle a SharedArray in a worker process. The worker keeps the last <attached_arrays_size>
+    arrays attached, so the chunks of one call share the same view.
+    """
+    key = tuple(part[0] for part in descriptor['parts'].values())
+    if key not in attached_arrays:
+        attached_arrays[key] = attachMatrix(descriptor)
+        while len(attached_arrays) > attached_arrays_size:
+            for block in attached_arrays.popitem(last = False)[1][0]:
+                try:
+                    block.close()
+                except BufferError:
+                    # a view is still referenced; the mapping is released with the process
+                    pass
+    attached_arrays.move_to_end(key)
+    return(attached_arrays[key][1])
+
+
+def runChunk(task):
+    """
+    Pool task of a worker daemon: func(item) for every item of a chunk
+    """
+    func, chunk = task
+    return([func(item) for item in chunk])
+
+
+def parseAddress(address):
+    """
+    'host:port' -> ('host', port) for TCP; anything else is the path of a Unix socket
+    """
+    host, separator, port = address.rpartition(':')
+    if separator and port.isdigit() and '/' not in address:
+        return((host, int(port)))
+    return(address)
+
+
+def serveWorkers(address, authkey, num_cpu, blas_threads = 1):
+    """
+    Worker daemon: accept RemoteWorkerPool connections at <address> and run their tasks on a
+    WorkerPool of <num_cpu> processes, until the process is stopped. Connections are served
+    concurrently and share the worker processes.
+
+    Arguments:
+        address -- Type: str
+                   'host:port' or the path of a Unix socket to listen at
+        authkey -- Type: str or bytes
+        num_cpu -- Type: int
+    """
+    authkey = authkey.encode() if isinstance(authkey, str) else authkey
+    with WorkerPool(num_cpu = num_cpu, blas_threads = blas_threads) as pool:
+        # fork the workers before there are connection threads
+        pool.start()
+        with Listener(parseAddress(address), authkey = authkey) as listener:
+            while True:
+                try:
+                    connection = listener.accept()
+                except (OSError, EOFError, AuthenticationError):
+                    # for example: a client with another authkey
+                    continue
+                threading.Thread(target = serveConnection, args = (connection, pool), daemon = True).start()
+
+
+def serveConnection(connection, pool):
+    """
+    Run the chunks that one RemoteWorkerPool connection sends on <pool> and send their results
+    back, until the client disconnects. The large arrays of the connection are kept in shared
+    memory until then.
+    """
+    shared = {}
+    send_lock = threading.Lock()
+    try:
+        connection.send(pool.num_cpu)
+        while True:
+            try:
+                message = connection.recv()
+            except (OSError, EOFError):
+                break
+            if message[0] == 'array':
+                shared[message[1]] = shareMatrix(message[2])
+            else:
+                task = ArrayUnpickler(io.BytesIO(message[1]), shared).load()
+                pool.start().apply_async(runChunk, (task,), callback = partial(reply, connection, send_lock, 'done'),
+                                         error_callback = partial(reply, connection, send_lock, 'error'))
+    finally:
+        connection.close()
+        for blocks, descriptor in shared.values():
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+
+def reply(connection, send_lock, status, payload):
+    """
+    Send the results (or the exception) of a chunk back to the client
+    """
+    with send_lock:
+        try:
+            try:
+                connection.send((status, payload))
+            except (pickle.PicklingError, TypeError, AttributeError):
+                connection.send(('error', RuntimeError(repr(payload))))
+        except (OSError, EOFError):
+            # the client is gone
+            pass
+
+
+class TaskThrottle:
+    """
+    Submit func(item) for every item of <iterable> to a multiprocessing.Pool, with at most
+    <max_tasks> of them in the workers at a time. The tasks are submitted from the thread that
+    iterates over results(), not from the task handler thread of the pool, so the calls of
+    several threads on one pool (EMMER.concurrentFiles()) run side by side, and closing
+    results() early submits nothing more.
+    """
+
+    def __init__(self, pool, func, iterable, max_tasks):
+        self.pool = pool
+        self.func = func
+        self.items = iter(iterable)
+        self.max_tasks = max_tasks
+        # (True, result) or (False, exception) of every finished task, from the result handler of the pool
+        self.finished = queue.SimpleQueue()
+        self.in_flight = 0
+
+    def submit(self):
+        for item in itertools.islice(self.items, max(0, self.max_tasks - self.in_flight)):
+            self.pool.apply_async(self.func, (item,), callback = partial(self.finish, True),
+                                  error_callback = partial(self.finish, False))
+            self.in_flight += 1
+
+    def finish(self, success, payload):
+        self.finished.put((success, payload))
+
+    def results(self):
+        """
+        Results of the tasks, in order of completion
+        """
+        self.submit()
+        while self.in_flight > 0:
+            success, payload = self.finished.get()
+            self.in_flight -= 1
+            if not success:
+                raise payload
+            # keep the workers busy while the caller handles this result
+            self.submit()
+            yield(payload)
+
+
+class OrderedAssembler:
+    """
+    Collect results that arrive in any order (imapUnordered()) into the order of their task
+    keys, without a sort afterwards.
+
+    Arguments:
+        keys -- Type: iterable
+                Key of every task, in the order the results should have
+
+    Attributes:
+        results -- Type: list
+                   One slot per key; None until the result of that key arrives
+    """
+
+    def __init__(self, keys):
+        self.slots = {key: slot for slot, key in enumerate(keys)}
+        self.results = [None] * len(self.slots)
+
+    def add(self, key, result):
+        self.results[self.slots[key]] = result
+
+
+def warmUpWorker(blas_threads = 1):
+    """
+    Pool initializer: load the numerical libraries once per worker rather than in the first task,
+    and limit the BLAS thread pools of the worker to <blas_threads>
+    """
+    import numpy
+    import scipy.linalg
+    import scipy.sparse
+    import pandas
+    limitBlasThreads(blas_threads)
+
+
+def limitBlasThreads(num_threads):
+    """
+    Limit the BLAS and OpenMP thread pools loaded by this process (for example: OpenBLAS or MKL
+    behind numpy and scipy) to <num_threads> threads each.
+
+    Return:
+        Type: threadpoolctl.threadpool_limits
+        Call restore_original_limits() to undo
+    """
+    return(threadpoolctl.threadpool_limits(limits = num_threads))
+
+
+def blasLibraries():
+    """
+    Names of the BLAS and OpenMP libraries loaded by this process, for the notebook
+    """
+    return(sorted(set(info['internal_api'] for info in threadpoolctl.threadpool_info())))
+
+
+@contextmanager
+def workerPool(pool, num_cpu):
+    """
+    Use <pool> when the caller owns one, otherwise a WorkerPool of <num_cpu> workers that is
+    closed again on exit.
+
+    Arguments:
+        pool -- Type: WorkerPool, ThreadWorkerPool, SerialWorkerPool, RemoteWorkerPool or None
+        num_cpu -- Type: int
+    """
+    if pool is not None:
+        yield pool
+    else:
+        with WorkerPool(num_cpu = num_cpu) as temporary_pool:
+            yield temporary_pool
+
+
+def makeWorkerPool(num_cpu, workers = None, authkey = None, suppress = False):
+    """
+    Executor of a run: a WorkerPool of <num_cpu> processes, or a RemoteWorkerPool of the worker
+    daemons at <workers> when given
+
+    Arguments:
+        workers -- Type: list or None
+                   Addresses of worker daemons
+    """
+    if workers is None:
+        return(WorkerPool(num_cpu = num_cpu))
+    try:
+        if authkey is None:
+            raise Error(code = '51')
+    except Error as e:
+        raise ErrorCode51(suppress = suppress) from e
+    return(RemoteWorkerPool(addresses = workers, authkey = authkey, suppress = suppress))
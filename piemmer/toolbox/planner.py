@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+
+from ..troubleshoot.err.error import *
+
+import os
+
+
+"""
+Memory planner for the von Neumann entropy calculations of one data matrix (piemmer.harvest
+-maxMemory).
+
+MemoryPlan:
+Estimates the peak memory of every way to run MinusOneVNE on a matrix of a given shape (engine
+'svd', 'downdate' or 'batched'; 'processes' or 'threads'; number of tasks running at the same
+time) from the arrays each of them allocates, and keeps the fastest one that fits the budget.
+Speed is estimated by the floating point operations of the decompositions.
+
+parseMemory():
+Read a -maxMemory setting such as '64G'.
+"""
+
+# resident memory of one worker process before its first task (interpreter, numpy, scipy, pandas)
+worker_process_bytes = 2 ** 27
+
+# most MinusOneVNE objects a worker process keeps between tasks (main.advanced.iteration.worker_cache_size);
+# a tight budget keeps fewer (MemoryPlan.worker_contexts)
+cached_contexts = 4
+
+memory_units = {'': 1, 'B': 1, 'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+
+
+class MemoryPlan:
+    """
+    Fastest way to calculate the von Neumann entropies of a (nrow x ncol) matrix, and of its
+    jackknife subsamples, within <max_memory> bytes.
+
+    Arguments:
+        nrow -- Type: int
+        ncol -- Type: int
+        itemsize -- Type: int
+                    Bytes per value (8 for float64, 4 for float32)
+        num_cpu -- Type: int
+                   Largest number of tasks at the same time
+        max_memory -- Type: int
+                      Budget in bytes
+        engine -- Type: str
+                  'auto' to let the plan choose, otherwise the engine to plan for
+        backend -- Type: str
+                   'auto' to let the plan choose, otherwise the backend to plan for
+        nnz -- Type: int or None
+               Number of stored values of a scipy.sparse matrix. None for a dense matrix
+        num_workers -- Type: int or None
+                       Number of processes of the WorkerPool that runs the tasks. Every one of them
+                       keeps MinusOneVNE objects between tasks, however few tasks run at a time.
+                       Default: <num_cpu>
+
+    Attributes:
+        engine -- Type: str
+        backend -- Type: str
+        max_tasks -- Type: int
+                     Number of tasks that may run at the same time
+        worker_contexts -- Type: int
+                           Number of MinusOneVNE objects each worker process (backend 'processes')
+                           or the threads together (backend 'threads', plus one per thread) keep
+                           between tasks
+        memory_budget -- Type: int or None
+                         Bytes for the stacked matrices of engine = 'batched'
+        peak_bytes -- Type: int
+                      Estimated peak memory of the plan
+        cost -- Type: float
+                Relative running time of the plan (see flops())
+    """
+
+    def __init__(self, nrow, ncol, itemsize, num_cpu, max_memory, engine = 'auto', backend = 'auto', nnz = None,
+                 num_workers = None, suppress = False):
+        self.nrow = nrow
+        self.ncol = ncol
+        self.itemsize = itemsize
+        self.num_cpu = max(1, num_cpu)
+        self.num_workers = self.num_cpu if num_workers is None else max(1, num_workers)
+        self.max_memory = max_memory
+        self.nnz = nnz
+        self.suppress = suppress
+
+        engines = ['downdate', 'batched', 'svd'] if engine == 'auto' else [engine]
+        backends = ['processes', 'threads'] if backend == 'auto' else [backend]
+        self.choosePlan(engines, backends)
+
+    def dataBytes(self):
+        """
+        One copy of the data matrix (CSC arrays of a sparse one)
+        """
+        if self.nnz is None:
+            return(self.nrow * self.ncol * self.itemsize)
+        return(self.nnz * (self.itemsize + 4) + (self.ncol + 1) * 4)
+
+    def denseBytes(self):
+        """
+        One dense (mean centered) copy of the data matrix
+        """
+        return(self.nrow * self.ncol * self.itemsize)
+
+    def sharedBytes(self, engine, backend):
+        """
+        Memory of the main process and of the shared memory blocks, whatever the number of tasks
+        """
+        n, b = self.nrow, self.itemsize
+        shared = self.dataBytes()
+        if backend == 'processes':
+            # shared memory copy of the data (toolbox.technical.shareMatrix())
+            shared += self.dataBytes()
+        if engine == 'downdate':
+            # centered matrix, Gram matrix and its eigenvectors, plus the shared copy of all three
+            shared += self.denseBytes() + 2 * n * n * b
+            if backend == 'processes':
+                shared += 2 * n * n * b + n * b
+        return(shared)
+
+    def taskBytes(self, engine):
+        """
+        Memory of one running remove-one-feature task
+        """
+        n, p, b = self.nrow, self.ncol, self.itemsize
+        k = min(n, p)
+        if engine == 'downdate':
+            # one centered column, its projection and the secular equation
+            return(8 * n * b)
+        # remove-one-column copy, its centered (dense) copy, and a full SVD that copies it once more,
+        # or the k x k Gram or covariance matrix with the eigvalsh workspace
+        return(self.dataBytes() + 2 * self.denseBytes() + 4 * k * k * b)
+
+    def contextBytes(self, engine):
+        """
+        Memory of one MinusOneVNE kept between tasks: a copy of its (subsample) data, with the
+        centered matrix and the Gram eigendecomposition for engine = 'downdate'
+        """
+        n, b = self.nrow, self.itemsize
+        context = self.dataBytes()
+        if engine == 'downdate':
+            context += self.denseBytes() + 3 * n * n * b
+        return(context)
+
+    def residentBytes(self, engine, backend, tasks, contexts):
+        """
+        Memory, apart from sharedBytes(), of <tasks> running tasks when the workers keep
+        <contexts> MinusOneVNE objects each. Every process of the pool keeps its objects (and
+        its interpreter) whether or not it runs a task; the threads share theirs, one per
+        running task plus <contexts>.
+        """
+        if backend == 'processes':
+            return(self.num_workers * (worker_process_bytes + contexts * self.contextBytes(engine)) +
+                   tasks * self.taskBytes(engine))
+        return(tasks * (self.taskBytes(engine) + self.contextBytes(engine)) + contexts * self.contextBytes(engine))
+
+    def batchedPlan(self):
+        """
+        (peak bytes, memory_budget) of engine = 'batched', or None when not even one stacked
+        matrix fits. Batches run one after another in the main process.
+        """
+        n, p, b = self.nrow, self.ncol, self.itemsize
+        size = n if n < p else p - 1
+        fixed = self.dataBytes() + self.denseBytes() + (size + 1) * (size + 1) * b
+        memory_budget = self.max_memory - fixed
+        if memory_budget < 3 * size * size * b:
+            return(None)
+        return(fixed + memory_budget, memory_budget)
+
+    def flops(self, engine, backend, tasks):
+        """
+        Relative running time: floating point operations of the decompositions of every
+        remove-one-feature matrix, divided by the tasks that run in parallel
+        """
+        n, p = float(self.nrow), float(self.ncol)
+        k = min(n, p)
+        if engine == 'svd':
+            return(p * n * p * k / tasks)
+        if engine == 'batched':
+            size = n if n < p else p - 1
+            return(p * size ** 3 + p * size * size)
+        # downdate: one eigendecomposition, then O(n^2) per feature. Its tasks are too short
+        # to release the GIL for long, so threads do not run them in parallel
+        parallel = tasks if backend == 'processes' else 1
+        return(n * n * p + n ** 3 + p * 10 * n * n / parallel)
+
+    def choosePlan(self, engines, backends):
+        plans = []
+        for engine in engines:
+            if engine == 'batched':
+                batched = self.batchedPlan()
+                if batched is not None:
+                    plans.append((self.flops(engine, 'processes', 1), batched[0], engine, backends[0], 1, batched[1], cached_contexts))
+                continue
+            for backend in backends:
+                plan = self.taskPlan(engine, backend)
+                if plan is not None:
+                    tasks, contexts = plan
+                    peak = self.sharedBytes(engine, backend) + self.residentBytes(engine, backend, tasks, contexts)
+                    plans.append((self.flops(engine, backend, tasks), peak, engine, backend, tasks, None, contexts))
+        try:
+            if len(plans) == 0:
+                raise Error(code = '52')
+        except Error as e:
+            raise ErrorCode52(suppress = self.suppress) from e
+
+        # fastest plan; among equally fast ones, the first in the order of <engines> and <backends>
+        fastest = min(range(len(plans)), key = lambda i: (plans[i][0], i))
+        (self.cost, self.peak_bytes, self.engine, self.backend, self.max_tasks, self.memory_budget,
+         self.worker_contexts) = plans[fastest]
+
+    def taskPlan(self, engine, backend):
+        """
+        (tasks at a time, worker_contexts) that fit the budget: the most tasks (up to num_cpu),
+        then the most kept MinusOneVNE objects (up to <cached_contexts>, at least one) with
+        that many tasks. None when not even one task fits.
+        """
+        budget = self.max_memory - self.sharedBytes(engine, backend)
+        fits = lambda tasks, contexts: self.residentBytes(engine, backend, tasks, contexts) <= budget
+        tasks = 0
+        while tasks < self.num_cpu and fits(tasks + 1, 1):
+            tasks += 1
+        if tasks == 0:
+            return(None)
+        contexts = 1
+        while contexts < cached_contexts and fits(tasks, contexts + 1):
+            contexts += 1
+        return(tasks, contexts)
+
+    def summary(self):
+        """
+        One line for the notebook
+        """
+        return('engine ' + self.engine + ', ' + str(self.max_tasks) + ' ' + self.backend + ' task(s) at a time, ' +
+               str(self.worker_contexts) + ' kept context(s), about ' + str(round(self.peak_bytes / 2 ** 30, 2)) + ' GiB of ' + str(round(self.max_memory / 2 ** 30, 2)) + ' GiB')
+
+
+def parseMemory(setting, suppress = False):
+    """
+    Number of bytes of a memory setting: a number with an optional unit K, M, G or T (powers of
+    1024), for example: '64G' or '1.5T'
+    """
+    setting = str(setting).strip().upper()
+    unit = setting[-1] if setting[-1:].isalpha() else ''
+    try:
+        if unit not in memory_units:
+            raise Error(code = '52')
+        number = float(setting[:len(setting) - len(unit)])
+        if not number > 0:
+            raise Error(code = '52')
+    except (Error, ValueError) as e:
+        raise ErrorCode52(suppress = suppress) from e
+    return(int(number * memory_units[unit]))
+
+
+def physicalMemory():
+    """
+    Bytes of memory of this computer
+    """
+    return(os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES'))
@@ -2,6 +2,7 @@
 
 from ..troubleshoot.err.error import Error, ErrorCode44
 from ..troubleshoot.inquire.input import InputCode6
+import argparse
 import datetime
 import time
 import os
@@ -103,6 +104,9 @@ class UpdateNoteBook:
     def updateArgs(self, args):
         if self.neglect == False:
             self.notebook.write('User input arguments:\n')
+            # never write the shared secret of the worker daemons (piemmer.harvest -authkey) down
+            if getattr(args, 'authkey', None) is not None:
+                args = argparse.Namespace(**dict(vars(args), authkey = '<hidden>'))
             args_in_str = str(args).replace('Namespace(', '    ').replace(')', '\n').replace(', ','\n    ')
             self.notebook.write(args_in_str)
             self.notebook.write('\n    Please refer to the Tutorial if you wish to know more about those arugments and their\n')
@@ -129,6 +133,58 @@ class UpdateNoteBook:
             self.notebook.close()
 
 
+    def updatePrecisionResult(self, max_deviation):
+        if self.neglect == False:
+            self.notebook.write('    largest deviation of the von Neumann entropy from float64: ' + str(max_deviation) + '\n')
+            self.notebook.close()
+
+
+    def updatePruneResult(self, num_pruned, num_feature):
+        if self.neglect == False:
+            self.notebook.write('    exact von Neumann entropy calculations skipped by pruning: ' + str(num_pruned) +
+                                ' of ' + str(num_feature) + '\n')
+            self.notebook.close()
+
+
+    def updateParallelLayout(self, num_cpu, backend, main_threads, libraries, workers = None):
+        if self.neglect == False:
+            self.notebook.write('Parallel layout:\n')
+            self.notebook.write('    BLAS libraries: ' + ', '.join(libraries) + '\n')
+            self.notebook.write('    main process: ' + str(main_threads) + ' BLAS thread(s)\n')
+            if workers is None:
+                self.notebook.write('    workers: ' + str(num_cpu) + ' ' + backend + ' x 1 BLAS thread\n')
+            else:
+                self.notebook.write('    workers: ' + backend + ' of the worker daemons at ' + ', '.join(workers) + ' x 1 BLAS thread\n')
+            self.notebook.write('============================================================================================\n')
+            self.notebook.close()
+
+
+    def updateMemoryPlan(self, basename, plan_summary):
+        if self.neglect == False:
+            self.notebook.write('Memory plan for ' + basename + ': ' + plan_summary + '\n')
+            self.notebook.close()
+
+
+    def updateSubsampleDesign(self, basename, design):
+        if self.neglect == False:
+            self.notebook.write('Delete-d jackknife for ' + basename + ': ' + design + '\n')
+            self.notebook.close()
+
+
+    def updateLeverage(self, basename, max_leverage):
+        if self.neglect == False:
+            self.notebook.write('Infinitesimal jackknife for ' + basename + ': largest sample leverage ' +
+                                str(round(max_leverage, 4)) + ' (the predictions degrade as it approaches 1)\n')
+            self.notebook.close()
+
+
+    def updateSequentialStop(self, basename, num_used, num_subsample, confidence):
+        if self.neglect == False:
+            self.notebook.write('Sequential stopping for ' + basename + ' (confidence ' + str(confidence) + '): ' +
+                                str(num_used) + ' of ' + str(num_subsample) + ' jackknife subsample(s) used\n')
+            self.notebook.close()
+
+
     def updateMergeResult(self, merge_what, num_feature, norm_eigen):
         if self.neglect == False:
             self.notebook.write(merge_what + ' result\n')
@@ -2,7 +2,9 @@
 
 from ..troubleshoot.err.error import Error, ErrorCode23
 #from sklearn.linear_model import LinearRegression
+from multiprocessing import shared_memory
 from scipy import stats
+import scipy.sparse
 import pandas
 import numpy
 import sys
@@ -37,6 +39,98 @@ def emptyNumpyArray(nrow, ncol):
     return(numpy_array)
 
 
+def asMatrix(data, dtype = None):
+    """
+    Convert data to numpy.ndarray, but keep scipy.sparse matrices sparse (as CSC, which is
+    cheap to subset by column). Does not copy data that already has the right type.
+    """
+    if scipy.sparse.issparse(data):
+        return(scipy.sparse.csc_matrix(data, dtype = dtype))
+    return(numpy.asarray(data, dtype = dtype))
+
+
+def deleteIndex(data, index, axis):
+    """
+    Same as numpy.delete(data, index, axis) for a single index, but also works on scipy.sparse
+    matrices.
+    """
+    if scipy.sparse.issparse(data):
+        keep = numpy.delete(numpy.arange(data.shape[axis]), index)
+        if axis == 0:
+            return(data[keep, :])
+        return(data[:, keep])
+    return(numpy.delete(data, index, axis))
+
+
+def shareMatrix(data):
+    """
+    Copy <data> into multiprocessing.shared_memory blocks once, so that worker processes can
+    attach to it with attachMatrix() instead of receiving a pickled copy with every task.
+    A scipy.sparse matrix is shared as the three arrays of its CSC form.
+
+    Arguments:
+        data -- Type: numpy.ndarray or scipy.sparse matrix
+
+    Return:
+        Type: tuple (list, dict)
+        The shared memory blocks (close() and unlink() them when the workers are done) and a
+        small, picklable description of the matrix for attachMatrix()
+    """
+    if scipy.sparse.issparse(data):
+        data = scipy.sparse.csc_matrix(data)
+        parts = {'data': data.data, 'indices': data.indices, 'indptr': data.indptr}
+        matrix_format = 'csc'
+    else:
+        parts = {'array': numpy.asarray(data)}
+        matrix_format = 'dense'
+
+    blocks = []
+    descriptor = {'format': matrix_format, 'shape': data.shape, 'parts': {}}
+    for name, array in parts.items():
+        block = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))
+        view = numpy.ndarray(array.shape, dtype = array.dtype, buffer = block.buf)
+        view[...] = array
+        blocks.append(block)
+        descriptor['parts'][name] = (block.name, array.shape, array.dtype.str)
+    return(blocks, descriptor)
+
+
+def inlineMatrix(data):
+    """
+    Same return as shareMatrix(), but the description carries <data> itself, for workers that
+    cannot attach to the shared memory of this computer (see toolbox.executor.RemoteWorkerPool)
+    """
+    return([], {'format': 'inline', 'matrix': data})
+
+
+def attachMatrix(descriptor):
+    """
+    Read-only, zero-copy view of a matrix shared by shareMatrix(). Keep the returned blocks
+    referenced for as long as the matrix is in use.
+
+    Return:
+        Type: tuple (list, numpy.ndarray or scipy.sparse.csc_matrix)
+    """
+    if descriptor['format'] == 'inline':
+        return([], descriptor['matrix'])
+
+    blocks = []
+    arrays = {}
+    for name, (block_name, shape, dtype) in descriptor['parts'].items():
+        block = shared_memory.SharedMemory(name = block_name)
+        array = numpy.ndarray(shape, dtype = dtype, buffer = block.buf)
+        array.flags.writeable = False
+        blocks.append(block)
+        arrays[name] = array
+
+    if descriptor['format'] == 'csc':
+        matrix = scipy.sparse.csc_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+                                         shape = descriptor['shape'], copy = False)
+    else:
+        matrix = arrays['array']
+    return(blocks, matrix)
+
+
 def toFloat(number_in_str, suppress = False):
     """
     Convert interger to float
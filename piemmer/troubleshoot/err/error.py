@@ -805,3 +805,90 @@ class ErrorCode48(Error):
         same order.
         """
         return(suppress)
+
+
+class ErrorCode49(Error):
+
+    @aftermath
+    def __init__(self, suppress = False):
+        """
+        [[Error code 49]]
+        Parameter setting error:
+        Unrecognized option for calculating the von Neumann entropies. Please check the
+        -e (engine), -m (method), -precision, -jackknife and -backend settings.
+        """
+        return(suppress)
+
+
+class ErrorCode50(Error):
+
+    @aftermath
+    def __init__(self, suppress = False):
+        """
+        [[Error code 50]]
+        Parameter setting error:
+        Invalid setting for approximating the von Neumann entropies. The error tolerance (-a)
+        should be larger than zero, -numProbe should be at least 2, -lanczosSteps should be
+        at least 1, and neither -screen nor -refine should be negative.
+        """
+        return(suppress)
+
+
+class ErrorCode51(Error):
+
+    @aftermath
+    def __init__(self, suppress = False):
+        """
+        [[Error code 51]]
+        Remote worker error:
+        Cannot reach the worker daemons given with -workers, or lost the connection to one of
+        them. Start every daemon with the same authkey as this run (-authkey or the
+        PIEMMER_AUTHKEY environment variable), for example:
+            python3 -m piemmer.worker -a 0.0.0.0:6000 -c 16 -authkey <secret>
+        and check that the 'host:port' or socket path of each one is reachable from here.
+        """
+        return(suppress)
+
+
+class ErrorCode52(Error):
+
+    @aftermath
+    def __init__(self, suppress = False):
+        """
+        [[Error code 52]]
+        Parameter setting error:
+        Invalid -maxMemory. Give the number of bytes with an optional unit K, M, G or T
+        (for example: -maxMemory 64G). The budget has to hold the data matrix and at least
+        one von Neumann entropy calculation of the chosen -e and -backend; try a larger budget,
+        -e auto, -backend auto or -precision float32.
+        """
+        return(suppress)
+
+
+class ErrorCode53(Error):
+
+    @aftermath
+    def __init__(self, suppress = False):
+        """
+        [[Error code 53]]
+        Parameter setting error:
+        Invalid setting for -jackknife subsample. -deleteNum should be at least 1 and leave at
+        least two samples in every subsample, -subsampleNum should be at least 2, and
+        -subsampleBudget should be a positive number of seconds (wall-clock time) or of CPU
+        seconds with a 'cpu' suffix (for example: 3600 or 28800cpu).
+        """
+        return(suppress)
+
+
+class ErrorCode54(Error):
+
+    @aftermath
+    def __init__(self, suppress = False):
+        """
+        [[Error code 54]]
+        Parameter setting error:
+        Invalid -stopConfidence. The confidence level of sequential early stopping should be
+        larger than 0 and at most 1 (for example: 0.95; 1 stops only when every decision is
+        certain).
+        """
+        return(suppress)
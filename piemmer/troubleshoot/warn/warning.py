@@ -220,3 +220,20 @@ class WarningCode13(Warning):
         will neglect -i setting and use the coordinates from -p.
         """
         return(silence)
+
+
+class WarningCode14(Warning):
+
+    @reportWarning
+    def __init__(self, silence):
+        """
+        [[Warning code 14]]
+        Unreliable approximation:
+        -jackknife infinitesimal predicts each leave-one-sample-out subsample to first order,
+        which requires every sample to have a small leverage. At least one sample of this
+        data matrix has a large leverage (see the notebook), so the reproducibility may be far
+        from that of the exact jackknife.
+
+        piemmer.harvest will keep running. Use -jackknife update or refit for exact results.
+        """
+        return(silence)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+
+
+from .toolbox.executor import serveWorkers, limitBlasThreads
+
+import argparse
+import os
+
+__version__ = '1.0.5'
+
+"""
+This module (piemmer.worker) starts a worker daemon: a pool of worker processes on this computer
+that runs the von Neumann entropy calculations of a piemmer.harvest run on another computer
+(piemmer.harvest -workers). Start one daemon per compute node, with the piemmer version of the
+harvest run.
+"""
+
+##==0==##
+def tutorial():
+    """
+    -a ADDRESS, -address ADDRESS
+                       Where the daemon listens: 'host:port' for TCP (for example: 0.0.0.0:6000 accepts
+                       connections from other computers) or the path of a Unix socket.
+    -c C, -cpuNum C    Number of worker processes. Default: all CPUs of this computer.
+    -authkey AUTHKEY   Shared secret of the daemon and the piemmer.harvest run. Default: the PIEMMER_AUTHKEY
+                       environment variable. Tasks are pickled, and unpickling can run arbitrary code, so
+                       only listen on networks you trust and keep the authkey secret.
+
+    Usage:
+    PIEMMER_AUTHKEY=<secret> python3 -m piemmer.worker -a 0.0.0.0:6000 -c 16
+    python3 -m piemmer.worker -a /tmp/piemmer_worker.sock -c 4 -authkey <secret>
+
+    On the computer that runs piemmer.harvest:
+    PIEMMER_AUTHKEY=<secret> python3 -m piemmer.harvest <other_arguments_and_inputs> -workers node1:6000,node2:6000
+    """
+
+
+##==1==## running piemmer.worker
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = tutorial.__doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-a', '-address', required = True, type = str)
+    parser.add_argument('-c', '-cpuNum', default = os.cpu_count(), type = int)
+    parser.add_argument('-authkey', default = os.environ.get('PIEMMER_AUTHKEY'), type = str)
+    args = parser.parse_args()
+    if args.authkey is None:
+        parser.error('-authkey (or the PIEMMER_AUTHKEY environment variable) is required')
+
+    ## the daemon itself only forwards tasks; every worker process runs with one BLAS thread
+    limitBlasThreads(1)
+    print('piemmer worker daemon: ' + str(args.c) + ' worker process(es) at ' + args.a)
+    serveWorkers(address = args.a, authkey = args.authkey, num_cpu = args.c)
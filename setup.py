@@ -11,5 +11,5 @@ setup(
    packages=find_packages(),
    license_files = 'LICENSE.txt',
    package_data={'piemmer': ['data/*.csv', 'data/*/*.csv', 'data/*/*/*.csv']},
-   install_requires=['numpy', 'pandas', 'matplotlib', 'scikit-bio', 'scipy', 'tqdm', 'statsmodels'],
+   install_requires=['numpy', 'pandas', 'matplotlib', 'scikit-bio', 'scipy', 'tqdm', 'statsmodels', 'threadpoolctl'],
 )